@@ -1,15 +1,31 @@
-from fastapi import FastAPI, HTTPException
+import time
+_import_started = time.perf_counter() # Start of the startup timing report
+
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-import heapq
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from datetime import date
+from contextlib import contextmanager
 
 # Import PIRS modules
-from database_setup import setup_database
-from data_ingestion import get_product_lookup
-from prediction_engine import calculate_priority_score
-from prioritization import build_reorder_heap
+from migrations import migrate_all
+from product_catalog import ProductCatalog
+from category_rollup import CategoryRollup, parse_category
+from db_router import connect_for_sku, connect_shard, find_order_shard, shard_for_sku
+from forecast_state import get_forecast_store
+import queue_events
+from wave_dispatch import dispatch_wave_on_shard, reopen_blocked_on_shard
+from wave_planner import plan_waves, wave_pick_list
+from data_versions import versions, etag_matches, serialise
+import export_stream
+from prioritization import ReorderIndex
+from reorder_engine import ReorderEngine
+from demand_matrix import DemandMatrix
 from reporting import InventoryBST, AuditList
-from floor_operations import ShippingQueue, SafetyCheck, BlockedQueue
+from floor_operations import ShippingQueue, SafetyCheck, BlockedQueue, OrderRecord, StockedOrderView, AvailableToPromise
+from queue_journal import open_journal
 
 app = FastAPI(title="PIRS API", description="Inventory Management & Reorder System API")
 
@@ -22,8 +38,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize DB on startup
-setup_database()
+# Startup is non-destructive: pending schema migrations only (seed demo data with `python database_setup.py`)
+startup_report = {"phases_ms": {}, "ready_ms": None, "first_request_ms": None, "migrations": {}}
+
+@contextmanager
+def startup_phase(name):
+    start = time.perf_counter()
+    yield
+    startup_report["phases_ms"][name] = round((time.perf_counter() - start) * 1000, 1)
+
+@app.middleware("http")
+async def record_first_request(request: Request, call_next):
+    if startup_report["first_request_ms"] is None:
+        startup_report["first_request_ms"] = round((time.perf_counter() - _import_started) * 1000, 1)
+    return await call_next(request)
+
+@app.middleware("http")
+async def sync_queue_journal(request: Request, call_next):
+    # Multi-worker: apply the other workers' queue changes first, so a write on one is visible on all
+    if journal.shared:
+        await run_in_threadpool(journal.sync)
+    return await call_next(request)
 
 # --- Data Models ---
 class Order(BaseModel):
@@ -46,46 +81,214 @@ class OrderCreate(BaseModel):
 # --- Global State (Simulation) ---
 # --- Global State (Simulation) ---
 # In a real app, these would be in a proper DB or persistent store
-shipping_queue = ShippingQueue()
-blocked_queue = BlockedQueue() # New Blocked Queue
+def publish_queue_change(event_type, payload):
+    """Bumps the queue version and forwards the mutation to open dashboard streams, with live stock attached."""
+    versions.bump('queue')
+    atp.on_change(event_type, payload)
+    category_rollup.on_change(event_type, payload)
+    if event_type == 'aged':
+        # Every queued order's score moved with the clock: one snapshot instead of N deltas
+        queue_events.hub.resync()
+        return
+    if not queue_events.hub.has_subscribers():
+        return # Nobody listening: skip the stock lookup entirely
+    flipped = atp.flush()
+    if event_type in ('enqueued', 'reprioritised', 'blocked'):
+        payload = with_stock(payload)
+    queue_events.hub.publish(event_type, payload)
+    # Other orders of the SKU whose available-to-promise changed with this one
+    for record in flipped:
+        if record.order_id != payload.get('order_id'):
+            queue_events.hub.publish('reprioritised', with_stock(record))
+
+def with_stock(order):
+    """Order payload plus live stock and its available-to-promise flag, for the stream."""
+    current_stock = catalog_stock(order.get('item_sku'))
+    promise = atp.promise(order.get('order_id'))
+    available = promise[0] if promise else current_stock >= (order.get('qty') or 1)
+    return {**order, 'current_stock': current_stock, 'stock_available': available}
+
+shipping_queue = ShippingQueue(on_change=publish_queue_change)
+atp = AvailableToPromise(shipping_queue, lambda sku: catalog_stock(sku)) # Cumulative per-SKU reservations in priority order
+blocked_queue = BlockedQueue(on_change=publish_queue_change) # New Blocked Queue
 safety_officer = SafetyCheck()
 safety_officer.add_blocked_lot("LOT-EXP-202X") # Sample blocked lot
+forecast_store = get_forecast_store(load=False) # Running per-SKU demand stats (O(1) forecast reads), loaded on startup
+reorder_index = ReorderIndex(forecast_store.days_remaining) # Maintained reorder Min-Heaps
+category_rollup = CategoryRollup() # Per-category aggregates, kept current by the catalog's and queue's deltas
+catalog = ProductCatalog(rollup=category_rollup) # Columnar product master, loaded on startup and kept in sync by writers
+demand_matrix = DemandMatrix() # Memory-mapped SKU x day demand, appended from sales_history
+
+# --- Queue Mutations ---
+# Every change to the queues, and to the in-memory state they are scored from, is recorded
+# in the journal as (op, payload) and applied by its handler below. With several workers
+# each one replays every entry in the same order (see queue_journal); `now` is the queue
+# time the change was made at (None when applied in place).
+def apply_enqueue(payload, now):
+    shipping_queue.add_order(OrderRecord.from_dict(payload['order']), now)
+    versions.bump('orders')
+
+def apply_block(payload, now):
+    blocked_queue.add_blocked_order(payload['order'], payload['reason'])
+
+def apply_remove(payload, now):
+    shipping_queue.remove_orders(payload['order_ids'])
+
+def apply_dispatch(payload, now):
+    result = payload['result']
+    forecast_store.apply_sales(result['sale_states'])
+    for sku, new_stock in result['stock'].items():
+        catalog.set_stock(sku, new_stock)
+        catalog.set_avg_sale(sku, forecast_store.avg_sales(sku))
+        atp.mark_dirty(sku)
+        reorder_index.update(sku, stock=new_stock)
+        reorder_engine.mark_dirty(sku)
+        queue_events.hub.publish('stock', {'sku': sku, 'stock': new_stock})
 
-# Populate Queues from DB on Startup
-def populate_queues():
+    shipped_ids = [order_id for order_id, _, _ in result['shipped']]
+    short_ids = [order_id for order_id, _, _ in result['short']]
+    removed = shipping_queue.remove_orders(shipped_ids + short_ids)
+    for order_id in short_ids:
+        record = removed.get(order_id)
+        if record is not None:
+            blocked_queue.add_blocked_order(record, payload['short_reason'])
+    # Orders still queued for the dispatched SKUs see the new stock
+    for sku, days_left in payload['days_remaining'].items():
+        shipping_queue.reprioritise_sku(sku, days_left, now)
+    versions.bump('orders', 'catalog')
+
+def apply_stock(payload, now):
+    sku, new_stock = payload['sku'], payload['stock']
+    catalog.set_stock(sku, new_stock)
+    atp.mark_dirty(sku)
+    reorder_index.update(sku, stock=new_stock)
+    reorder_engine.mark_dirty(sku)
+    queue_events.hub.publish('stock', {'sku': sku, 'stock': new_stock})
+    # Re-scores only the queued orders for the SKU (O(k log N) for its k orders)
+    shipping_queue.reprioritise_sku(sku, payload['days_remaining'], now)
+    versions.bump('catalog')
+
+def apply_release(payload, now):
+    for order in blocked_queue.release(payload['order_ids']):
+        order.days_remaining = payload['days_remaining']
+        shipping_queue.add_order(order, now)
+    versions.bump('orders')
+
+def apply_product(payload, now):
+    sku = payload['sku']
+    catalog.add(sku, payload['name'], payload['stock'], payload['lead'], payload['cost'], forecast_store.avg_sales(sku),
+                payload.get('category'))
+    reorder_index.update(sku, name=payload['name'], stock=payload['stock'], lead=payload['lead'])
+    reorder_engine.mark_dirty(sku)
+    versions.bump('catalog')
+
+def apply_product_removed(payload, now):
+    sku = payload['sku']
+    forecast_store.forget(sku)
+    catalog.remove(sku)
+    reorder_index.remove(sku)
+    reorder_engine.mark_dirty(sku)
+    versions.bump('catalog')
+
+journal = open_journal({
+    'enqueue': apply_enqueue, 'block': apply_block, 'remove': apply_remove, 'dispatch': apply_dispatch,
+    'stock': apply_stock, 'release': apply_release, 'product': apply_product, 'product_removed': apply_product_removed,
+}, clock=shipping_queue.stamp)
+# Precomputed reorder points / EOQ, refreshed per changed SKU; reads its catalog inputs under the journal lock
+reorder_engine = ReorderEngine(catalog, forecast_store, demand_matrix, catalog_lock=journal.lock)
+
+# Queue contents on startup, as journal entries
+def queue_snapshot():
     from data_ingestion import get_all_orders
     all_orders = get_all_orders()
-    products = get_product_lookup()
+    products = catalog
     
     print(f"Populating queues with {len(all_orders)} orders...")
     for order in all_orders:
         product = products.get(order['sku'], {})
-        # Calculate days remaining (Mock logic based on stock)
+        # Days remaining from the incremental forecast state
         days_left = 30
-        if product and product.get('stock', 0) > 0:
-             days_left = max(1, int(product['stock'] / 5))
+        if product:
+             days_left = forecast_store.days_remaining(order['sku'], product['stock'])
              
-        order_details = {
-            'order_id': order['order_id'],
-            'customer': f"Customer {order['customer_tier']}", # Mock name
-            'item_sku': order['sku'],
-            'item_name': order.get('product_name', product.get('name', 'Unknown')),
-            'tier': order['customer_tier'],
-            'days_remaining': days_left,
-            'qty': order['qty_requested'],
-            'total_amount': order.get('total_amount', 0),
-            'status': order['status']
-        }
+        order_details = OrderRecord(
+            order_id=order['order_id'],
+            customer=f"Customer {order['customer_tier']}", # Mock name
+            item_sku=order['sku'],
+            item_name=order.get('product_name') or product.get('name', 'Unknown'),
+            tier=order['customer_tier'],
+            days_remaining=days_left,
+            qty=order['qty_requested'],
+            total_amount=order.get('total_amount', 0),
+            status=order['status']
+        )
         
         if order['status'] == 'BLOCKED':
-            blocked_queue.add_blocked_order(order_details, "Manual Block / Stock Issue")
+            yield 'block', {'order': order_details, 'reason': "Manual Block / Stock Issue"}
         elif order['status'] == 'PENDING':
-             shipping_queue.add_order(order_details)
+            yield 'enqueue', {'order': order_details}
         # SHIPPED orders are ignored for the active queue
 
+def conditional_json(request, route, deps, build, extra=None):
+    """
+    Serves build() as JSON with a strong ETag derived from the data versions in `deps`
+    (plus `extra`, for inputs that change without a version bump).
+
+    A matching If-None-Match is answered 304 before build() runs, so unchanged
+    data costs neither DB reads nor serialisation; otherwise the serialised
+    body is reused for as long as the versions stay the same.
+    """
+    from fastapi.responses import Response
+
+    if 'queue' in deps:
+        shipping_queue.advance() # Aged priorities bump the queue version before the tag is taken
+    etag = versions.etag(deps, extra)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    body = versions.cached_body(route, etag)
+    if body is None:
+        body = serialise(build())
+        versions.store_body(route, etag, body)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @app.on_event("startup")
 async def startup_event():
-    populate_queues()
+    startup_report["phases_ms"]["import"] = round((time.perf_counter() - _import_started) * 1000, 1)
+    with startup_phase("migrations"):
+        startup_report["migrations"] = migrate_all()
+    with startup_phase("forecast_state"):
+        forecast_store.load()
+    with startup_phase("catalog"):
+        catalog.load(avg_sale=forecast_store.avg_sales)
+    with startup_phase("reorder_index"):
+        reorder_index.rebuild(dict(catalog.items()))
+    with startup_phase("demand_matrix"):
+        demand_matrix.open()
+    with startup_phase("reorder_plan"):
+        reorder_engine.load().refresh()
+    with startup_phase("queues"):
+        epoch = journal.start(queue_snapshot)
+        if epoch is not None:
+            shipping_queue.epoch = epoch # Shared by every worker, so their aging clocks agree
+        journal.sync()
+        journal.follow()
+    startup_report["ready_ms"] = round((time.perf_counter() - _import_started) * 1000, 1)
+
+    if not len(catalog):
+        print("No products found. Seed demo data with `python database_setup.py` (drops existing data).")
+    print("Startup timings (ms): " + ", ".join(f"{name} {ms}" for name, ms in startup_report["phases_ms"].items())
+          + f" | ready {startup_report['ready_ms']}")
+
+@app.on_event("shutdown")
+def shutdown_event():
+    journal.leave()
+
+@app.get("/api/admin/startup")
+def get_startup_report():
+    """Per-phase startup timings, time until ready and until the first request was served (ms since import)."""
+    return startup_report
 
 @app.get("/")
 def read_root():
@@ -95,25 +298,25 @@ def read_root():
 
 @app.post("/api/orders")
 def create_order(new_order: OrderCreate):
-    import sqlite3
     import uuid
     from datetime import datetime
     
-    order_id = f"ORD-{uuid.uuid4().hex[:4].upper()}"
+    order_id = f"ORD-{uuid.uuid4().hex[:8].upper()}" # 4 hex digits collided with the seeded ORD-1000.. IDs
     order_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     
     try:
-        # 1. Fetch Product Details for Price & Name
-        products = get_product_lookup()
-        product = products.get(new_order.sku)
+        # 1. Fetch Product Details for Price & Name (copied under the journal lock: a concurrent remove moves rows)
+        with journal.lock:
+            product = catalog.get(new_order.sku)
+            product = product.to_dict() if product else None
         
         if not product:
              raise HTTPException(status_code=404, detail="Product SKU not found.")
              
         total_amount = product['price'] * new_order.qty_requested
         
-        # 2. Insert into DB
-        conn = sqlite3.connect('pirs_warehouse.db')
+        # 2. Insert into DB (the shard that owns the SKU)
+        conn = connect_for_sku(new_order.sku)
         cursor = conn.cursor()
         
         cursor.execute(
@@ -128,23 +331,20 @@ def create_order(new_order: OrderCreate):
         conn.close()
         
         # 3. Add to Simulation Queue (ShippingQueue)
-        days_left = max(1, int(product['stock'] / 5)) 
+        days_left = forecast_store.days_remaining(new_order.sku, product['stock'])
         
-        order_details = {
-            'order_id': order_id,
-            'customer': new_order.customer, # We might want to store name in DB too, but schema seems to use tier only or I misread. 
-                                            # Checking DB Schema in data_ingestion or seed_db might be wise, but assuming this works for now.
-                                            # Actually get_all_orders uses customer_tier, doesn't seem to have a customer NAME column in the SELECT * usually?
-                                            # Let's check get_all_orders return.
-            'item_sku': new_order.sku,
-            'item_name': product['name'],
-            'tier': new_order.customer_tier,
-            'days_remaining': days_left,
-            'qty': new_order.qty_requested,
-            'total_amount': total_amount,
-            'status': 'PENDING'
-        }
-        shipping_queue.add_order(order_details)
+        order_details = OrderRecord(
+            order_id=order_id,
+            customer=new_order.customer, # customer_orders only stores the tier, so the name lives in the queue only
+            item_sku=new_order.sku,
+            item_name=product['name'],
+            tier=new_order.customer_tier,
+            days_remaining=days_left,
+            qty=new_order.qty_requested,
+            total_amount=total_amount,
+            status='PENDING'
+        )
+        journal.record('enqueue', {'order': order_details})
         
         return {"message": f"Order {order_id} created successfully.", "order_id": order_id}
 
@@ -156,90 +356,92 @@ def create_order(new_order: OrderCreate):
 @app.post("/api/orders/enqueue")
 def enqueue_order(order: Order):
     # Fetch product details for priority calculation
-    products = get_product_lookup()
-    product = products.get(order.item_sku, {})
+    with journal.lock:
+        product = catalog.get(order.item_sku)
+        product = product.to_dict() if product else {}
     
-    # Calculate simplistic "Days Remaining" (Inverse of stock for simulation)
+    # Days Remaining from the incremental forecast state
     days_left = 30 
-    if product and product.get('stock', 0) > 0:
-        days_left = max(1, int(product['stock'] / 5)) 
+    if product:
+        days_left = forecast_store.days_remaining(order.item_sku, product['stock'])
         
-    order_details = {
-        'order_id': order.order_id,
-        'customer': order.customer,
-        'item_sku': order.item_sku,
-        'item_name': product.get('name', 'Unknown Product'),
-        'tier': 1 if "VIP" not in order.customer else 2, 
-        'days_remaining': days_left,
-        'qty': 1,
-        'total_amount': product.get('price', 0) * 1, # Default qty 1 for new enqueue
-        'status': 'PENDING'
-    }
+    order_details = OrderRecord(
+        order_id=order.order_id,
+        customer=order.customer,
+        item_sku=order.item_sku,
+        item_name=product.get('name', 'Unknown Product'),
+        tier=1 if "VIP" not in order.customer else 2, 
+        days_remaining=days_left,
+        qty=1,
+        total_amount=product.get('price', 0) * 1, # Default qty 1 for new enqueue
+        status='PENDING'
+    )
     
-    shipping_queue.add_order(order_details)
+    journal.record('enqueue', {'order': order_details})
     return {"status": "queued", "message": f"Order {order.order_id} added to Smart Batch Queue."}
 
 @app.get("/api/shipping/queue")
 def view_queue():
-    return shipping_queue.get_queue_status()
+    return [order.to_dict() for order in shipping_queue.get_queue_status()]
 
 @app.get("/api/shipping/dashboard")
-def get_shipping_dashboard():
+def get_shipping_dashboard(request: Request):
     """
     Returns data for the Smart Shipment Dashboard (Command Center).
     """
+    return conditional_json(request, "shipping_dashboard", ('queue', 'orders', 'catalog'), build_shipping_dashboard)
+
+def build_shipping_dashboard():
     # 1. Main Priority Queue (Sorted by Score)
     raw_queue = shipping_queue.get_queue_status()
     
     # --- SELF-HEALING: Verify against DB to remove "Zombie" Shipped Orders ---
     # This fixes state mismatch if in-memory queue wasn't updated correctly
     if raw_queue:
-        import sqlite3
         try:
-            conn = sqlite3.connect('pirs_warehouse.db')
-            cursor = conn.cursor()
-            
-            # Get IDs currently in the queue
-            queue_ids = [o['order_id'] for o in raw_queue]
+            # Get IDs currently in the queue, grouped by the shard of their SKU
+            ids_by_shard = {}
+            for o in raw_queue:
+                ids_by_shard.setdefault(shard_for_sku(o.get('item_sku')), []).append(o['order_id'])
             
             # Check which of these are actually SHIPPED in the DB
-            placeholders = ','.join(['?'] * len(queue_ids))
-            query = f"SELECT order_id FROM customer_orders WHERE order_id IN ({placeholders}) AND status = 'SHIPPED'"
-            cursor.execute(query, queue_ids)
-            shipped_in_db = {row[0] for row in cursor.fetchall()}
-            
-            conn.close()
+            shipped_in_db = set()
+            for index, queue_ids in ids_by_shard.items():
+                conn = connect_shard(index)
+                cursor = conn.cursor()
+                placeholders = ','.join(['?'] * len(queue_ids))
+                query = f"SELECT order_id FROM customer_orders WHERE order_id IN ({placeholders}) AND status = 'SHIPPED'"
+                cursor.execute(query, queue_ids)
+                shipped_in_db.update(row[0] for row in cursor.fetchall())
+                conn.close()
             
             # Filter them out from our display list AND clean up the heap
             if shipped_in_db:
                 print(f"[SELF-HEAL] Found {len(shipped_in_db)} shipped orders still in queue. Removing: {shipped_in_db}")
                 raw_queue = [o for o in raw_queue if o['order_id'] not in shipped_in_db]
-                for oid in shipped_in_db:
-                    shipping_queue.remove_order(oid)
+                journal.record('remove', {'order_ids': sorted(shipped_in_db)})
                     
         except Exception as e:
             print(f"[SELF-HEAL ERROR] Could not verify DB status: {e}")
 
-    # Inject Real-Time Stock Data
-    products = get_product_lookup()
+    # Inject Real-Time Stock Data (slotted views; fields are merged only when serialised)
+    # stock_available is the cumulative available-to-promise, recomputed only for changed SKUs.
+    # Read under the journal lock, which every writer of the catalog and queues holds
     priority_queue = []
-    
-    for order in raw_queue:
-        sku = order.get('item_sku')
-        current_stock = products.get(sku, {}).get('stock', 0)
-        
-        # Add stock status to the order object
-        priority_queue.append({
-            **order,
-            'current_stock': current_stock,
-            'stock_available': current_stock >= order.get('qty', 1)
-        })
-
-    # 2. Optimized Pick List (Aggregated)
-    pick_list = shipping_queue.get_optimized_pick_list()
-    
-    # 3. Blocked Orders (Safety Gate)
-    blocked_orders = blocked_queue.get_blocked_list()
+    with journal.lock:
+        stock_column, stock_index = catalog.stock, catalog.index
+        atp.flush()
+
+        for order in raw_queue:
+            row = stock_index.get(order.item_sku)
+            current_stock = int(stock_column[row]) if row is not None else 0
+            priority_queue.append(StockedOrderView(order, current_stock, atp.available(order.order_id)))
+
+        # 2. Optimized Pick List (Aggregated)
+        pick_list = shipping_queue.get_optimized_pick_list()
+
+        # 3. Blocked Orders (Safety Gate)
+        blocked_orders = blocked_queue.get_blocked_list()
     
     return {
         "priority_queue": priority_queue, 
@@ -248,25 +450,91 @@ def get_shipping_dashboard():
         "queue_count": len(priority_queue)
     }
 
+@app.get("/api/shipping/stream")
+async def stream_shipping_dashboard(request: Request):
+    """
+    Server-Sent Events push version of /api/shipping/dashboard.
+
+    Sends one 'snapshot' event (same shape as the dashboard), then 'deltas'
+    events: enqueued / removed / reprioritised / blocked / unblocked / stock.
+    When the aging clock ticks (every score changes) a fresh 'snapshot' is sent instead.
+    Changes are coalesced per order and SKU, so slow clients only ever
+    receive the latest state; an idle queue costs one keepalive per client
+    every few seconds.
+    """
+    from fastapi.responses import StreamingResponse
+    from starlette.concurrency import run_in_threadpool
+
+    async def event_source():
+        # Subscribe before snapshotting so nothing falls between the two;
+        # deltas are idempotent, so replaying one the snapshot already has is harmless
+        subscriber = queue_events.hub.subscribe()
+        try:
+            snapshot = await run_in_threadpool(build_shipping_dashboard)
+            yield queue_events.format_sse('snapshot', snapshot)
+            while not await request.is_disconnected():
+                batch = await subscriber.next_batch()
+                if batch is None:
+                    await run_in_threadpool(shipping_queue.advance) # An idle queue still ages: resyncs on the next tick
+                    yield ": keepalive\n\n"
+                elif batch == queue_events.RESYNC:
+                    snapshot = await run_in_threadpool(build_shipping_dashboard)
+                    yield queue_events.format_sse('snapshot', snapshot)
+                elif batch:
+                    yield queue_events.format_sse('deltas', batch)
+        finally:
+            queue_events.hub.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def catalog_stock(sku):
+    row = catalog.index.get(sku)
+    return int(catalog.stock[row]) if row is not None else 0
+
+@app.get("/api/shipping/waves")
+def get_pick_waves(request: Request, max_units: int = 200, max_orders: int = 25):
+    """
+    Pick waves for the current queue under trolley limits (units / orders per wave).
+    Re-planned only when the queue or stock changes; otherwise served from the version cache.
+    Send a wave's order_ids to /api/shipping/dispatch-wave to dispatch it.
+    """
+    max_units, max_orders = max(1, max_units), max(1, max_orders)
+
+    def build():
+        with journal.lock:
+            waves, unfulfillable, stats = plan_waves(shipping_queue.get_queue_status(), catalog_stock, max_units, max_orders)
+        return {
+            "waves": [
+                {
+                    "wave": number,
+                    "order_ids": [order.order_id for order, _ in wave],
+                    "orders": len(wave),
+                    "units": sum(qty for _, qty in wave),
+                    "pick_list": wave_pick_list(wave)
+                }
+                for number, wave in enumerate(waves, start=1)
+            ],
+            "unfulfillable": unfulfillable,
+            "stats": stats
+        }
+
+    return conditional_json(request, f"pick_waves:{max_units}:{max_orders}", ('queue', 'catalog'), build)
+
 @app.get("/api/dashboard/summary")
-def get_dashboard_summary():
-    print("DEBUG: Entering get_dashboard_summary")
+def get_dashboard_summary(request: Request):
+    return conditional_json(request, "dashboard_summary", ('catalog',), build_dashboard_summary)
+
+def build_dashboard_summary():
     try:
-        products = get_product_lookup()
-        print(f"DEBUG: Found {len(products)} products")
-        bst = InventoryBST()
-        for sku, details in products.items():
-            # Approx logic for days remaining
-            days = max(1, int(details['stock'] / 5)) 
-            bst.insert(days, sku, details) 
-        
-        print("DEBUG: BST Built")
-        report = bst.get_stability_report()
-        print(f"DEBUG: Report size: {len(report)}")
-        critical_count = len([i for i in report if i['days_remaining'] < 7])
+        # Summed over the category rollup: O(categories), no per-SKU pass
+        critical_count = category_rollup.overall()['critical_count']
         
         return {
-            "total_sku_count": len(products),
+            "total_sku_count": len(catalog),
             "critical_stock_alert": critical_count,
             "system_status": "Operational"
         }
@@ -419,32 +687,40 @@ def download_report(lang: str = "en"):
     ctx = t.get(lang, t["en"])
 
     # --- 1. GATHER DATA ---
-    products = get_product_lookup()
-    
-    # Inventory BST & Stability
-    bst = InventoryBST()
-    total_inventory_value = 0
-    overstocked_items = []
-    
-    for sku, details in products.items():
-        stock_val = details.get('stock', 0)
-        price_val = details.get('price', 0)
-        total_inventory_value += (stock_val * price_val)
-        
-        days = max(1, int(stock_val / 5)) # Mock consumption
-        bst.insert(days, sku, details)
-        
-        if days > 60:
-            overstocked_items.append({'sku': sku, 'name': details['name'], 'days': days, 'value': stock_val * price_val})
+    # Every in-memory mutation goes through the journal, so holding its lock gives one
+    # consistent state for all the figures below. Only this gathering runs under it
+    # (milliseconds); the PDF is built afterwards from plain values, without blocking order intake.
+    # The reorder plan is brought up to date first, outside the lock: after a day rollover that
+    # recomputes and persists every SKU, and mutating endpoints and the journal follower would wait on it.
+    reorder_engine.refresh()
+    with journal.lock:
+        # Inventory Stability: value, critical and pending totals from the category rollup (O(categories)),
+        # the rest vectorized over the catalog
+        overall = category_rollup.overall()
+        total_inventory_value = overall['stock_value']
+        critical_items_count = overall['critical_count']
+        pending_value = overall['pending_value']
+        days_column = catalog.days_remaining()
+        overstocked_items = catalog.overstocked(60, limit=5, days=days_column)
+        total_items = len(catalog) or 1
+        stable_count = catalog.count_at_least(15, days=days_column)
 
-    stability_report = bst.get_stability_report()
-    
-    # Order Queues
-    raw_queue = shipping_queue.get_queue_status()
-    blocked_orders = blocked_queue.get_blocked_list()
-    
-    # Min-Heap for Critical Alerts
-    reorder_heap = build_reorder_heap() # Returns list of (score, sku)
+        # Order Queues
+        raw_queue = shipping_queue.get_queue_status()
+        atp.flush()
+        ready_count = sum(1 for o in raw_queue if atp.available(o.order_id))
+        # Mock "At Risk" logic for report (e.g., expiry < 48h)
+        at_risk_count = len([o for o in raw_queue if "VIP" in str(o.get('customer', ''))]) # Proxy for demo
+        blocked_orders = [order.to_dict() for order in blocked_queue.get_blocked_list()]
+
+        # Min-Heap for Critical Alerts (maintained index, no per-report rebuild),
+        # with the product fields and reorder plan the table shows
+        critical_reorders = []
+        for item in reorder_index.top(8):
+            prod = catalog.get(item['sku'])
+            if prod:
+                plan = reorder_engine.plan.get(item['sku']) or {}
+                critical_reorders.append({**item, 'name': prod['name'], 'stock': prod['stock'], 'plan': plan})
 
     # --- 2. GENERATE PDF ---
     buffer = io.BytesIO()
@@ -475,9 +751,6 @@ def download_report(lang: str = "en"):
     # SECTION 1: EXECUTIVE SNAPSHOT
     elements.append(Paragraph(ctx["exec_snapshot"], subtitle_style))
     
-    pending_value = sum([o.get('total_amount', 0) for o in raw_queue])
-    critical_items_count = len([i for i in stability_report if i['days_remaining'] < 7])
-    total_items = len(products) if products else 1
     health_score = int(((total_items - critical_items_count) / total_items) * 100)
     
     # Mock Audit Progress derived from "Circular Linked List" concept
@@ -509,29 +782,24 @@ def download_report(lang: str = "en"):
 
     reorder_data = [ctx["reorder_cols"]]
     
-    # Process top 5 from heap
-    heap_copy = reorder_heap[:]
-    count = 0
-    while heap_copy and count < 8:
-        score, sku = heapq.heappop(heap_copy)
-        prod = products.get(sku)
-        if not prod: continue
-        
-        days_left = max(0, int(prod['stock'] / 5)) # Simple mock forecast
+    # Process top 8 from heap (already in ascending days order)
+    for item in critical_reorders:
+        days_left = item['days_remaining']
         
         # Filter for only critical/warning
         if days_left > 10: continue
 
-        rec = f"{ctx['buy']} {max(10, int(prod['stock']*0.5))} {ctx['units']}"
+        plan = item['plan']
+        buy_qty = plan.get('suggested_qty') or plan.get('eoq') or max(10, int(item['stock']*0.5))
+        rec = f"{ctx['buy']} {buy_qty} {ctx['units']}"
         status = f"({ctx['critical']})" if days_left < 3 else f"({ctx['warning']})"
         
         reorder_data.append([
-            prod['name'][:25],
-            str(prod['stock']),
+            item['name'][:25],
+            str(item['stock']),
             f"{days_left} {ctx['days_suffix']} {status}",
             rec
         ])
-        count += 1
 
     if len(reorder_data) > 1:
         t_reorder = Table(reorder_data, colWidths=[180, 80, 120, 120])
@@ -551,9 +819,6 @@ def download_report(lang: str = "en"):
     # SECTION 3: SHIPMENT & FULFILLMENT (Priority Queue)
     elements.append(Paragraph(ctx["shipment_status"], subtitle_style))
     
-    ready_count = len([o for o in raw_queue if o.get('stock_available')])
-    # Mock "At Risk" logic for report (e.g., expiry < 48h)
-    at_risk_count = len([o for o in raw_queue if "VIP" in str(o.get('customer', ''))]) # Proxy for demo
     blocked_count = len(blocked_orders)
     
     elements.append(Paragraph(f"<b>{ctx['ready']}:</b> {ready_count} {ctx['orders_suffix']}", normal_style))
@@ -570,7 +835,6 @@ def download_report(lang: str = "en"):
     # SECTION 4: INVENTORY STABILITY (BST)
     elements.append(Paragraph(ctx["inventory_stability"], subtitle_style))
     
-    stable_count = len([i for i in stability_report if i['days_remaining'] >= 15])
     stable_pct = int((stable_count / total_items) * 100)
     
     elements.append(Paragraph(f"<b>{ctx['stable_stock']}:</b> {stable_pct}% of SKUs.", normal_style))
@@ -609,42 +873,90 @@ def download_report(lang: str = "en"):
     )
 
 @app.get("/api/priority/top")
-def get_top_priority():
-    heap = build_reorder_heap()
-    if not heap:
-        return {}
-    
-    score, sku = heapq.heappop(heap)
-    products = get_product_lookup()
-    product = products.get(sku, {})
-    
-    # Approx logic again
-    days = max(1, int(product.get('stock', 0) / 5))
-    
-    return {
-        "name": product.get('name', 'Unknown'),
-        "days_remaining": days,
-        "current_stock": product.get('stock', 0),
-        "sku": sku,
-        "score": score
-    }
+def get_top_priority(k: Optional[int] = None):
+    """
+    Most urgent reorder from the maintained heap, with its precomputed reorder point and order quantity.
+    Without `k` returns the single top item; with `?k=N` a list of the N most urgent (O(k log k)).
+    """
+    reorder_engine.refresh() # Before the journal lock: a refresh takes it to read the catalog
+    with journal.lock:
+        top = [with_reorder_plan(item) for item in reorder_index.top(1 if k is None else max(0, k))]
+    if k is None:
+        return top[0] if top else {}
+    return top
+
+def with_reorder_plan(item):
+    plan = reorder_engine.plan.get(item['sku'])
+    if not plan:
+        return item
+    return {**item, **{key: plan[key] for key in ('reorder_point', 'safety_stock', 'eoq', 'suggested_qty', 'needs_reorder')}}
+
+@app.get("/api/reorder/suggestions")
+def get_reorder_suggestions(request: Request, limit: Optional[int] = None, all_skus: bool = False):
+    """
+    Precomputed reorder plan: reorder point (lead-time demand + safety stock) and EOQ per SKU.
+    Only SKUs at or below their reorder point unless `?all_skus=true`; most urgent first.
+    """
+    route = f"reorder_suggestions:{limit}:{all_skus}"
+    # The demand window slides daily, so the plan date is part of the tag (refresh() rolls the plan over to it)
+    return conditional_json(request, route, ('catalog',), lambda: reorder_engine.suggestions(limit=limit, only_needed=not all_skus),
+                            extra=date.today().isoformat())
+
+@app.get("/api/priority/below")
+def get_priority_below(days: float = 7):
+    """All SKUs with fewer than `days` days of cover, most urgent first."""
+    with journal.lock:
+        return reorder_index.below(days)
+
+@app.get("/api/priority/under-lead-time")
+def get_priority_under_lead_time():
+    """All SKUs that will stock out before a reorder placed today arrives."""
+    with journal.lock:
+        return reorder_index.under_lead_time()
 
 @app.get("/api/inventory/stability")
-def get_inventory_stability():
-    products = get_product_lookup()
+def get_inventory_stability(request: Request):
+    return conditional_json(request, "inventory_stability", ('catalog',), build_inventory_stability)
+
+def build_inventory_stability():
+    with journal.lock: # Rows are copied out: a concurrent add / remove grows or reorders the columns
+        days_column = catalog.days_remaining()
+        rows = [(days, sku, details.to_dict()) for (sku, details), days in zip(catalog.items(), days_column.tolist())]
     bst = InventoryBST()
-    for sku, details in products.items():
-        days = max(1, int(details['stock'] / 5))
+    for days, sku, details in rows:
         bst.insert(days, sku, details)
         
     return bst.get_stability_report()
 
+@app.get("/api/categories")
+def get_categories(request: Request):
+    """Per-category stock value, critical count, queued order value and days of cover, plus the totals."""
+    return conditional_json(request, "categories", ('catalog', 'queue'),
+                            lambda: {"categories": category_rollup.summary(), "total": category_rollup.overall()})
+
+@app.get("/api/categories/{category}")
+def get_category(category: str):
+    """Drill-down: one category's figures and its SKUs, lowest days remaining first."""
+    with journal.lock:
+        figures = category_rollup.category(category)
+        if figures is None:
+            raise HTTPException(status_code=404, detail=f"Category '{category}' not found.")
+        products = category_rollup.products_in(category)
+        for row in products:
+            product = catalog.get(row['sku'])
+            row['name'] = product['name'] if product else None
+    return {**figures, "products": products}
+
 @app.get("/api/audit/next")
-def get_audit_list():
+def get_audit_list(request: Request):
+    return conditional_json(request, "audit_next", ('catalog',), build_audit_list)
+
+def build_audit_list():
     # Build a fresh list for the view
-    products = get_product_lookup()
     audit_list = AuditList()
-    for sku in products.keys():
+    with journal.lock:
+        skus = list(catalog.keys())
+    for sku in skus:
         audit_list.add_product(sku)
         
     # Get next 5
@@ -654,52 +966,105 @@ def get_audit_list():
         
     return {"audit_sequence": sequence}
 
+# --- Streaming Exports ---
+
+@app.get("/api/exports/{dataset}")
+def export_dataset(
+    dataset: str,
+    fmt: str = Query("csv", alias="format"),
+    include_archive: bool = False,
+    all_skus: bool = False,
+    max_units: int = 200,
+    max_orders: int = 25
+):
+    """
+    Streams a full dataset as CSV or JSONL (?format=csv|jsonl):
+      stability - every SKU by days remaining
+      reorder   - reorder plan, most urgent first (?all_skus=true for every SKU)
+      picklist  - pick lines of the planned waves (?max_units, ?max_orders)
+      orders    - every order, newest first (?include_archive=true adds archived orders)
+    Rows are generated and encoded in bounded chunks, so memory doesn't grow with the export size.
+    """
+    from fastapi.responses import StreamingResponse
+
+    if fmt not in export_stream.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format '{fmt}'. Use csv or jsonl.")
+
+    # In-memory datasets are snapshotted under the journal lock (one consistent state, see
+    # download_report); the orders export reads a DB snapshot while it streams
+    if dataset == "stability":
+        with journal.lock:
+            columns, rows = export_stream.STABILITY_COLUMNS, export_stream.stability_rows(catalog)
+    elif dataset == "reorder":
+        reorder_engine.refresh() # Before the lock, as in download_report
+        with journal.lock:
+            columns, rows = export_stream.REORDER_COLUMNS, export_stream.reorder_rows(reorder_engine, all_skus)
+    elif dataset == "picklist":
+        with journal.lock:
+            waves, _, _ = plan_waves(shipping_queue.get_queue_status(), catalog_stock, max(1, max_units), max(1, max_orders))
+        columns, rows = export_stream.PICKLIST_COLUMNS, export_stream.picklist_rows(waves)
+    elif dataset == "orders":
+        columns, rows = export_stream.ORDER_COLUMNS, export_stream.order_rows(include_archive)
+    else:
+        raise HTTPException(status_code=404, detail=f"Unknown export '{dataset}'. Use stability, reorder, picklist or orders.")
+
+    return StreamingResponse(
+        export_stream.encode_rows(rows, columns, fmt),
+        media_type=export_stream.MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f"attachment; filename=pirs_{dataset}.{fmt}"}
+    )
+
 @app.get("/api/orders/history")
-def get_order_history():
+def get_order_history(request: Request, include_archive: bool = False):
+    """Hot orders by default; `?include_archive=true` also reads the monthly archives of shipped orders."""
     from data_ingestion import get_all_orders
-    return get_all_orders()
+    route = "orders_history_archive" if include_archive else "orders_history"
+    return conditional_json(request, route, ('orders',), lambda: get_all_orders(include_archive))
+
+@app.post("/api/admin/archive")
+def archive_cold_orders(horizon_days: int = 90):
+    """
+    Moves SHIPPED orders and sales older than `horizon_days` into monthly
+    archive DBs. Sales totals stay in the hot sales_rollup table, so
+    forecasts are unchanged.
+    """
+    from archival import archive_cold_data
+    try:
+        demand_matrix.update() # Matrix must hold every sale before it leaves the hot table
+        result = archive_cold_data(horizon_days)
+        versions.bump('orders')
+        return result
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def apply_dispatch_result(result, short_reason="Insufficient stock"):
+    """Mirrors a committed dispatch transaction into the in-memory state (see apply_dispatch)."""
+    forecast_store.apply_sales(result['sale_states']) # Days remaining below include these sales
+    days_left = {sku: forecast_store.days_remaining(sku, stock) for sku, stock in result['stock'].items()}
+    journal.record('dispatch', {'result': result, 'short_reason': short_reason, 'days_remaining': days_left})
 
 @app.post("/api/orders/{order_id}/dispatch")
 def dispatch_order(order_id: str):
-    import sqlite3
     try:
-        conn = sqlite3.connect('pirs_warehouse.db')
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        # 1. Get Order Details
-        cursor.execute("SELECT * FROM customer_orders WHERE order_id = ?", (order_id,))
-        order = cursor.fetchone()
-        
-        if not order:
+        shard = find_order_shard(order_id)
+        if shard is None:
             raise HTTPException(status_code=404, detail="Order not found")
-            
-        if order['status'] == 'SHIPPED':
-             return {"message": f"Order {order_id} is already shipped."}
 
-        # 2. Check Stock
-        cursor.execute("SELECT current_stock FROM products WHERE sku = ?", (order['sku'],))
-        product = cursor.fetchone()
-        
-        if not product:
-             raise HTTPException(status_code=404, detail="Product not found")
-             
-        if product['current_stock'] < order['qty_requested']:
+        # Orders live in the same shard as their product, so one local transaction suffices.
+        # The stock decrement is conditional, so concurrent dispatches can't oversell.
+        result = dispatch_wave_on_shard(shard, [order_id], forecast_store, block_short=False)
+
+        if result['skipped']:
+            status = result['skipped'][0][1]
+            if status == 'SHIPPED':
+                return {"message": f"Order {order_id} is already shipped."}
+            raise HTTPException(status_code=400, detail=f"Order {order_id} is {status} and cannot be dispatched.")
+        if result['short']:
+            if result['short'][0][1] not in result['stock']:
+                raise HTTPException(status_code=404, detail="Product not found")
             raise HTTPException(status_code=400, detail="Insufficient stock to dispatch.")
 
-        # 3. Update Stock
-        new_stock = product['current_stock'] - order['qty_requested']
-        cursor.execute("UPDATE products SET current_stock = ? WHERE sku = ?", (new_stock, order['sku']))
-        
-        # 4. Update Order Status
-        cursor.execute("UPDATE customer_orders SET status = 'SHIPPED' WHERE order_id = ?", (order_id,))
-        
-        conn.commit()
-        conn.close()
-        
-        # 5. Remove from In-Memory Queue (Simulation)
-        shipping_queue.remove_order(order_id)
-        
+        apply_dispatch_result(result)
         return {"message": f"Order {order_id} dispatched successfully. Stock updated."}
         
     except HTTPException:
@@ -707,6 +1072,54 @@ def dispatch_order(order_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+class WaveDispatch(BaseModel):
+    count: Optional[int] = Field(None, ge=0) # Dispatch the top N orders of the priority queue (default 50)...
+    order_ids: Optional[List[str]] = None # ...or exactly these orders (e.g. a pick list), in this order
+
+@app.post("/api/shipping/dispatch-wave")
+def dispatch_wave(wave: WaveDispatch):
+    """
+    Dispatches a whole wave atomically: one transaction per shard with
+    conditional stock decrements, in priority order. Orders that can't be
+    fulfilled are marked BLOCKED and moved to the BlockedQueue.
+    """
+    try:
+        if wave.order_ids:
+            order_ids = list(dict.fromkeys(wave.order_ids)) # De-duplicate, keep order
+            queued = shipping_queue.records(order_ids) # Under the queue lock: other threads mutate it meanwhile
+        else:
+            top = shipping_queue.peek_top(50 if wave.count is None else wave.count) # count=0 dispatches nothing
+            order_ids = [order.order_id for order in top]
+            queued = {order.order_id: order for order in top}
+
+        # Route each order to its shard (queued orders carry their SKU; others are looked up)
+        by_shard = {}
+        not_found = []
+        for order_id in order_ids:
+            record = queued.get(order_id)
+            shard = shard_for_sku(record.item_sku) if record else find_order_shard(order_id)
+            if shard is None:
+                not_found.append(order_id)
+            else:
+                by_shard.setdefault(shard, []).append(order_id)
+
+        shipped, blocked, skipped = [], [], [(order_id, None) for order_id in not_found]
+        for shard, shard_ids in by_shard.items():
+            result = dispatch_wave_on_shard(shard, shard_ids, forecast_store)
+            apply_dispatch_result(result)
+            shipped.extend(order_id for order_id, _, _ in result['shipped'])
+            blocked.extend(order_id for order_id, _, _ in result['short'])
+            skipped.extend(result['skipped'])
+
+        return {
+            "message": f"Wave dispatched: {len(shipped)} shipped, {len(blocked)} blocked, {len(skipped)} skipped.",
+            "shipped": shipped,
+            "blocked": blocked,
+            "skipped": [{"order_id": order_id, "status": status} for order_id, status in skipped]
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 # --- Inventory Management (CRUD) ---
 
 class ProductCreate(BaseModel):
@@ -715,53 +1128,118 @@ class ProductCreate(BaseModel):
     current_stock: int
     lead_time_days: int
     unit_cost: float
+    category: Optional[str] = None # Default: the "(Category)" suffix of the name
 
 @app.post("/api/products")
 def create_product(prod: ProductCreate):
     import sqlite3
     try:
-        conn = sqlite3.connect('pirs_warehouse.db')
+        category = prod.category or parse_category(prod.name)
+        conn = connect_for_sku(prod.sku)
         cursor = conn.cursor()
         cursor.execute(
-            "INSERT INTO products (sku, name, current_stock, lead_time_days, unit_cost) VALUES (?, ?, ?, ?, ?)",
-            (prod.sku, prod.name, prod.current_stock, prod.lead_time_days, prod.unit_cost)
+            "INSERT INTO products (sku, name, current_stock, lead_time_days, unit_cost, category) VALUES (?, ?, ?, ?, ?, ?)",
+            (prod.sku, prod.name, prod.current_stock, prod.lead_time_days, prod.unit_cost, category)
         )
         conn.commit()
         conn.close()
+        journal.record('product', {'sku': prod.sku, 'name': prod.name, 'stock': prod.current_stock,
+                                   'lead': prod.lead_time_days, 'cost': prod.unit_cost, 'category': category})
         return {"message": f"Product {prod.sku} created successfully."}
     except sqlite3.IntegrityError:
         raise HTTPException(status_code=400, detail="SKU already exists.")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def release_restocked(sku, stock):
+    """
+    Re-validates the stock-blocked orders of one SKU after a restock and moves
+    the ones the new stock covers (after the orders already queued for it)
+    back into the ShippingQueue, highest tier first.
+    Work is bounded by the SKU's own blocked and queued orders.
+    Returns the released order IDs.
+    """
+    available = stock - sum(order.qty or 1 for order in shipping_queue.orders_for_sku(sku))
+    candidates = blocked_queue.releasable(sku, available)
+    if not candidates:
+        return []
+    reopened = reopen_blocked_on_shard(shard_for_sku(sku), [order.order_id for order in candidates])
+    if reopened:
+        journal.record('release', {'order_ids': reopened, 'days_remaining': forecast_store.days_remaining(sku, stock)})
+    return reopened
+
+def apply_stock_change(sku, new_stock):
+    """Mirrors a committed stock level into the in-memory state (see apply_stock) and releases restocked orders."""
+    journal.record('stock', {'sku': sku, 'stock': new_stock, 'days_remaining': forecast_store.days_remaining(sku, new_stock)})
+    return release_restocked(sku, new_stock)
+
 @app.put("/api/products/{sku}/stock")
 def update_stock(sku: str, update: StockUpdate):
-    import sqlite3
     try:
-        conn = sqlite3.connect('pirs_warehouse.db')
+        conn = connect_for_sku(sku)
         cursor = conn.cursor()
         cursor.execute("UPDATE products SET current_stock = ? WHERE sku = ?", (update.new_stock, sku))
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail="Product not found.")
         conn.commit()
         conn.close()
-        return {"message": f"Stock for {sku} updated to {update.new_stock}"}
+        released = apply_stock_change(sku, update.new_stock)
+        return {"message": f"Stock for {sku} updated to {update.new_stock}", "released_orders": released}
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.put("/api/products/stock")
+def bulk_update_stock(updates: List[StockUpdate]):
+    """
+    Bulk stock import: one transaction per shard, then each changed SKU is
+    mirrored in memory and its blocked orders re-validated (see release_restocked).
+    """
+    try:
+        latest = {update.sku: update.new_stock for update in updates} # Last entry per SKU wins
+        by_shard = {}
+        for sku, new_stock in latest.items():
+            by_shard.setdefault(shard_for_sku(sku), []).append((new_stock, sku))
+
+        updated, not_found = [], []
+        for shard, rows in by_shard.items():
+            conn = connect_shard(shard)
+            try:
+                cursor = conn.cursor()
+                for new_stock, sku in rows:
+                    cursor.execute("UPDATE products SET current_stock = ? WHERE sku = ?", (new_stock, sku))
+                    (updated if cursor.rowcount else not_found).append(sku)
+                conn.commit()
+            finally:
+                conn.close()
+
+        released = {}
+        for sku in updated:
+            ids = apply_stock_change(sku, latest[sku])
+            if ids:
+                released[sku] = ids
+        return {
+            "message": f"Stock updated for {len(updated)} products.",
+            "updated": len(updated),
+            "not_found": not_found,
+            "released_orders": released
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.delete("/api/products/{sku}")
 def delete_product(sku: str):
-    import sqlite3
     try:
-        conn = sqlite3.connect('pirs_warehouse.db')
+        conn = connect_for_sku(sku)
         cursor = conn.cursor()
         cursor.execute("DELETE FROM products WHERE sku = ?", (sku,))
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail="Product not found.")
+        cursor.execute("DELETE FROM forecast_state WHERE sku = ?", (sku,))
         conn.commit()
         conn.close()
+        journal.record('product_removed', {'sku': sku})
         return {"message": f"Product {sku} deleted."}
     except HTTPException:
         raise
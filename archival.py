@@ -0,0 +1,193 @@
+"""
+Hot/cold tiering for customer_orders and sales_history.
+
+SHIPPED orders and sales older than the horizon move out of the hot shard
+files into monthly archive databases (ARCHIVE_DIR/YYYY-MM.db), so hot-table
+scans stay bounded by the horizon instead of the whole business history.
+
+Archived sales are folded into the hot `sales_rollup` table (per SKU and
+month), so forecasts keep their all-time totals without the archives.
+Archive readers (order history, demand matrix rebuilds) attach the monthly
+files on demand.
+
+    python archival.py --horizon-days 90
+"""
+import argparse
+import glob
+import os
+import sqlite3
+from datetime import date, timedelta
+from db_router import SHARD_COUNT, connect_shard
+
+ARCHIVE_DIR = os.environ.get("PIRS_ARCHIVE_DIR", "pirs_archive")
+# Shipped orders / sales older than this many days are archived
+ARCHIVE_AFTER_DAYS = 90
+
+ORDER_COLUMNS = "order_id, customer_tier, order_date, sku, product_name, qty_requested, total_amount, status"
+
+
+def archive_path(month):
+    return os.path.join(ARCHIVE_DIR, f"{month}.db")
+
+
+def archive_paths():
+    """Monthly archive files, oldest first."""
+    return sorted(glob.glob(os.path.join(ARCHIVE_DIR, "????-??.db")))
+
+
+def create_rollup_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sales_rollup (
+            sku TEXT,
+            month TEXT,
+            total_sold INTEGER NOT NULL DEFAULT 0,
+            sale_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (sku, month)
+        )
+    ''')
+
+
+def create_archive_tables(cursor, schema="main"):
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {schema}.customer_orders (
+            order_id TEXT PRIMARY KEY,
+            customer_tier INTEGER,
+            order_date DATE,
+            sku TEXT,
+            product_name TEXT,
+            qty_requested INTEGER,
+            total_amount REAL,
+            status TEXT
+        )
+    ''')
+    # txn_id is only unique per shard, so the archive keys on both
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {schema}.sales_history (
+            shard INTEGER,
+            txn_id INTEGER,
+            sku TEXT,
+            qty_sold INTEGER,
+            sale_date DATE,
+            PRIMARY KEY (shard, txn_id)
+        )
+    ''')
+
+
+def archive_shard(shard, cutoff):
+    """
+    Moves one shard's cold rows into the monthly archives, one month per transaction.
+
+    The archive copy is written with INSERT OR IGNORE before the hot rows
+    are deleted, so a run interrupted between the two is safely re-run.
+    Returns: {'orders': n, 'sales': n, 'months': [...]}
+    """
+    moved = {'orders': 0, 'sales': 0, 'months': []}
+    conn = connect_shard(shard)
+    cursor = conn.cursor()
+    try:
+        create_rollup_table(cursor)
+        conn.commit()
+        cursor.execute(
+            """
+            SELECT strftime('%Y-%m', order_date) FROM customer_orders WHERE status = 'SHIPPED' AND order_date < ?
+            UNION
+            SELECT strftime('%Y-%m', sale_date) FROM sales_history WHERE sale_date < ?
+            """,
+            (cutoff, cutoff)
+        )
+        months = sorted(row[0] for row in cursor.fetchall() if row[0])
+
+        os.makedirs(ARCHIVE_DIR, exist_ok=True)
+        for month in months:
+            cursor.execute("ATTACH DATABASE ? AS archive", (archive_path(month),))
+            try:
+                create_archive_tables(cursor, "archive")
+                conn.commit()
+
+                order_filter = "status = 'SHIPPED' AND order_date < ? AND strftime('%Y-%m', order_date) = ?"
+                sale_filter = "sale_date < ? AND strftime('%Y-%m', sale_date) = ?"
+                cursor.execute(f"INSERT OR IGNORE INTO archive.customer_orders SELECT {ORDER_COLUMNS} FROM customer_orders WHERE {order_filter}", (cutoff, month))
+                cursor.execute(f"DELETE FROM customer_orders WHERE {order_filter}", (cutoff, month))
+                moved['orders'] += cursor.rowcount
+
+                cursor.execute(
+                    f"""
+                    INSERT INTO sales_rollup (sku, month, total_sold, sale_count)
+                    SELECT sku, ?, SUM(qty_sold), COUNT(*) FROM sales_history WHERE {sale_filter} GROUP BY sku
+                    ON CONFLICT(sku, month) DO UPDATE SET
+                        total_sold = total_sold + excluded.total_sold,
+                        sale_count = sale_count + excluded.sale_count
+                    """,
+                    (month, cutoff, month)
+                )
+                cursor.execute(
+                    f"INSERT OR IGNORE INTO archive.sales_history SELECT ?, txn_id, sku, qty_sold, sale_date FROM sales_history WHERE {sale_filter}",
+                    (shard, cutoff, month)
+                )
+                cursor.execute(f"DELETE FROM sales_history WHERE {sale_filter}", (cutoff, month))
+                moved['sales'] += cursor.rowcount
+                conn.commit()
+                moved['months'].append(month)
+            except sqlite3.Error:
+                conn.rollback()
+                raise
+            finally:
+                cursor.execute("DETACH DATABASE archive")
+    finally:
+        conn.close()
+    return moved
+
+
+def archive_cold_data(horizon_days=ARCHIVE_AFTER_DAYS):
+    """Archives every shard. Returns totals plus the months touched."""
+    cutoff = (date.today() - timedelta(days=horizon_days)).isoformat()
+    totals = {'cutoff': cutoff, 'orders': 0, 'sales': 0, 'months': set()}
+    for shard in range(SHARD_COUNT):
+        moved = archive_shard(shard, cutoff)
+        totals['orders'] += moved['orders']
+        totals['sales'] += moved['sales']
+        totals['months'].update(moved['months'])
+    totals['months'] = sorted(totals['months'])
+    return totals
+
+
+def _read_archives(query, params=(), newest_first=False):
+    """Runs `query` against every monthly archive (oldest first by default) and yields its rows."""
+    paths = archive_paths()
+    for path in (reversed(paths) if newest_first else paths):
+        # Readers may be resumed from other threads (streamed responses)
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        try:
+            yield from conn.execute(query, params)
+        finally:
+            conn.close()
+
+
+def iter_archived_orders():
+    """Archived (shipped) order rows, newest first. Months don't overlap, so no merge is needed."""
+    return _read_archives(f"SELECT {ORDER_COLUMNS} FROM customer_orders ORDER BY order_date DESC", newest_first=True)
+
+
+def get_archived_orders():
+    """Archived (shipped) orders, newest first, as dicts shaped like customer_orders rows."""
+    columns = [c.strip() for c in ORDER_COLUMNS.split(',')]
+    return [dict(zip(columns, row)) for row in iter_archived_orders()]
+
+
+def get_archived_sales():
+    """(sku, sale_date, qty_sold) rows from every archive, oldest month first."""
+    return _read_archives("SELECT sku, sale_date, qty_sold FROM sales_history")
+
+
+def earliest_archived_sale():
+    dates = [row[0] for row in _read_archives("SELECT MIN(sale_date) FROM sales_history") if row[0]]
+    return min(dates) if dates else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move shipped orders and old sales into monthly archive databases.")
+    parser.add_argument("--horizon-days", type=int, default=ARCHIVE_AFTER_DAYS)
+    args = parser.parse_args()
+    result = archive_cold_data(args.horizon_days)
+    print(f"Archived {result['orders']} orders and {result['sales']} sales older than {result['cutoff']} "
+          f"into {len(result['months'])} monthly archive(s).")
@@ -0,0 +1,270 @@
+"""
+Rolling-origin backtest of the demand forecasts used across PIRS.
+
+Replays the daily demand history in the DemandMatrix: at every origin
+(one each --step days over the last --eval-days) each method forecasts a
+daily rate from the days before the origin only, and is scored against the
+actual demand over the next --horizon days. All SKUs and all origins of a
+chunk of matrix columns are evaluated at once with cumulative-sum array
+arithmetic; chunks can run in worker processes reading the memory-mapped
+matrix.
+
+Methods (the daily rate each one treats as the burn rate):
+    sale_mean    average sale over all history (calculate_priority_score / ForecastStore)
+    active_90    last 90 days' demand / days with sales (data_manager.calculate_forecast)
+    calendar_90  last 90 days' demand / calendar days since the first sale in
+                 the window (ReorderEngine's demand_statistics)
+    ewma         exponentially weighted average sale (ForecastStore.ewma)
+The matrix holds daily totals, so several sales of a SKU on one day count
+as one sale of their sum.
+
+Metrics per SKU and method, over the origins:
+    mape             mean |error| / actual of the horizon total, % (origins with demand only)
+    mase             mean |error| / in-sample MAE of the naive "same as the previous horizon" forecast
+    bias             total error / total actual demand, % (positive = over-forecast)
+    stockout_misses  origins where stock sized to the forecast (rate x horizon, i.e.
+                     "days remaining = horizon") ran out before the horizon ended
+
+    python backtest.py --out backtest_output --horizon 14 --step 7 --eval-days 365 --workers 4
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from collections import deque
+import numpy as np
+from demand_matrix import DEMAND_DIR, DemandMatrix
+from export_stream import FORMATS, write_rows
+from forecast_state import EWMA_ALPHA
+from reorder_engine import HISTORY_DAYS
+
+METHODS = ('sale_mean', 'active_90', 'calendar_90', 'ewma')
+METRICS = ('mape', 'mase', 'bias', 'stockout_misses')
+RESULT_COLUMNS = ('sku', 'method', 'origins') + METRICS
+# Matrix columns per evaluation chunk: bounds memory to ~chunk x days x 40 bytes
+CHUNK_SKUS = 5000
+
+
+def _ratio(numerator, denominator):
+    """numerator / denominator, 0 where the denominator is 0 (no sales: no burn)."""
+    return np.divide(numerator, denominator, out=np.zeros(np.broadcast(numerator, denominator).shape), where=denominator > 0)
+
+
+def ewma_at(demand, sold, origins, alpha=EWMA_ALPHA):
+    """
+    Per-column EWMA of the sale sizes, as of each origin (days before it only).
+    One vectorized step per day, updating only the columns that sold that day.
+    Returns an (origins x SKUs) array.
+    """
+    width = demand.shape[1]
+    ewma = np.zeros(width)
+    seen = np.zeros(width, dtype=bool)
+    out = np.empty((len(origins), width))
+    j = 0
+    for day in range(origins[-1]):
+        while j < len(origins) and origins[j] == day:
+            out[j] = ewma
+            j += 1
+        today = sold[day]
+        ewma = np.where(today, np.where(seen, alpha * demand[day] + (1 - alpha) * ewma, demand[day]), ewma)
+        seen |= today
+    out[j:] = ewma
+    return out
+
+
+def forecast_rates(demand, origins, window=HISTORY_DAYS):
+    """Daily rate per method as of each origin: {method: (origins x SKUs) array}."""
+    days, width = demand.shape
+    sold = demand > 0
+    cum = np.zeros((days + 1, width))
+    np.cumsum(demand, axis=0, out=cum[1:])
+    active = np.zeros((days + 1, width), dtype=np.int32)
+    np.cumsum(sold, axis=0, out=active[1:])
+    # next_sale[d] = first day >= d with a sale (`days` if none)
+    next_sale = np.full((days + 1, width), days, dtype=np.int32)
+    next_sale[:days] = np.where(sold, np.arange(days, dtype=np.int32)[:, None], days)
+    next_sale = np.minimum.accumulate(next_sale[::-1], axis=0)[::-1]
+
+    start = np.maximum(origins - window, 0)
+    window_total = cum[origins] - cum[start]
+    span = np.maximum(origins[:, None] - next_sale[start], 0) # From the first sale in the window
+    return {
+        'sale_mean': _ratio(cum[origins], active[origins]),
+        'active_90': _ratio(window_total, active[origins] - active[start]),
+        'calendar_90': _ratio(window_total, span),
+        'ewma': ewma_at(demand, sold, origins),
+    }, cum
+
+
+def evaluate_block(block, origins, horizon):
+    """
+    Scores every method on a dense (days x SKUs) demand block.
+    Origin t forecasts from days [0, t) and is scored on days [t, t + horizon).
+    Returns {method: {metric: array per SKU, plus 'error_sum' / 'actual_sum'}}.
+    """
+    origins = np.asarray(origins)
+    demand = np.asarray(block, dtype=np.float64)
+    rates, cum = forecast_rates(demand, origins)
+    actual = cum[origins + horizon] - cum[origins]
+
+    # MASE scale: in-sample MAE of the naive forecast "next horizon = previous horizon", before the first origin
+    ends = np.arange(2 * horizon, origins[0] + 1)
+    if len(ends):
+        totals_now = cum[ends] - cum[ends - horizon]
+        totals_before = cum[ends - horizon] - cum[ends - 2 * horizon]
+        scale = np.abs(totals_now - totals_before).mean(axis=0)
+    else:
+        scale = np.zeros(demand.shape[1])
+
+    has_demand = actual > 0
+    demand_origins = has_demand.sum(axis=0)
+    actual_sum = actual.sum(axis=0)
+    results = {}
+    for method, rate in rates.items():
+        error = rate * horizon - actual
+        abs_error = np.abs(error)
+        ape = np.divide(abs_error, actual, out=np.zeros_like(actual), where=has_demand)
+        error_sum = error.sum(axis=0)
+        results[method] = {
+            'mape': np.where(demand_origins > 0, 100 * ape.sum(axis=0) / np.maximum(demand_origins, 1), np.nan),
+            'mase': np.where(scale > 0, abs_error.mean(axis=0) / np.where(scale > 0, scale, 1), np.nan),
+            'bias': np.where(actual_sum > 0, 100 * error_sum / np.where(actual_sum > 0, actual_sum, 1), np.nan),
+            'stockout_misses': (error < 0).sum(axis=0),
+            'error_sum': error_sum,
+            'actual_sum': actual_sum,
+        }
+    return results
+
+
+def plan_origins(days, horizon, step, eval_days):
+    """Ascending origin days: every `step` days over the last `eval_days`, each leaving a full horizon to score."""
+    last = days - horizon
+    first = max(2 * horizon, last - eval_days + 1)
+    if last < first:
+        return np.array([], dtype=np.int64)
+    return np.arange(last, first - 1, -step)[::-1]
+
+
+def backtest_columns(directory, first, last, origins, horizon):
+    """Worker entry point: evaluates matrix columns [first, last) from a read-only mapping."""
+    matrix = DemandMatrix(directory).open(update=False)
+    block = np.array(matrix.view()[:, first:last]) # One contiguous copy of the chunk
+    return matrix.skus[first:last], evaluate_block(block, origins, horizon)
+
+
+def run_backtest(directory, skus, origins, horizon, workers=1, chunk=CHUNK_SKUS):
+    """
+    Evaluates every matrix column in chunks, in column order.
+    Yields (skus, results) per chunk. With workers > 1 chunks run in a
+    process pool, at most two per worker in flight (as stream_forecast does).
+    """
+    chunks = [(directory, first, min(first + chunk, skus), origins, horizon) for first in range(0, skus, chunk)]
+    if workers == 1:
+        for args in chunks:
+            yield backtest_columns(*args)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor # Only multi-worker runs pay for multiprocessing
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for args in chunks:
+            pending.append(pool.submit(backtest_columns, *args))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _value(x):
+    x = float(x)
+    return None if math.isnan(x) else round(x, 3)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--out', default='backtest_output', help="Output directory")
+    parser.add_argument('--format', choices=FORMATS, default='csv')
+    parser.add_argument('--horizon', type=int, default=14, help="Days each forecast is scored over")
+    parser.add_argument('--step', type=int, default=7, help="Days between origins")
+    parser.add_argument('--eval-days', type=int, default=365, help="Span of history the origins cover")
+    parser.add_argument('--workers', type=int, default=1, help="Worker processes")
+    parser.add_argument('--chunk', type=int, default=CHUNK_SKUS, help="SKUs per evaluation chunk")
+    parser.add_argument('--demand-dir', default=DEMAND_DIR, help="DemandMatrix directory")
+    parser.add_argument('--no-update', action='store_true', help="Use the stored matrix without syncing it from sales_history")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    matrix = DemandMatrix(args.demand_dir).open(update=not args.no_update)
+    if matrix.data is None or not matrix.days:
+        print("Error: no demand history. Seed data with `python database_setup.py` first.", file=sys.stderr)
+        return 1
+    origins = plan_origins(matrix.days, args.horizon, args.step, args.eval_days)
+    if not len(origins):
+        print(f"Error: {matrix.days} days of history is too short for a {args.horizon}-day horizon.", file=sys.stderr)
+        return 1
+    skus = len(matrix.skus)
+    print(f"Backtest: {skus:,} SKUs x {matrix.days} days, {len(origins)} origins "
+          f"({matrix.date_of(int(origins[0]))} .. {matrix.date_of(int(origins[-1]))}), horizon {args.horizon}d", file=sys.stderr)
+
+    os.makedirs(args.out, exist_ok=True)
+    totals = {method: {'mape': [], 'mase': [], 'error_sum': 0.0, 'actual_sum': 0.0, 'misses': 0, 'wins': 0} for method in METHODS}
+
+    def rows():
+        done = 0
+        for chunk_skus, results in run_backtest(matrix.directory, skus, origins, args.horizon, max(1, args.workers), args.chunk):
+            # Best method per SKU by MASE (ties and unscored SKUs count for nobody)
+            mase = np.vstack([np.nan_to_num(results[m]['mase'], nan=np.inf) for m in METHODS])
+            lowest = mase.min(axis=0)
+            sole = (mase == lowest).sum(axis=0) == 1 # argmin alone would hand a tie to the first method
+            best = np.where(np.isfinite(lowest) & sole, mase.argmin(axis=0), -1)
+            for i, method in enumerate(METHODS):
+                result, total = results[method], totals[method]
+                total['mape'].append(result['mape'][~np.isnan(result['mape'])])
+                total['mase'].append(result['mase'][~np.isnan(result['mase'])])
+                total['error_sum'] += float(result['error_sum'].sum())
+                total['actual_sum'] += float(result['actual_sum'].sum())
+                total['misses'] += int(result['stockout_misses'].sum())
+                total['wins'] += int((best == i).sum())
+            for j, sku in enumerate(chunk_skus):
+                for method in METHODS:
+                    result = results[method]
+                    yield (sku, method, len(origins), _value(result['mape'][j]), _value(result['mase'][j]),
+                           _value(result['bias'][j]), int(result['stockout_misses'][j]))
+            done += len(chunk_skus)
+            print(f"\r  {done:,}/{skus:,} SKUs  {time.perf_counter() - start:6.1f}s", end='', file=sys.stderr)
+        print(file=sys.stderr)
+
+    path = os.path.join(args.out, f"backtest.{args.format}")
+    count = write_rows(path, rows(), RESULT_COLUMNS, args.format)
+
+    summary = {'skus': skus, 'days': matrix.days, 'origins': len(origins), 'horizon': args.horizon, 'methods': {}}
+    for method in METHODS:
+        total = totals[method]
+        mape, mase = np.concatenate(total['mape']), np.concatenate(total['mase'])
+        summary['methods'][method] = {
+            'median_mape': _value(np.median(mape)) if len(mape) else None,
+            'median_mase': _value(np.median(mase)) if len(mase) else None,
+            'bias': _value(100 * total['error_sum'] / total['actual_sum']) if total['actual_sum'] else None,
+            'stockout_miss_rate': _value(100 * total['misses'] / (skus * len(origins))),
+            'best_for_skus': total['wins'],
+        }
+    summary['seconds'] = round(time.perf_counter() - start, 3)
+    with open(os.path.join(args.out, 'summary.json'), 'w') as f:
+        json.dump(summary, f, indent=2)
+
+    print(f"\n{count:,} rows -> {path} ({summary['seconds']}s)")
+    print(f"{'method':<13}{'median MAPE %':>15}{'median MASE':>13}{'bias %':>9}{'stockout miss %':>17}{'best for SKUs':>15}")
+    for method, stats in summary['methods'].items():
+        print(f"{method:<13}{_fmt(stats['median_mape']):>15}{_fmt(stats['median_mase']):>13}{_fmt(stats['bias']):>9}"
+              f"{_fmt(stats['stockout_miss_rate']):>17}{stats['best_for_skus']:>15,}")
+    return 0
+
+
+def _fmt(value):
+    return '-' if value is None else f"{value:.2f}"
+
+
+if __name__ == '__main__':
+    sys.exit(main())
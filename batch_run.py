@@ -0,0 +1,243 @@
+"""
+Headless nightly batch run over the full catalog of an existing database.
+
+Never reseeds: pending schema migrations are applied first (as on API
+startup), then the stages only read the database (the reorder stage also
+brings the shared demand matrix up to date, as the API does). Results are
+streamed to CSV/JSONL files chunk by chunk, so memory stays bounded by the
+chunk/partition sizes rather than the catalog size.
+
+Stages (outputs in --out):
+    forecast   forecast.<fmt>    days remaining per SKU (parallel range scans)
+    reorder    reorder.<fmt>     the --top most urgent SKUs at or below their reorder point, with
+                                 safety stock and EOQ (the same plan as /api/reorder/suggestions)
+    stability  stability.<fmt>   every SKU sorted by days remaining (external merge sort)
+    audit      audit.<fmt>       audit rotation order, --audits-per-day shelves per day
+plus summary.json with per-stage row counts and timings.
+
+    python batch_run.py --out batch_output --format csv --workers 4
+"""
+import argparse
+import heapq
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from db_router import all_shard_paths
+from migrations import migrate_all
+from export_stream import FORMATS, CHUNK_ROWS, CRITICAL_DAYS, STABILITY_COLUMNS, iter_cursor, write_rows
+from prediction_engine import FORECAST_WORKERS, PARTITION_SKUS, stream_forecast
+from demand_matrix import DemandMatrix
+from reorder_engine import HISTORY_DAYS, compute_plan, demand_statistics
+
+STAGES = ('forecast', 'reorder', 'stability', 'audit')
+FORECAST_COLUMNS = ('sku', 'name', 'current_stock', 'lead_time_days', 'unit_cost', 'days_remaining')
+REORDER_COLUMNS = ('rank', 'sku', 'name', 'current_stock', 'lead_time_days', 'avg_daily', 'std_daily',
+                   'safety_stock', 'reorder_point', 'eoq', 'suggested_qty')
+AUDIT_COLUMNS = ('position', 'audit_day', 'sku', 'name')
+
+
+class Progress:
+    """Throttled progress line on stderr: rows done, % of total, elapsed time."""
+    def __init__(self, stage, total=None, interval=1.0):
+        self.stage = stage
+        self.total = total
+        self.interval = interval
+        self.count = 0
+        self.start = time.perf_counter()
+        self.last = 0.0
+
+    def advance(self, n=1):
+        self.count += n
+        now = time.perf_counter()
+        if now - self.last >= self.interval:
+            self.last = now
+            self._print()
+
+    def _print(self, end='\r'):
+        pct = f" ({self.count * 100 // self.total}%)" if self.total else ""
+        print(f"[{self.stage}] {self.count:,} rows{pct} {time.perf_counter() - self.start:.1f}s", end=end, file=sys.stderr, flush=True)
+
+    def finish(self):
+        self._print(end='\n')
+        return time.perf_counter() - self.start
+
+
+def connect_ro(path):
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+
+
+def count_products():
+    total = 0
+    for path in all_shard_paths():
+        conn = connect_ro(path)
+        total += conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+        conn.close()
+    return total
+
+
+def spill_run(rows, directory, index):
+    """Writes one sorted run of the external sort as JSON lines. Returns its path."""
+    rows.sort()
+    path = os.path.join(directory, f"run{index:05d}.jsonl")
+    with open(path, 'w', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps(row))
+            f.write('\n')
+    return path
+
+
+def read_run(path):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            yield tuple(json.loads(line))
+
+
+def run_forecast(args, out, timings, total):
+    """
+    Streams the forecast to disk while feeding the reorder list (bounded to
+    --top entries) and the stability sort runs (bounded to --chunk-size rows).
+    """
+    progress = Progress('forecast', total)
+    top = [] # The --top most urgent reorders so far, as (stock - reorder point, sku, name, plan)
+    run_paths, run_rows = [], []
+    stats = {'critical': 0, 'under_lead_time': 0}
+    # Reorder plan per chunk: the ReorderEngine's vectorized math over the same demand matrix
+    matrix = DemandMatrix().open() if 'reorder' in args.stages and args.top else None
+
+    def plan_chunk(chunk):
+        skus = [row[1] for row in chunk]
+        mean, std = demand_statistics(matrix.window(skus, HISTORY_DAYS))
+        plan = compute_plan(skus, [row[3] for row in chunk], [row[4] for row in chunk], [row[5] for row in chunk], mean, std)
+        due = [(record['stock'] - record['reorder_point'], record['sku'], row[2], record)
+               for row, record in zip(chunk, plan) if record['needs_reorder']]
+        top[:] = heapq.nsmallest(args.top, top + due, key=lambda entry: entry[:2]) # Same order as the API
+
+    def rows():
+        for chunk in stream_forecast(args.workers, partition_size=args.partition_size, details=True):
+            if matrix is not None:
+                plan_chunk(chunk)
+            for days, sku, name, stock, lead, cost in chunk:
+                if days < CRITICAL_DAYS:
+                    stats['critical'] += 1
+                if days < lead:
+                    stats['under_lead_time'] += 1
+                if 'stability' in args.stages:
+                    run_rows.append((days, sku, name, stock, cost))
+                    if len(run_rows) >= args.chunk_size:
+                        run_paths.append(spill_run(run_rows, args.tmp, len(run_paths)))
+                        run_rows.clear()
+                yield (sku, name, stock, lead, cost, days)
+            progress.advance(len(chunk))
+
+    # The forecast still feeds reorder/stability when its own file isn't wanted
+    path = os.path.join(out, f"forecast.{args.format}") if 'forecast' in args.stages else os.devnull
+    count = write_rows(path, rows(), FORECAST_COLUMNS, args.format, args.chunk_rows)
+    if run_rows:
+        run_paths.append(spill_run(run_rows, args.tmp, len(run_paths)))
+        run_rows.clear()
+    timings['forecast'] = {'rows': count, 'seconds': round(progress.finish(), 3), **stats}
+    return top, run_paths
+
+
+def run_reorder(args, out, timings, top):
+    start = time.perf_counter()
+    # Furthest below the reorder point first (top is already in that order)
+    rows = ((rank, sku, name, plan['stock'], plan['lead_time'], plan['avg_daily'], plan['std_daily'],
+             plan['safety_stock'], plan['reorder_point'], plan['eoq'], plan['suggested_qty'])
+            for rank, (_, sku, name, plan) in enumerate(top, 1))
+    count = write_rows(os.path.join(out, f"reorder.{args.format}"), rows, REORDER_COLUMNS, args.format, args.chunk_rows)
+    timings['reorder'] = {'rows': count, 'seconds': round(time.perf_counter() - start, 3)}
+    print(f"[reorder] top {count:,} written", file=sys.stderr)
+
+
+def run_stability(args, out, timings, run_paths, total):
+    """k-way merges the sorted runs into one file ordered by days remaining (BST in-order equivalent)."""
+    progress = Progress('stability', total)
+
+    def rows():
+        for days, sku, name, stock, cost in heapq.merge(*(read_run(path) for path in run_paths)):
+            progress.advance()
+            yield (sku, name, stock, cost, days, "CRITICAL" if days < CRITICAL_DAYS else "STABLE")
+
+    count = write_rows(os.path.join(out, f"stability.{args.format}"), rows(), STABILITY_COLUMNS, args.format, args.chunk_rows)
+    for path in run_paths:
+        os.remove(path)
+    timings['stability'] = {'rows': count, 'seconds': round(progress.finish(), 3), 'sorted_runs': len(run_paths)}
+
+
+def run_audit(args, out, timings, total):
+    """Audit rotation (AuditList order) across shards, merged by SKU straight from DB cursors."""
+    progress = Progress('audit', total)
+    conns = [connect_ro(path) for path in all_shard_paths()]
+    try:
+        cursors = [iter_cursor(conn.execute("SELECT sku, name FROM products ORDER BY sku"), args.chunk_rows) for conn in conns]
+
+        def rows():
+            for position, (sku, name) in enumerate(heapq.merge(*cursors)):
+                progress.advance()
+                yield (position + 1, position // args.audits_per_day + 1, sku, name)
+
+        count = write_rows(os.path.join(out, f"audit.{args.format}"), rows(), AUDIT_COLUMNS, args.format, args.chunk_rows)
+    finally:
+        for conn in conns:
+            conn.close()
+    timings['audit'] = {'rows': count, 'seconds': round(progress.finish(), 3)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--out', default='batch_output', help="Output directory")
+    parser.add_argument('--format', choices=FORMATS, default='csv')
+    parser.add_argument('--stages', default=','.join(STAGES), help="Comma-separated subset of: " + ', '.join(STAGES))
+    parser.add_argument('--workers', type=int, default=FORECAST_WORKERS, help="Forecast worker processes")
+    parser.add_argument('--partition-size', type=int, default=PARTITION_SKUS, help="SKUs per forecast range")
+    parser.add_argument('--chunk-size', type=int, default=100000, help="Rows per sorted run of the stability sort")
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help="Rows per write to the output files")
+    parser.add_argument('--top', type=int, default=1000, help="Most urgent SKUs kept for the reorder list")
+    parser.add_argument('--audits-per-day', type=int, default=50)
+    args = parser.parse_args(argv)
+
+    args.stages = [stage.strip() for stage in args.stages.split(',') if stage.strip()]
+    unknown = [stage for stage in args.stages if stage not in STAGES]
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(unknown)}")
+
+    missing = [path for path in all_shard_paths() if not os.path.exists(path)]
+    if missing:
+        print(f"Error: database file(s) not found: {', '.join(missing)}. Run `python database_setup.py` first.", file=sys.stderr)
+        return 1
+    migrate_all() # The stages read tables added by migrations (e.g. sales_rollup)
+
+    os.makedirs(args.out, exist_ok=True)
+    run_start = time.perf_counter()
+    timings = {}
+    total = count_products()
+    print(f"PIRS batch run: {total:,} SKUs, stages {', '.join(args.stages)} -> {args.out}/", file=sys.stderr)
+
+    with tempfile.TemporaryDirectory(prefix="pirs_batch_") as tmp:
+        args.tmp = tmp
+        if {'forecast', 'reorder', 'stability'} & set(args.stages):
+            top, run_paths = run_forecast(args, args.out, timings, total)
+            if 'reorder' in args.stages:
+                run_reorder(args, args.out, timings, top)
+            if 'stability' in args.stages:
+                run_stability(args, args.out, timings, run_paths, total)
+        if 'audit' in args.stages:
+            run_audit(args, args.out, timings, total)
+
+    summary = {'skus': total, 'format': args.format, 'stages': timings, 'total_seconds': round(time.perf_counter() - run_start, 3)}
+    with open(os.path.join(args.out, 'summary.json'), 'w') as f:
+        json.dump(summary, f, indent=2)
+
+    print("\nStage timings:", file=sys.stderr)
+    for stage, info in timings.items():
+        print(f"  {stage:<10} {info['rows']:>12,} rows {info['seconds']:>9.3f}s", file=sys.stderr)
+    print(f"  {'total':<10} {'':>17} {summary['total_seconds']:>9.3f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
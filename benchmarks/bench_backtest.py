@@ -0,0 +1,68 @@
+"""
+Benchmark: full rolling-origin backtest (backtest.py) on a synthetic DemandMatrix.
+
+Writes a --skus x --days matrix of intermittent Poisson demand (each SKU
+with its own rate and selling probability) into a temporary directory,
+then runs the backtest over it for each worker count.
+
+    python benchmarks/bench_backtest.py --skus 100000 --days 730 --workers 1 4
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backtest import main as run_backtest_cli
+from demand_matrix import DemandMatrix
+
+
+def build_matrix(directory, sku_count, days, seed=1, chunk=10000):
+    """Synthetic demand written column chunk by column chunk, so memory stays ~days x chunk."""
+    rng = np.random.default_rng(seed)
+    matrix = DemandMatrix(directory)
+    matrix._create(int(np.datetime64('2024-01-01', 'D').astype(np.int64)), days, sku_count)
+    matrix._ensure_days(days)
+    matrix._ensure_skus(f"SKU{i:07d}" for i in range(sku_count))
+    for first in range(0, sku_count, chunk):
+        width = min(chunk, sku_count - first)
+        rate = rng.gamma(2.0, 3.0, width)
+        selling = rng.uniform(0.1, 0.9, width)
+        demand = rng.poisson(rate, (days, width)) * (rng.random((days, width)) < selling)
+        matrix.data[:days, first:first + width] = demand
+    matrix.data.flush()
+    matrix._save_meta()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--skus', type=int, default=100000)
+    parser.add_argument('--days', type=int, default=730)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1])
+    parser.add_argument('--horizon', type=int, default=14)
+    parser.add_argument('--step', type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = os.path.join(tmp, 'demand')
+        start = time.perf_counter()
+        build_matrix(directory, args.skus, args.days)
+        print(f"Built {args.skus:,} SKUs x {args.days} days in {time.perf_counter() - start:.1f}s")
+
+        for workers in args.workers:
+            out = os.path.join(tmp, f'out{workers}')
+            start = time.perf_counter()
+            run_backtest_cli(['--demand-dir', directory, '--no-update', '--out', out, '--workers', str(workers),
+                              '--horizon', str(args.horizon), '--step', str(args.step)])
+            elapsed = time.perf_counter() - start
+            with open(os.path.join(out, 'summary.json')) as f:
+                origins = json.load(f)['origins']
+            print(f"workers={workers:<3} {elapsed:8.1f}s  {args.skus * origins / elapsed:14,.0f} SKU-origins/s\n")
+
+
+if __name__ == '__main__':
+    main()
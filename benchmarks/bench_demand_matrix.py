@@ -0,0 +1,101 @@
+"""
+Benchmark: per-SKU sales_history queries vs the memory-mapped DemandMatrix.
+
+Builds a throwaway database with `--skus` products and `--days` of sales,
+then compares reading the daily demand of a random SKU subset through SQL
+against slicing the matrix, plus the cost of a full build and of appending
+one new day.
+
+    python benchmarks/bench_demand_matrix.py --skus 2000 --days 730 --subset 200
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# db_router resolves the database relative to the working directory
+os.chdir(tempfile.mkdtemp(prefix="pirs_bench_"))
+
+from db_router import DB_NAME
+from demand_matrix import DemandMatrix
+
+
+def seed(skus, days, density):
+    conn = sqlite3.connect(DB_NAME)
+    conn.execute("CREATE TABLE sales_history (txn_id INTEGER PRIMARY KEY AUTOINCREMENT, sku TEXT, qty_sold INTEGER, sale_date DATE)")
+    conn.execute("CREATE INDEX idx_sales_sku ON sales_history(sku)")
+    start = date.today() - timedelta(days=days - 1)
+    rows = [
+        (f"SKU{s:06d}", random.randint(1, 20), str(start + timedelta(days=d)))
+        for d in range(days) for s in range(skus) if random.random() < density
+    ]
+    conn.executemany("INSERT INTO sales_history (sku, qty_sold, sale_date) VALUES (?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+    return len(rows)
+
+
+def timed(label, fn, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    print(f"  {label:<34} {best * 1000:10.2f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--skus', type=int, default=2000)
+    parser.add_argument('--days', type=int, default=730)
+    parser.add_argument('--subset', type=int, default=200)
+    parser.add_argument('--density', type=float, default=0.3, help="Chance a SKU sells on a given day")
+    args = parser.parse_args()
+
+    count = seed(args.skus, args.days, args.density)
+    print(f"{count} sales rows, {args.skus} SKUs x {args.days} days")
+
+    matrix = DemandMatrix("demand")
+    start = time.perf_counter()
+    matrix.open()
+    print(f"  {'full matrix build':<34} {(time.perf_counter() - start) * 1000:10.2f} ms")
+
+    subset = random.sample(matrix.skus, min(args.subset, len(matrix.skus)))
+
+    def via_sql():
+        conn = sqlite3.connect(DB_NAME)
+        series = {}
+        for sku in subset:
+            series[sku] = conn.execute(
+                "SELECT sale_date, SUM(qty_sold) FROM sales_history WHERE sku = ? GROUP BY sale_date ORDER BY sale_date",
+                (sku,)
+            ).fetchall()
+        conn.close()
+        return series
+
+    print(f"Daily demand for {len(subset)} SKUs over {args.days} days:")
+    timed("SQL, one query per SKU", via_sql)
+    timed("DemandMatrix.window (copy)", lambda: matrix.window(subset, args.days))
+    timed("DemandMatrix.view (zero-copy)", lambda: matrix.view(-args.days))
+    timed("column sums over the view", lambda: matrix.view(-args.days).sum(axis=0))
+
+    conn = sqlite3.connect(DB_NAME)
+    conn.executemany(
+        "INSERT INTO sales_history (sku, qty_sold, sale_date) VALUES (?, ?, date('now', '+1 day'))",
+        [(sku, random.randint(1, 20)) for sku in matrix.skus]
+    )
+    conn.commit()
+    conn.close()
+    timed("append one day (incremental update)", matrix.update, repeat=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Benchmark: dict-based queued orders vs OrderRecord + StockedOrderView.
+
+Measures memory per queued order and shipping-dashboard build+serialise
+latency (sorted queue, stock injection, JSON encode) for a large queue.
+The dict path encodes the way the endpoint used to (returning a dict
+through FastAPI's jsonable_encoder); the record path uses serialise().
+
+    python benchmarks/bench_order_queue.py --orders 100000
+"""
+import argparse
+import contextlib
+import heapq
+import io
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+
+from data_versions import serialise
+from floor_operations import OrderRecord, ShippingQueue, StockedOrderView
+
+
+def order_fields(i):
+    return dict(order_id=f"ORD-{i}", customer=f"Customer {i % 3 + 1}", item_sku=f"SKU{i % 5000:05d}",
+                item_name=f"Item {i % 5000}", tier=i % 3 + 1, days_remaining=random.uniform(0, 60),
+                qty=random.randint(1, 10), total_amount=random.uniform(10, 5000), status='PENDING')
+
+
+def legacy_enqueue(heap, count, details):
+    # The pre-OrderRecord ShippingQueue: score then {**details, ...} copy per order
+    score = 100 - details['days_remaining']
+    heapq.heappush(heap, (-score, count, {**details, 'priority_reason': 'Standard', 'priority_score': score}))
+
+
+def legacy_dashboard(heap, stock):
+    rows = []
+    for _, _, order in sorted(heap):
+        current = stock.get(order['item_sku'], 0)
+        rows.append({**order, 'current_stock': current, 'stock_available': current >= order.get('qty', 1)})
+    return json.dumps(jsonable_encoder({"priority_queue": rows})).encode('utf-8')
+
+
+def record_dashboard(queue, stock):
+    rows = [StockedOrderView(order, stock.get(order.item_sku, 0)) for order in queue.get_queue_status()]
+    return serialise({"priority_queue": rows})
+
+
+def traced(build):
+    tracemalloc.start()
+    result = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current
+
+
+def best_of(fn, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=100000)
+    args = parser.parse_args()
+
+    fields = [order_fields(i) for i in range(args.orders)]
+    stock = {f"SKU{i:05d}": random.randint(0, 50) for i in range(5000)}
+
+    def build_legacy():
+        heap = []
+        for i, details in enumerate(fields):
+            legacy_enqueue(heap, i, dict(details))
+        return heap
+
+    def build_records():
+        queue = ShippingQueue()
+        with contextlib.redirect_stdout(io.StringIO()): # add_order logs every enqueue
+            for details in fields:
+                queue.add_order(OrderRecord(**details))
+        return queue
+
+    heap, legacy_bytes = traced(build_legacy)
+    queue, record_bytes = traced(build_records)
+    print(f"memory per queued order: dict {legacy_bytes / args.orders:7.0f} B   OrderRecord {record_bytes / args.orders:7.0f} B")
+
+    legacy_time = best_of(lambda: legacy_dashboard(heap, stock))
+    record_time = best_of(lambda: record_dashboard(queue, stock))
+    print(f"dashboard build+serialise: dict {legacy_time * 1000:8.1f} ms   OrderRecord {record_time * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Benchmark: forecast_catalog() scaling with worker processes.
+
+Builds a synthetic catalog in a temporary DB and times a full-catalog
+forecast for 1..N workers.
+
+    python benchmarks/bench_parallel_forecast.py --skus 200000 --days 30
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database_setup import create_schema
+from prediction_engine import forecast_catalog
+
+
+def build_db(path, sku_count, days):
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    create_schema(cursor)
+    cursor.executemany(
+        'INSERT INTO products (sku, name, current_stock, lead_time_days, unit_cost) VALUES (?,?,?,?,?)',
+        ((f"SKU{i:07d}", f"Item {i}", random.randint(5, 500), 7, 10.0) for i in range(sku_count))
+    )
+    cursor.executemany(
+        'INSERT INTO sales_history (sku, qty_sold, sale_date) VALUES (?,?,?)',
+        ((f"SKU{i:07d}", random.randint(1, 10), f"2024-01-{d + 1:02d}") for i in range(sku_count) for d in range(days))
+    )
+    conn.commit()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--skus', type=int, default=100000)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        print(f"Building {args.skus} SKUs x {args.days} days of sales...")
+        build_db(path, args.skus, args.days)
+
+        baseline = None
+        for workers in range(1, args.max_workers + 1):
+            start = time.perf_counter()
+            results = forecast_catalog(workers=workers, db_paths=[path])
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(f"workers={workers:<3} {elapsed:8.3f}s  {len(results) / elapsed:12,.0f} SKU/s  speedup x{baseline / elapsed:.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark: dict-of-dicts product lookup vs the columnar ProductCatalog.
+
+Compares memory and whole-catalog aggregate speed (inventory value,
+critical count, overstock scan) at a given catalog size, and the same
+totals read from a CategoryRollup (O(categories)) along with the cost its
+delta maintenance adds to a stock update.
+
+    python benchmarks/bench_product_catalog.py --skus 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from product_catalog import ProductCatalog
+from category_rollup import CategoryRollup
+
+CATEGORIES = ('Electronics', 'Kitchen', 'Office', 'Automotive', 'Gardening', 'Toys')
+
+
+def make_rows(count):
+    return [(f"SKU{i:07d}", f"Item {i} ({CATEGORIES[i % len(CATEGORIES)]})", random.randint(0, 500), random.randint(2, 21), round(random.uniform(10, 5000), 2)) for i in range(count)]
+
+
+def measure(label, build):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} build {elapsed:7.3f}s  memory {current / 1e6:9.1f} MB")
+    return result
+
+
+def timed(label, fn, repeat=3):
+    best = min(_time(fn) for _ in range(repeat))
+    print(f"  {label:<26} {best * 1000:10.2f} ms")
+
+
+def _time(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--skus', type=int, default=1000000)
+    args = parser.parse_args()
+
+    rows = make_rows(args.skus)
+    avg = {row[0]: random.uniform(0, 10) for row in rows}
+
+    lookup = measure("dict-of-dicts", lambda: {r[0]: {'name': r[1], 'stock': r[2], 'lead': r[3], 'price': r[4]} for r in rows})
+    catalog = measure("ProductCatalog", lambda: ProductCatalog().from_rows(rows, avg.get))
+
+    def dict_days():
+        return {sku: (round(d['stock'] / avg[sku], 2) if avg[sku] > 0 else 999) for sku, d in lookup.items()}
+
+    print("dict-of-dicts aggregates:")
+    timed("total inventory value", lambda: sum(d['stock'] * d['price'] for d in lookup.values()))
+    timed("critical count (<7 days)", lambda: sum(1 for v in dict_days().values() if v < 7))
+    timed("overstock scan (>60 days)", lambda: [s for s, v in dict_days().items() if v > 60])
+    timed("single lookup x100k", lambda: [lookup[r[0]]['stock'] for r in rows[:100000]])
+
+    print("ProductCatalog aggregates:")
+    timed("total inventory value", catalog.total_value)
+    timed("critical count (<7 days)", lambda: catalog.count_below(7))
+    timed("overstock scan (>60 days)", lambda: catalog.overstocked(60))
+    timed("single lookup x100k", lambda: [catalog[r[0]]['stock'] for r in rows[:100000]])
+    timed("set_stock x100k", lambda: [catalog.set_stock(r[0], r[2]) for r in rows[:100000]])
+
+    rollup = CategoryRollup()
+    rolled = measure("ProductCatalog + rollup", lambda: ProductCatalog(rollup=rollup).from_rows(rows, avg.get))
+    print("CategoryRollup aggregates:")
+    timed("total value + critical", rollup.overall)
+    timed("per-category summary", rollup.summary)
+    timed("set_stock x100k", lambda: [rolled.set_stock(r[0], r[2]) for r in rows[:100000]])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+Benchmark: wave planning time against queue size.
+
+    python benchmarks/bench_wave_planner.py --sizes 1000 10000 50000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from floor_operations import OrderRecord
+from wave_planner import plan_waves
+
+
+def make_queue(count, sku_count=2000):
+    return [
+        OrderRecord(order_id=f"ORD-{i}", item_sku=f"SKU{random.randrange(sku_count):05d}", item_name="Item",
+                    qty=random.randint(1, 10), priority_score=count - i)
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000, 10000, 50000])
+    parser.add_argument('--max-units', type=int, default=200)
+    parser.add_argument('--max-orders', type=int, default=25)
+    args = parser.parse_args()
+
+    print(f"{'orders':>8} {'greedy ms':>10} {'+local ms':>10} {'waves':>7} {'greedy waves':>13} {'orders/wave':>12}")
+    for size in args.sizes:
+        queue = make_queue(size)
+        stock = {f"SKU{i:05d}": random.randint(0, 60) for i in range(2000)}
+
+        start = time.perf_counter()
+        plan_waves(queue, stock.get, args.max_units, args.max_orders, local_search=False)
+        greedy_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        _, _, stats = plan_waves(queue, stock.get, args.max_units, args.max_orders)
+        full_ms = (time.perf_counter() - start) * 1000
+
+        print(f"{size:>8} {greedy_ms:>10.1f} {full_ms:>10.1f} {stats['waves']:>7} {stats['greedy_waves']:>13} {stats['avg_orders_per_wave']:>12}")
+
+
+if __name__ == '__main__':
+    main()
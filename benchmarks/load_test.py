@@ -0,0 +1,408 @@
+"""
+Load test: drives api.py with a mix of realistic traffic and checks latency SLOs.
+
+Launches the API with uvicorn on a free local port (against a temporary copy
+of the database, so the working DB is untouched) unless --url points at a
+running server. Requests arrive open-loop at --rps, Poisson distributed,
+each picking a scenario by weight from --mix. Latency is measured from the
+scheduled arrival time, so a stalled server shows up as queueing delay
+instead of silently lowering the offered load.
+
+The HTTP client is a small asyncio HTTP/1.1 keep-alive pool on the standard
+library, so the tool runs offline with nothing beyond the API's own deps.
+
+Reports per scenario: requests, 5xx/transport errors, 4xx rejections,
+throughput and p50/p95/p99/max latency. Exits 1 if any SLO is breached.
+
+    python benchmarks/load_test.py --rps 50 --duration 30
+    python benchmarks/load_test.py --mix dashboard=80,create=20 --slo dashboard.p95=50 --json load.json
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --rps 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from db_router import all_shard_paths
+
+# Scenario weights: a dashboard-heavy floor with order bursts and the odd report
+DEFAULT_MIX = {
+    'dashboard': 40, 'dashboard_cached': 15, 'summary': 10, 'waves': 5, 'reorder': 5,
+    'create': 15, 'dispatch': 8, 'history': 1, 'report': 1,
+}
+# route.metric -> limit; latencies in ms, error_rate as a fraction. '*' applies to every scenario.
+DEFAULT_SLOS = {
+    '*.error_rate': 0.01,
+    'dashboard.p95': 250, 'dashboard_cached.p95': 50, 'summary.p95': 50,
+    'create.p95': 250, 'dispatch.p95': 250, 'report.p99': 5000,
+}
+PERCENTILES = (50, 95, 99)
+# Stats an SLO can cap: latencies in ms, and the share of 5xx / transport errors
+SLO_METRICS = tuple(f'p{pct}' for pct in PERCENTILES) + ('max', 'error_rate')
+
+
+class HttpPool:
+    """
+    Minimal asyncio HTTP/1.1 client: a pool of keep-alive connections to one host.
+    Handles Content-Length and chunked bodies, which is all the API sends.
+    """
+    def __init__(self, url, size):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.idle = []
+        self.slots = asyncio.Semaphore(size)
+
+    async def request(self, method, path, body=None, headers=None):
+        """Returns (status, headers, body bytes)."""
+        async with self.slots:
+            reused = bool(self.idle)
+            conn = self.idle.pop() if reused else await asyncio.open_connection(self.host, self.port)
+            try:
+                result = await self._exchange(conn, method, path, body, headers or {})
+            except (ConnectionError, asyncio.IncompleteReadError):
+                conn[1].close()
+                if not reused:
+                    raise
+                # The server closed the idle keep-alive connection first: retry once on a fresh one
+                conn = await asyncio.open_connection(self.host, self.port)
+                try:
+                    result = await self._exchange(conn, method, path, body, headers or {})
+                except BaseException:
+                    conn[1].close()
+                    raise
+            except BaseException:
+                conn[1].close()
+                raise
+            if result[1].get('connection', '').lower() == 'close':
+                conn[1].close()
+            else:
+                self.idle.append(conn)
+            return result
+
+    async def _exchange(self, conn, method, path, body, headers):
+        reader, writer = conn
+        payload = json.dumps(body).encode() if body is not None else b''
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}", f"Content-Length: {len(payload)}"]
+        if body is not None:
+            lines.append("Content-Type: application/json")
+        lines.extend(f"{name}: {value}" for name, value in headers.items())
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + payload)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError("connection closed by server")
+        status = int(status_line.split()[1])
+        response_headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        if response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            data = b''.join(chunks)
+        else:
+            length = int(response_headers.get('content-length', 0))
+            data = await reader.readexactly(length) if length else b''
+        return status, response_headers, data
+
+    def close(self):
+        for _, writer in self.idle:
+            writer.close()
+        self.idle.clear()
+
+
+class Traffic:
+    """Scenario implementations. Each returns the HTTP status of its request."""
+    def __init__(self, pool, skus):
+        self.pool = pool
+        self.skus = skus
+        self.created = [] # Orders this run created, candidates for dispatch
+        self.etags = {}
+        self.error_samples = {} # path -> first few 5xx bodies, for the report
+
+    async def request(self, method, path, body=None, headers=None):
+        status, response_headers, data = await self.pool.request(method, path, body, headers)
+        if status >= 500:
+            samples = self.error_samples.setdefault(path.split('?')[0], [])
+            if len(samples) < 3:
+                samples.append(data[:200].decode('utf-8', 'replace'))
+        return status, response_headers, data
+
+    async def get(self, path, cached=False):
+        headers = {'If-None-Match': self.etags[path]} if cached and path in self.etags else None
+        status, response_headers, _ = await self.request('GET', path, headers=headers)
+        if 'etag' in response_headers:
+            self.etags[path] = response_headers['etag']
+        return status
+
+    async def dashboard(self):
+        return await self.get('/api/shipping/dashboard')
+
+    async def dashboard_cached(self):
+        # A polling client revalidating with its last ETag (304 when nothing changed)
+        return await self.get('/api/shipping/dashboard', cached=True)
+
+    async def summary(self):
+        return await self.get('/api/dashboard/summary', cached=True)
+
+    async def waves(self):
+        return await self.get('/api/shipping/waves')
+
+    async def reorder(self):
+        return await self.get('/api/reorder/suggestions?limit=50')
+
+    async def history(self):
+        return await self.get('/api/orders/history')
+
+    async def report(self):
+        return await self.get('/api/reports/download')
+
+    async def create(self):
+        order = {'customer': f"Load {random.randint(1, 999)}", 'customer_tier': random.randint(1, 3),
+                 'sku': random.choice(self.skus), 'qty_requested': random.randint(1, 5)}
+        status, _, data = await self.request('POST', '/api/orders', body=order)
+        if status == 200:
+            self.created.append(json.loads(data)['order_id'])
+        return status
+
+    async def dispatch(self):
+        if not self.created:
+            return await self.create()
+        order_id = self.created.pop(random.randrange(len(self.created)))
+        status, _, _ = await self.request('POST', f'/api/orders/{order_id}/dispatch')
+        return status
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-pct * len(sorted_values) // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarise(samples, elapsed):
+    """samples: {scenario: [(latency_ms, status or None)]} -> {scenario: stats}"""
+    report = {}
+    for scenario, rows in sorted(samples.items()):
+        latencies = sorted(latency for latency, _ in rows)
+        errors = sum(1 for _, status in rows if status is None or status >= 500)
+        rejected = sum(1 for _, status in rows if status is not None and 400 <= status < 500)
+        stats = {'requests': len(rows), 'errors': errors, 'rejected': rejected,
+                 'error_rate': errors / len(rows) if rows else 0.0,
+                 'rps': len(rows) / elapsed if elapsed else 0.0, 'max': latencies[-1] if latencies else 0.0}
+        for pct in PERCENTILES:
+            stats[f'p{pct}'] = percentile(latencies, pct)
+        report[scenario] = stats
+    return report
+
+
+def check_slos(report, slos):
+    """Returns a list of breach messages (empty when every SLO holds)."""
+    breaches = []
+    for key, limit in slos.items():
+        scenario, _, metric = key.partition('.')
+        targets = report if scenario == '*' else ({scenario: report[scenario]} if scenario in report else {})
+        for name, stats in targets.items():
+            if stats[metric] > limit:
+                breaches.append(f"{name}.{metric} = {stats[metric]:.4g} > {limit:g}")
+    return breaches
+
+
+async def run_load(url, mix, rps, duration, connections, warmup, seed):
+    random.seed(seed)
+    pool = HttpPool(url, connections)
+    # Real SKUs to order, from the streamed stability export
+    status, _, data = await pool.request('GET', '/api/exports/stability?format=csv')
+    if status != 200:
+        raise RuntimeError(f"could not list SKUs (HTTP {status})")
+    skus = [line.split(',', 1)[0] for line in data.decode().splitlines()[1:] if line]
+    traffic = Traffic(pool, skus)
+
+    for _ in range(warmup):
+        await traffic.dashboard()
+
+    scenarios, weights = list(mix), list(mix.values())
+    samples = {scenario: [] for scenario in scenarios}
+    in_flight = set()
+
+    async def fire(scenario, scheduled):
+        try:
+            status = await getattr(traffic, scenario)()
+        except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+            status = None
+            samples_for = traffic.error_samples.setdefault(scenario, [])
+            if len(samples_for) < 3:
+                samples_for.append(f"{type(e).__name__}: {e}")
+        samples[scenario].append(((time.perf_counter() - scheduled) * 1000, status))
+
+    start = time.perf_counter()
+    next_at = start
+    end = start + duration
+    while next_at < end:
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        scenario = random.choices(scenarios, weights)[0]
+        task = asyncio.ensure_future(fire(scenario, next_at))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+        next_at += random.expovariate(rps)
+    if in_flight:
+        await asyncio.wait(in_flight)
+    elapsed = time.perf_counter() - start
+    pool.close()
+    return summarise({k: v for k, v in samples.items() if v}, elapsed), elapsed, traffic.error_samples
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def copy_database():
+    """Copies the DB shards (and archives) into a temporary directory to run the API in."""
+    workdir = tempfile.mkdtemp(prefix='pirs_load_')
+    for path in all_shard_paths():
+        shutil.copy(os.path.join(ROOT, path), workdir)
+    if os.path.isdir(os.path.join(ROOT, 'pirs_archive')):
+        shutil.copytree(os.path.join(ROOT, 'pirs_archive'), os.path.join(workdir, 'pirs_archive'))
+    return workdir
+
+
+def launch_server(workdir, port, env=None):
+    """Starts uvicorn serving api:app from `workdir` (with extra `env` vars) and waits until it answers."""
+    env = {**os.environ, **(env or {}), 'PYTHONPATH': ROOT + os.pathsep + os.environ.get('PYTHONPATH', '')}
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'api:app', '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning'],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"API exited during startup (code {server.returncode})")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.2):
+                return server
+        except OSError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("API did not start within 60s")
+
+
+def parse_pairs(text, name):
+    pairs = {}
+    for item in filter(None, (part.strip() for part in text.split(','))):
+        key, sep, value = item.partition('=')
+        if not sep:
+            raise SystemExit(f"--{name}: expected key=value, got '{item}'")
+        try:
+            pairs[key.strip()] = float(value)
+        except ValueError:
+            raise SystemExit(f"--{name}: '{value.strip()}' in '{item}' is not a number")
+    return pairs
+
+
+def print_report(report, elapsed, offered_rps):
+    print(f"\n{sum(s['requests'] for s in report.values()):,} requests in {elapsed:.1f}s (offered {offered_rps:g} rps)")
+    print(f"{'scenario':<18}{'reqs':>7}{'err':>6}{'4xx':>6}{'rps':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for scenario, s in report.items():
+        print(f"{scenario:<18}{s['requests']:>7}{s['errors']:>6}{s['rejected']:>6}{s['rps']:>8.1f}"
+              f"{s['p50']:>9.1f}{s['p95']:>9.1f}{s['p99']:>9.1f}{s['max']:>9.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help="Target a running server instead of launching one")
+    parser.add_argument('--in-place', action='store_true', help="Launch against the working database instead of a copy")
+    parser.add_argument('--rps', type=float, default=50, help="Offered requests per second")
+    parser.add_argument('--duration', type=float, default=30, help="Seconds of load")
+    parser.add_argument('--connections', type=int, default=32, help="Max concurrent keep-alive connections")
+    parser.add_argument('--warmup', type=int, default=5, help="Dashboard requests before measuring")
+    parser.add_argument('--mix', default=','.join(f"{k}={v}" for k, v in DEFAULT_MIX.items()),
+                        help="scenario=weight list; scenarios: " + ', '.join(DEFAULT_MIX))
+    parser.add_argument('--slo', action='append', default=[],
+                        help="scenario.metric=limit (metrics: " + ', '.join(SLO_METRICS) + "; latencies in ms); '*' = every scenario")
+    parser.add_argument('--json', help="Also write the report (and SLO breaches) to this file")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    mix = parse_pairs(args.mix, 'mix')
+    unknown = [name for name in mix if name not in DEFAULT_MIX]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+    slos = dict(DEFAULT_SLOS)
+    for item in args.slo:
+        slos.update(parse_pairs(item, 'slo'))
+    for key in slos:
+        scenario, _, metric = key.partition('.')
+        if scenario != '*' and scenario not in DEFAULT_MIX:
+            parser.error(f"--slo {key}: unknown scenario '{scenario}' (use * or one of: {', '.join(DEFAULT_MIX)})")
+        if metric not in SLO_METRICS:
+            parser.error(f"--slo {key}: unknown metric '{metric}' (use one of: {', '.join(SLO_METRICS)})")
+
+    server, workdir = None, None
+    url = args.url
+    try:
+        if not url:
+            missing = [path for path in all_shard_paths() if not os.path.exists(os.path.join(ROOT, path))]
+            if missing:
+                print(f"Error: database file(s) not found: {', '.join(missing)}. Run `python database_setup.py` first.", file=sys.stderr)
+                return 1
+            if args.in_place:
+                workdir = ROOT
+            else:
+                workdir = copy_database()
+            port = free_port()
+            server = launch_server(workdir, port)
+            url = f"http://127.0.0.1:{port}"
+
+        print(f"Load test: {args.rps:g} rps for {args.duration:g}s against {url}", file=sys.stderr)
+        report, elapsed, error_samples = asyncio.run(run_load(url, mix, args.rps, args.duration, args.connections, args.warmup, args.seed))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+        if workdir and workdir != ROOT:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print_report(report, elapsed, args.rps)
+    for path, bodies in error_samples.items():
+        print(f"  5xx from {path}: " + " | ".join(bodies))
+    breaches = check_slos(report, slos)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'offered_rps': args.rps, 'elapsed': elapsed, 'scenarios': report, 'slos': slos,
+                       'breaches': breaches, 'error_samples': error_samples}, f, indent=2)
+    if breaches:
+        print("\nSLO breaches:\n  " + "\n  ".join(breaches))
+        return 1
+    print("\nAll SLOs met.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,279 @@
+"""
+Multi-worker consistency check for the shared queue journal (PIRS_SHARED_QUEUE=1).
+
+Starts --workers API processes on one copy of the database, all in the same
+journal generation, and fires concurrent order creation, single and wave
+dispatches and stock updates at random workers, including the same order
+dispatched on two workers at once. Then checks that:
+
+  - every worker, plus one started after the traffic (which rebuilds its
+    state from the journal), shows the same shipping queue: same orders in
+    the same order, with the same scores, stock and available-to-promise,
+  - every worker shows the same blocked orders,
+  - the queues match the database (queued = PENDING, blocked = BLOCKED),
+  - no order was dispatched twice,
+  - every SKU's persisted forecast totals (forecast_state) count each of
+    its sales (hot and rolled up) exactly once,
+  - every worker serves the same reorder plan,
+  - the demand matrix the workers share (updated by whichever worker
+    refreshes its reorder plan) holds each SKU's sales exactly once.
+
+Each worker is its own uvicorn process on its own port (what
+`uvicorn --workers N` runs behind one socket), so requests can be aimed
+at a chosen worker. Exits 1 if any check fails.
+
+    python benchmarks/multiworker_consistency.py --workers 3 --ops 600
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import time
+import uuid
+from collections import Counter
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from load_test import ROOT, HttpPool, copy_database, free_port, launch_server
+from db_router import all_shard_paths
+from demand_matrix import DEMAND_DIR, DemandMatrix
+
+# Operation weights for the concurrent phase
+MIX = {'create': 40, 'dispatch': 25, 'wave': 5, 'restock': 20, 'reorder': 10}
+
+
+class Driver:
+    """Concurrent mutations spread over the workers, keeping count of every order reported shipped."""
+    def __init__(self, pools, skus):
+        self.pools = pools
+        self.skus = skus
+        self.created = []
+        self.shipped = Counter() # order_id -> times a worker reported it shipped
+        self.errors = []
+
+    async def call(self, method, path, body=None, pool=None):
+        pool = pool or random.choice(self.pools)
+        status, _, data = await pool.request(method, path, body)
+        if status >= 500:
+            self.errors.append(f"{method} {path}: HTTP {status} {data[:200].decode('utf-8', 'replace')}")
+        return status, data
+
+    async def create(self):
+        order = {'customer': f"Worker test {random.randint(1, 999)}", 'customer_tier': random.randint(1, 3),
+                 'sku': random.choice(self.skus), 'qty_requested': random.randint(1, 5)}
+        status, data = await self.call('POST', '/api/orders', order)
+        if status == 200:
+            self.created.append(json.loads(data)['order_id'])
+
+    async def dispatch(self):
+        if not self.created:
+            return await self.create()
+        order_id = self.created.pop(random.randrange(len(self.created)))
+        # The same order on two workers at once: exactly one may ship it
+        first, second = random.sample(self.pools, 2) if len(self.pools) > 1 else self.pools * 2
+        path = f'/api/orders/{order_id}/dispatch'
+        for status, data in await asyncio.gather(self.call('POST', path, pool=first), self.call('POST', path, pool=second)):
+            if status == 200 and b'dispatched successfully' in data:
+                self.shipped[order_id] += 1
+
+    async def wave(self):
+        status, data = await self.call('POST', '/api/shipping/dispatch-wave', {'count': 5})
+        if status == 200:
+            self.shipped.update(json.loads(data)['shipped'])
+
+    async def reorder(self):
+        # Refreshing the plan appends new sales to the shared demand matrix
+        await self.call('GET', '/api/reorder/suggestions')
+
+    async def restock(self):
+        sku = random.choice(self.skus)
+        await self.call('PUT', f'/api/products/{sku}/stock', {'sku': sku, 'new_stock': random.randint(0, 60)})
+
+
+async def queue_state(pool):
+    """What one worker shows: (queue rows in order, blocked order IDs in order)."""
+    status, _, data = await pool.request('GET', '/api/shipping/dashboard')
+    if status != 200:
+        raise RuntimeError(f"dashboard returned HTTP {status}")
+    dashboard = json.loads(data)
+    queue = [(o['order_id'], o['priority_score'], o['priority_reason'], o['current_stock'], o['stock_available'])
+             for o in dashboard['priority_queue']]
+    return queue, [o['order_id'] for o in dashboard['blocked_orders']]
+
+
+async def compare_workers(pools, attempts=3):
+    """
+    Each worker's (queue, blocked) state, retried while they disagree: scores
+    are taken per aging tick, so reads straddling a tick boundary can differ.
+    Returns (states, agree).
+    """
+    for _ in range(attempts):
+        states = [await queue_state(pool) for pool in pools]
+        if all(state == states[0] for state in states):
+            return states, True
+        await asyncio.sleep(1)
+    return states, False
+
+
+async def reorder_plans(pools):
+    """Each worker's full reorder plan (refreshing it first, so every worker updates the shared matrix)."""
+    plans = []
+    for pool in pools:
+        status, _, data = await pool.request('GET', '/api/reorder/suggestions?all_skus=true')
+        if status != 200:
+            raise RuntimeError(f"reorder suggestions returned HTTP {status}")
+        plans.append(sorted((row['sku'], row['reorder_point'], row['suggested_qty']) for row in json.loads(data)))
+    return plans
+
+
+def demand_mismatches(workdir):
+    """SKUs whose total in the shared demand matrix differs from their sales (hot and archived)."""
+    expected = Counter()
+    paths = [os.path.join(workdir, path) for path in all_shard_paths()]
+    for path in paths + glob.glob(os.path.join(workdir, 'pirs_archive', '*.db')):
+        conn = sqlite3.connect(path)
+        for sku, qty in conn.execute("SELECT sku, SUM(qty_sold) FROM sales_history GROUP BY sku"):
+            expected[sku] += qty
+        conn.close()
+    matrix = DemandMatrix(os.path.join(workdir, DEMAND_DIR)).open(update=False)
+    in_matrix = dict(zip(matrix.skus, matrix.view().sum(axis=0, dtype=np.float64).tolist()))
+    return {sku: (in_matrix.get(sku, 0), qty) for sku, qty in expected.items() if in_matrix.get(sku, 0) != qty}
+
+
+def forecast_mismatches(workdir):
+    """SKUs whose forecast_state total_sold / sale_count differ from their sales (hot rows plus the archived rollup)."""
+    mismatched = {}
+    for path in all_shard_paths():
+        conn = sqlite3.connect(os.path.join(workdir, path))
+        expected = Counter()
+        counts = Counter()
+        queries = ["SELECT sku, SUM(qty_sold), COUNT(*) FROM sales_history GROUP BY sku"]
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sales_rollup'").fetchone():
+            queries.append("SELECT sku, SUM(total_sold), SUM(sale_count) FROM sales_rollup GROUP BY sku")
+        for query in queries:
+            for sku, total, count in conn.execute(query):
+                expected[sku] += total
+                counts[sku] += count
+        state = {sku: (total, count) for sku, total, count in conn.execute("SELECT sku, total_sold, sale_count FROM forecast_state")}
+        conn.close()
+        for sku in expected.keys() | state.keys():
+            if state.get(sku, (0, 0)) != (expected[sku], counts[sku]):
+                mismatched[sku] = (state.get(sku, (0, 0)), (expected[sku], counts[sku]))
+    return mismatched
+
+
+def database_state(workdir):
+    pending, blocked = set(), set()
+    for path in all_shard_paths():
+        conn = sqlite3.connect(os.path.join(workdir, path))
+        for order_id, status in conn.execute("SELECT order_id, status FROM customer_orders WHERE status IN ('PENDING', 'BLOCKED')"):
+            (pending if status == 'PENDING' else blocked).add(order_id)
+        conn.close()
+    return pending, blocked
+
+
+async def run(urls, ops, concurrency, seed, join_late):
+    """
+    Fires the operations, then starts one more worker (join_late() returns its
+    URL) and reads every worker's state. Returns (driver, states, agree, plans, elapsed).
+    """
+    random.seed(seed)
+    pools = [HttpPool(url, concurrency) for url in urls]
+    status, _, data = await pools[0].request('GET', '/api/exports/stability?format=csv')
+    if status != 200:
+        raise RuntimeError(f"could not list SKUs (HTTP {status})")
+    skus = [line.split(',', 1)[0] for line in data.decode().splitlines()[1:] if line]
+    driver = Driver(pools, skus)
+
+    names, weights = list(MIX), list(MIX.values())
+    slots = asyncio.Semaphore(concurrency)
+    async def one():
+        async with slots:
+            await getattr(driver, random.choices(names, weights)[0])()
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(ops)))
+    elapsed = time.perf_counter() - start
+
+    pools.append(HttpPool(join_late(), 1)) # Rebuilds its state by replaying the journal
+    states, agree = await compare_workers(pools)
+    plans = await reorder_plans(pools)
+    for pool in pools:
+        pool.close()
+    return driver, states, agree, plans, elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--ops', type=int, default=600, help="Mutating operations to fire")
+    parser.add_argument('--concurrency', type=int, default=16, help="Operations in flight at once")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    missing = [path for path in all_shard_paths() if not os.path.exists(os.path.join(ROOT, path))]
+    if missing:
+        print(f"Error: database file(s) not found: {', '.join(missing)}. Run `python database_setup.py` first.", file=sys.stderr)
+        return 1
+
+    workdir = copy_database()
+    env = {'PIRS_SHARED_QUEUE': '1', 'PIRS_QUEUE_GENERATION': uuid.uuid4().hex}
+    servers, failures = [], []
+
+    def start_worker():
+        port = free_port()
+        servers.append(launch_server(workdir, port, env))
+        return f"http://127.0.0.1:{port}"
+
+    try:
+        urls = [start_worker() for _ in range(max(1, args.workers))]
+        print(f"{len(urls)} workers sharing one queue journal; firing {args.ops} operations", file=sys.stderr)
+        driver, states, agree, plans, elapsed = asyncio.run(run(urls, args.ops, args.concurrency, args.seed, start_worker))
+        queue, blocked = states[0]
+        pending, blocked_in_db = database_state(workdir)
+
+        print(f"{args.ops} operations in {elapsed:.1f}s; {len(queue)} queued, {len(blocked)} blocked, "
+              f"{sum(driver.shipped.values())} shipped")
+        if driver.errors:
+            failures.append(f"{len(driver.errors)} server errors, e.g. {driver.errors[0]}")
+        if not agree:
+            differing = [i for i, state in enumerate(states) if state != states[0]]
+            failures.append(f"workers {differing} disagree with worker 0 on the queue or blocked orders")
+        if {row[0] for row in queue} != pending:
+            failures.append(f"queue != PENDING orders in the DB ({len({row[0] for row in queue} ^ pending)} differ)")
+        if set(blocked) != blocked_in_db:
+            failures.append(f"blocked list != BLOCKED orders in the DB ({len(set(blocked) ^ blocked_in_db)} differ)")
+        if any(plan != plans[0] for plan in plans):
+            failures.append("workers serve different reorder plans")
+        mismatched = demand_mismatches(workdir)
+        if mismatched:
+            sku, (in_matrix, sold) = next(iter(mismatched.items()))
+            failures.append(f"demand matrix != sales for {len(mismatched)} SKUs, e.g. {sku}: {in_matrix:g} vs {sold}")
+        lost = forecast_mismatches(workdir)
+        if lost:
+            sku, (state, sold) = next(iter(lost.items()))
+            failures.append(f"forecast_state != sales for {len(lost)} SKUs, e.g. {sku}: {state} vs {sold}")
+        twice = [order_id for order_id, count in driver.shipped.items() if count > 1]
+        if twice:
+            failures.append(f"{len(twice)} orders dispatched more than once, e.g. {twice[0]}")
+    finally:
+        for server in servers:
+            server.terminate()
+            server.wait(timeout=10)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if failures:
+        print("FAILED:\n  " + "\n  ".join(failures))
+        return 1
+    print(f"OK: {len(states)} workers agree (including one started late) and match the database; "
+          "the shared demand matrix and the forecast state hold every sale once.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,208 @@
+"""
+Category dimension and materialised per-category aggregates.
+
+Product names carry their category in a trailing parenthesis, e.g.
+"Mouse (Electronics)"; parse_category() extracts it (migration 6 stores it
+in products.category). CategoryRollup keeps, per category, the SKU count,
+units and value in stock, the critical SKU count, the value of queued
+orders and the days of cover, updated by deltas: a stock, demand or price
+change retracts the SKU's old contribution and adds its new one, and queue
+events add or retract an order's value. Reading every category's figures
+is then O(categories), independent of the catalog size.
+
+The ProductCatalog feeds it from its own mutators (ProductCatalog(rollup=...)),
+so the rollup always matches the catalog; ShippingQueue change events feed
+the queued-order values.
+"""
+import re
+import threading
+
+NO_SALES_DAYS = 999 # Same sentinel as ProductCatalog.days_remaining()
+UNCATEGORISED = 'Uncategorised'
+CRITICAL_DAYS = 7 # Same threshold as the dashboard's critical stock alert
+_CATEGORY = re.compile(r'\(([^()]+)\)\s*$')
+
+
+def parse_category(name):
+    """'Mouse (Electronics)' -> 'Electronics'; names without a trailing (...) are Uncategorised."""
+    match = _CATEGORY.search(name or '')
+    return match.group(1).strip() if match else UNCATEGORISED
+
+
+def _days_remaining(stock, avg_sale):
+    # Same rounding and sentinel as ProductCatalog.days_remaining()
+    return round(stock / avg_sale, 2) if avg_sale > 0 else float(NO_SALES_DAYS)
+
+
+class CategoryRollup:
+    """
+    Data Structure: Hash Tables (category -> running totals, SKU -> its contribution,
+                    order_id -> its queued value)
+    Complexity: O(1) per stock / demand / order change, O(C) to read all C categories,
+                O(k) to drill into a category of k SKUs
+    """
+    FIELDS = ('skus', 'stock', 'stock_value', 'critical', 'covered_stock', 'daily_demand', 'pending_orders', 'pending_value')
+
+    def __init__(self, critical_days=CRITICAL_DAYS):
+        self.critical_days = critical_days
+        self.totals = {}   # category -> {field: running total}
+        self.members = {}  # category -> set of SKUs
+        self.products = {} # sku -> (category, stock, value, days, daily demand)
+        self.pending = {}  # order_id -> (sku, category, amount)
+        self.sku_pending = {} # sku -> queued order value
+        self.lock = threading.RLock() # Fed from the catalog writers and the queue's change events
+
+    def _totals(self, category):
+        totals = self.totals.get(category)
+        if totals is None:
+            totals = self.totals[category] = dict.fromkeys(self.FIELDS, 0)
+            self.members[category] = set()
+        return totals
+
+    def _apply(self, contribution, sign):
+        category, stock, value, days, demand = contribution
+        totals = self._totals(category)
+        totals['skus'] += sign
+        totals['stock'] += sign * stock
+        totals['stock_value'] += sign * value
+        totals['critical'] += sign * (days < self.critical_days)
+        if demand > 0:
+            totals['covered_stock'] += sign * stock # Stock of SKUs that sell, for days of cover
+            totals['daily_demand'] += sign * demand
+
+    def _drop_if_empty(self, category):
+        totals = self.totals.get(category)
+        if totals is not None and totals['skus'] == 0 and totals['pending_orders'] == 0:
+            del self.totals[category]
+            del self.members[category]
+
+    # --- Catalog deltas ---
+    def set_product(self, sku, category, stock, price, avg_sale):
+        """Replaces the SKU's contribution with one for its current values."""
+        contribution = (category, stock, stock * price, _days_remaining(stock, avg_sale), avg_sale)
+        with self.lock:
+            old = self.products.get(sku)
+            if old is not None:
+                self._apply(old, -1)
+                if old[0] != category:
+                    self.members[old[0]].discard(sku)
+                    self._drop_if_empty(old[0])
+            self._apply(contribution, 1)
+            self.members[category].add(sku)
+            self.products[sku] = contribution
+
+    def remove_product(self, sku):
+        with self.lock:
+            old = self.products.pop(sku, None)
+            if old is None:
+                return
+            self._apply(old, -1)
+            self.members[old[0]].discard(sku)
+            self._drop_if_empty(old[0])
+
+    def rebuild(self, rows):
+        """Recomputes everything from (sku, category, stock, price, avg_sale) rows; queued order values are kept."""
+        with self.lock:
+            self.products = {}
+            self.totals = {}
+            self.members = {}
+            for _, category, amount in self.pending.values():
+                totals = self._totals(category)
+                totals['pending_orders'] += 1
+                totals['pending_value'] += amount
+            # One pass with the totals kept per category, instead of a set_product() call per row
+            critical_days = self.critical_days
+            for sku, category, stock, price, avg_sale in rows:
+                contribution = self.products[sku] = (category, stock, stock * price, _days_remaining(stock, avg_sale), avg_sale)
+                totals = self.totals.get(category) or self._totals(category)
+                totals['skus'] += 1
+                totals['stock'] += stock
+                totals['stock_value'] += contribution[2]
+                totals['critical'] += contribution[3] < critical_days
+                if avg_sale > 0:
+                    totals['covered_stock'] += stock
+                    totals['daily_demand'] += avg_sale
+                self.members[category].add(sku)
+
+    # --- Queue deltas ---
+    def on_change(self, event_type, payload):
+        """Feeds ShippingQueue change events (see ShippingQueue.on_change)."""
+        if event_type == 'enqueued':
+            self.add_pending(payload.get('order_id'), payload.get('item_sku'), payload.get('item_name'),
+                             payload.get('total_amount') or 0)
+        elif event_type == 'removed':
+            self.remove_pending(payload.get('order_id'))
+
+    def add_pending(self, order_id, sku, item_name, amount):
+        with self.lock:
+            self.remove_pending(order_id) # Re-enqueued without a 'removed' event
+            product = self.products.get(sku)
+            category = product[0] if product else parse_category(item_name)
+            self.pending[order_id] = (sku, category, amount)
+            self.sku_pending[sku] = self.sku_pending.get(sku, 0) + amount
+            totals = self._totals(category)
+            totals['pending_orders'] += 1
+            totals['pending_value'] += amount
+
+    def remove_pending(self, order_id):
+        with self.lock:
+            entry = self.pending.pop(order_id, None)
+            if entry is None:
+                return
+            sku, category, amount = entry
+            remaining = self.sku_pending.get(sku, 0) - amount
+            if remaining > 1e-9:
+                self.sku_pending[sku] = remaining
+            else:
+                self.sku_pending.pop(sku, None)
+            totals = self.totals[category]
+            totals['pending_orders'] -= 1
+            totals['pending_value'] -= amount
+            self._drop_if_empty(category)
+
+    # --- Reading ---
+    @staticmethod
+    def _row(category, totals):
+        demand = totals['daily_demand']
+        return {
+            'category': category,
+            'skus': totals['skus'],
+            'stock': totals['stock'],
+            'stock_value': round(totals['stock_value'], 2),
+            'critical_count': totals['critical'],
+            'pending_orders': totals['pending_orders'],
+            'pending_value': round(totals['pending_value'], 2),
+            # Demand-weighted: the category's selling stock over its combined daily demand
+            'days_of_cover': round(totals['covered_stock'] / demand, 2) if demand > 1e-9 else None,
+        }
+
+    def summary(self):
+        """Every category's figures, highest stock value first: O(C log C)."""
+        with self.lock:
+            rows = [self._row(category, totals) for category, totals in self.totals.items()]
+        return sorted(rows, key=lambda row: (-row['stock_value'], row['category']))
+
+    def overall(self):
+        """Whole-catalog figures summed over the categories: O(C)."""
+        with self.lock:
+            combined = dict.fromkeys(self.FIELDS, 0)
+            for totals in self.totals.values():
+                for field in self.FIELDS:
+                    combined[field] += totals[field]
+        return self._row(None, combined)
+
+    def category(self, category):
+        """One category's figures, or None if it has no SKUs or queued orders."""
+        with self.lock:
+            totals = self.totals.get(category)
+            return None if totals is None else self._row(category, totals)
+
+    def products_in(self, category):
+        """Drill-down: the category's SKUs, lowest days remaining first (O(k log k) for k SKUs)."""
+        with self.lock:
+            rows = [
+                {'sku': sku, 'stock': self.products[sku][1], 'stock_value': round(self.products[sku][2], 2),
+                 'days_remaining': self.products[sku][3], 'pending_value': round(self.sku_pending.get(sku, 0), 2)}
+                for sku in self.members.get(category, ())
+            ]
+        return sorted(rows, key=lambda row: (row['days_remaining'], row['sku']))
@@ -1,4 +1,6 @@
+import heapq
 import sqlite3
+from db_router import connect_for_sku, fan_out
 
 def get_product_lookup():
     """
@@ -11,20 +13,38 @@ def get_product_lookup():
     """
     products = {}
     try:
-        conn = sqlite3.connect('pirs_warehouse.db')
-        cursor = conn.cursor()
-        cursor.execute("SELECT sku, name, current_stock, lead_time_days, unit_cost FROM products")
-        
-        # SKU is the Key, Details are the Value
-        products = {row[0]: {'name': row[1], 'stock': row[2], 'lead': row[3], 'price': row[4]} for row in cursor.fetchall()}
+        def load(conn):
+            cursor = conn.cursor()
+            cursor.execute("SELECT sku, name, current_stock, lead_time_days, unit_cost FROM products")
+            return cursor.fetchall()
+
+        # SKU is the Key, Details are the Value (shards are merged into one table)
+        for rows in fan_out(load):
+            products.update({row[0]: {'name': row[1], 'stock': row[2], 'lead': row[3], 'price': row[4]} for row in rows})
         
     except sqlite3.Error as e:
         print(f"Database error: {e}")
+            
+    return products
+
+def get_product(sku):
+    """
+    Fetches a single product's details from its shard (None if the SKU is unknown).
+    Same shape as a get_product_lookup() value.
+    """
+    conn = None
+    try:
+        conn = connect_for_sku(sku)
+        cursor = conn.cursor()
+        cursor.execute("SELECT name, current_stock, lead_time_days, unit_cost FROM products WHERE sku = ?", (sku,))
+        row = cursor.fetchone()
+        return {'name': row[0], 'stock': row[1], 'lead': row[2], 'price': row[3]} if row else None
+    except sqlite3.Error as e:
+        print(f"Database error getting product {sku}: {e}")
+        return None
     finally:
         if conn:
             conn.close()
-            
-    return products
 
 def get_sales_array(sku):
     """
@@ -34,8 +54,9 @@ def get_sales_array(sku):
     Usage: Used to iterate chronologically for prediction algorithms.
     """
     sales_data = []
+    conn = None
     try:
-        conn = sqlite3.connect('pirs_warehouse.db')
+        conn = connect_for_sku(sku)
         cursor = conn.cursor()
         # Order by date desc to get most recent first, or asc for chronological analysis
         cursor.execute("SELECT qty_sold FROM sales_history WHERE sku = ? ORDER BY sale_date DESC", (sku,))
@@ -48,20 +69,26 @@ def get_sales_array(sku):
             
     return sales_data
 
-def get_all_orders():
+def get_all_orders(include_archive=False):
     """
-    Fetches all customer orders.
+    Fetches all customer orders (plus archived shipped orders if asked).
+
+    Each shard returns its orders already sorted by date, so the
+    per-shard lists are k-way merged (O(N log k)) instead of re-sorted.
     """
     orders = []
     try:
-        conn = sqlite3.connect('pirs_warehouse.db')
-        conn.row_factory = sqlite3.Row # Allow dict-like access
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM customer_orders ORDER BY order_date DESC")
-        orders = [dict(row) for row in cursor.fetchall()]
+        def load(conn):
+            conn.row_factory = sqlite3.Row # Allow dict-like access
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM customer_orders ORDER BY order_date DESC")
+            return [dict(row) for row in cursor.fetchall()]
+
+        sources = fan_out(load)
+        if include_archive:
+            from archival import get_archived_orders
+            sources.append(get_archived_orders())
+        orders = list(heapq.merge(*sources, key=lambda o: o['order_date'] or '', reverse=True))
     except sqlite3.Error as e:
         print(f"Database error getting orders: {e}")
-    finally:
-        if conn:
-            conn.close()
-    return orders
\ No newline at end of file
+    return orders
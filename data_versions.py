@@ -0,0 +1,62 @@
+import json
+import threading
+import uuid
+
+# Datasets whose writers bump a counter. Readers name the ones they depend on.
+DATASETS = ('catalog', 'orders', 'queue', 'lots')
+
+
+class DataVersions:
+    """
+    Monotonic change counters per dataset, plus a per-route body cache.
+
+    An ETag is the boot id plus the counters a route depends on, so it is
+    computed in O(deps) without touching the DB or the queues. The boot id
+    keeps tags from one process lifetime from matching after a restart.
+    """
+    def __init__(self):
+        self.boot_id = uuid.uuid4().hex[:8]
+        self.counters = {name: 0 for name in DATASETS}
+        self.bodies = {} # route -> (etag, serialised body); only the latest version is kept
+        self.lock = threading.Lock()
+
+    def bump(self, *names):
+        with self.lock:
+            for name in names:
+                self.counters[name] += 1
+
+    def etag(self, deps, extra=None):
+        """`extra` tags inputs without a counter (e.g. a plan date that changes with the calendar)."""
+        tag = self.boot_id + '-' + '.'.join(f"{name[0]}{self.counters[name]}" for name in deps)
+        return '"' + (tag if extra is None else f"{tag}-{extra}") + '"'
+
+    def cached_body(self, route, etag):
+        cached = self.bodies.get(route)
+        return cached[1] if cached and cached[0] == etag else None
+
+    def store_body(self, route, etag, body):
+        self.bodies[route] = (etag, body)
+
+
+def etag_matches(if_none_match, etag):
+    """RFC 7232 If-None-Match: '*' or a comma-separated list of (possibly weak) tags."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    return etag in candidates or f"W/{etag}" in candidates
+
+
+def json_default(obj):
+    """Lets slotted records/views (anything with to_json()) serialise lazily, at encode time."""
+    to_json = getattr(obj, 'to_json', None)
+    return to_json() if to_json else str(obj)
+
+
+def serialise(payload):
+    # Payloads are freshly built trees, so the encoder's cycle tracking is pure overhead
+    return json.dumps(payload, default=json_default, separators=(',', ':'), check_circular=False).encode('utf-8')
+
+
+versions = DataVersions()
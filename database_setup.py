@@ -1,49 +1,40 @@
-import sqlite3
-
-def setup_database():
-    # Connect to (or create) the database file
-    # Connect to (or create) the database file
-    conn = sqlite3.connect('pirs_warehouse.db')
-    cursor = conn.cursor()
+from db_router import SHARD_COUNT, all_shard_paths, connect_shard, shard_for_sku
+from forecast_state import rebuild_forecast_table
+from migrations import apply_migrations
+from category_rollup import parse_category
 
+def create_schema(cursor):
     # Reset tables to clean slate
+    cursor.execute("DROP TABLE IF EXISTS reorder_plan")
+    cursor.execute("DROP TABLE IF EXISTS forecast_state")
+    cursor.execute("DROP TABLE IF EXISTS sales_rollup")
     cursor.execute("DROP TABLE IF EXISTS sales_history")
     cursor.execute("DROP TABLE IF EXISTS inventory_lots")
     cursor.execute("DROP TABLE IF EXISTS customer_orders")
     cursor.execute("DROP TABLE IF EXISTS products") # Drop master last or verify FK constraints? SQLite defaults usually lax, but better safe.
 
-    # 1. Product Master Table (For Hash Table & BST)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS products (
-            sku TEXT PRIMARY KEY,
-            name TEXT NOT NULL,
-            current_stock INTEGER DEFAULT 0,
-            lead_time_days INTEGER DEFAULT 7,
-            unit_cost REAL
-        )
-    ''')
-
-    # 2. Sales History Table (For Dynamic Array/Prediction)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS sales_history (
-            txn_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            sku TEXT,
-            qty_sold INTEGER,
-            sale_date DATE,
-            FOREIGN KEY (sku) REFERENCES products(sku)
-        )
-    ''')
-
-    # 3. Lot Tracking Table (For Set/Safety Checks)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS inventory_lots (
-            lot_id TEXT PRIMARY KEY,
-            sku TEXT,
-            expiry_date DATE,
-            is_recalled INTEGER DEFAULT 0,
-            FOREIGN KEY (sku) REFERENCES products(sku)
-        )
-    ''')
+    # Recreate everything through the migrations, so there is a single schema definition
+    cursor.execute("PRAGMA user_version = 0")
+    apply_migrations(cursor)
+
+def insert_by_shard(cursors, sql, rows, sku_index=0):
+    """Groups rows by the shard owning their SKU column and bulk-inserts each group."""
+    buckets = {}
+    for row in rows:
+        buckets.setdefault(shard_for_sku(row[sku_index]), []).append(row)
+    for index, bucket in buckets.items():
+        cursors[index].executemany(sql, bucket)
+
+def setup_database():
+    """
+    DESTRUCTIVE: drops every table and reseeds random demo data.
+    Only run explicitly (`python database_setup.py`); the API just migrates.
+    """
+    # Connect to (or create) every shard file (just 'pirs_warehouse.db' when unsharded)
+    conns = [connect_shard(i) for i in range(SHARD_COUNT)]
+    cursors = [conn.cursor() for conn in conns]
+    for cursor in cursors:
+        create_schema(cursor)
 
     # Seed initial product data
     # Seed Synthetic Data (100+ Products)
@@ -123,8 +114,9 @@ def setup_database():
             if qty > 0:
                 sales_data.append((sku, qty, date_str))
 
-    cursor.executemany('INSERT OR IGNORE INTO products VALUES (?,?,?,?,?)', products_data)
-    cursor.executemany('INSERT INTO sales_history (sku, qty_sold, sale_date) VALUES (?,?,?)', sales_data)
+    insert_by_shard(cursors, 'INSERT OR IGNORE INTO products (sku, name, current_stock, lead_time_days, unit_cost, category) VALUES (?,?,?,?,?,?)',
+                    [(*row, parse_category(row[1])) for row in products_data])
+    insert_by_shard(cursors, 'INSERT INTO sales_history (sku, qty_sold, sale_date) VALUES (?,?,?)', sales_data)
 
     # Seed initial sales data (to test prediction)
     # SKU001 (Milk): High sales (10/day), huge stock (150). Days left = 15.
@@ -132,23 +124,8 @@ def setup_database():
         ('SKU001', 10, '2023-10-01'), ('SKU001', 10, '2023-10-02'),
         ('SKU002', 1, '2023-10-01'), ('SKU002', 1, '2023-10-02')
     ]
-    cursor.executemany('INSERT INTO sales_history (sku, qty_sold, sale_date) VALUES (?,?,?)', sample_sales)
-
-    # 4. Customer Orders Table (For Priority Queue/Heap)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS customer_orders (
-            order_id TEXT PRIMARY KEY,
-            customer_tier INTEGER,
-            order_date DATE,
-            sku TEXT,
-            product_name TEXT,
-            qty_requested INTEGER,
-            total_amount REAL,
-            status TEXT,
-            FOREIGN KEY (sku) REFERENCES products(sku)
-        )
-    ''')
-    
+    insert_by_shard(cursors, 'INSERT INTO sales_history (sku, qty_sold, sale_date) VALUES (?,?,?)', sample_sales)
+
     # Seed Customer Orders
     orders_data = []
     statuses = ['PENDING', 'SHIPPED', 'BLOCKED']
@@ -174,11 +151,16 @@ def setup_database():
             orders_data.append((order_id, tier, order_date, sku, name, qty, total_amount, status))
             order_counter += 1
             
-    cursor.executemany('INSERT OR IGNORE INTO customer_orders VALUES (?,?,?,?,?,?,?,?)', orders_data)
+    insert_by_shard(cursors, 'INSERT OR IGNORE INTO customer_orders VALUES (?,?,?,?,?,?,?,?)', orders_data, sku_index=3)
+
+    # Seed the incremental forecast state from the generated history
+    for cursor in cursors:
+        rebuild_forecast_table(cursor)
 
-    conn.commit()
-    conn.close()
-    print("Database 'pirs_warehouse.db' initialized successfully!")
+    for conn in conns:
+        conn.commit()
+        conn.close()
+    print(f"Database {', '.join(repr(p) for p in all_shard_paths())} initialized successfully!")
 
 if __name__ == "__main__":
     setup_database()
\ No newline at end of file
@@ -0,0 +1,115 @@
+import os
+import sqlite3
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+DB_NAME = 'pirs_warehouse.db'
+
+# Number of SQLite files the SKU-keyed tables are spread over.
+# 1 (the default) keeps everything in the single DB_NAME file.
+SHARD_COUNT = max(1, int(os.environ.get('PIRS_SHARDS', '1')))
+
+# Tables partitioned by SKU. Every row of these lives in exactly one shard.
+SHARDED_TABLES = ('products', 'sales_history', 'customer_orders', 'inventory_lots')
+
+
+def shard_path(index):
+    """File name of shard `index`. A single-shard setup uses the classic DB file."""
+    if SHARD_COUNT == 1:
+        return DB_NAME
+    base, ext = os.path.splitext(DB_NAME)
+    return f"{base}_shard{index}{ext}"
+
+
+def all_shard_paths():
+    return [shard_path(i) for i in range(SHARD_COUNT)]
+
+
+def shard_for_sku(sku):
+    """
+    Routes a SKU to its shard.
+
+    Uses CRC32 instead of hash() so the mapping is stable across processes
+    and restarts (Python randomises str hashes per process).
+    Complexity: O(len(sku))
+    """
+    if SHARD_COUNT == 1:
+        return 0
+    return zlib.crc32(str(sku).encode('utf-8')) % SHARD_COUNT
+
+
+def connect_shard(index, check_same_thread=True):
+    conn = sqlite3.connect(shard_path(index), check_same_thread=check_same_thread)
+    # Each shard (or the single file) has one writer lock; WAL lets readers, including
+    # read_snapshot()'s long pinned views, run alongside it
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+@contextmanager
+def read_snapshot(check_same_thread=True):
+    """
+    A consistent read view of every shard for long reports and exports.
+    Yields one connection per shard, in shard order.
+
+    Each shard gets a read transaction pinned by its first read: in WAL mode
+    (see connect_shard) the view stays fixed until the block ends, and
+    writers keep committing alongside it.
+
+    The shards are pinned back to back. Every write transaction touches one
+    shard only, so no dispatch is ever half-visible in the view.
+    """
+    conns = []
+    try:
+        for index in range(SHARD_COUNT):
+            conn = connect_shard(index, check_same_thread)
+            conns.append(conn)
+            conn.execute("BEGIN")
+            conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone() # The first read fixes the snapshot
+        yield conns
+    finally:
+        for conn in conns:
+            conn.close()
+
+
+def connect_for_sku(sku):
+    """Opens a connection to the shard that owns `sku`."""
+    return connect_shard(shard_for_sku(sku))
+
+
+def fan_out(fn):
+    """
+    Runs fn(conn) against every shard in parallel and returns the results
+    as a list (one entry per shard, in shard order).
+
+    Each worker opens and closes its own connection, since sqlite3
+    connections must not be shared across threads.
+    """
+    def run(index):
+        conn = connect_shard(index)
+        try:
+            return fn(conn)
+        finally:
+            conn.close()
+
+    if SHARD_COUNT == 1:
+        return [run(0)]
+
+    with ThreadPoolExecutor(max_workers=SHARD_COUNT) as pool:
+        return list(pool.map(run, range(SHARD_COUNT)))
+
+
+def find_order_shard(order_id):
+    """
+    Locates the shard holding an order when only its ID is known.
+    Returns the shard index, or None if no shard has the order.
+    """
+    def probe(conn):
+        row = conn.execute("SELECT 1 FROM customer_orders WHERE order_id = ?", (order_id,)).fetchone()
+        return row is not None
+
+    for index, found in enumerate(fan_out(probe)):
+        if found:
+            return index
+    return None
@@ -0,0 +1,324 @@
+"""
+Memory-mapped SKU x day demand matrix, derived from sales_history.
+
+Layout (in DEMAND_DIR):
+    demand.f32  raw float32 matrix, day-major: row = day, column = SKU
+    meta.json   first day, used rows/columns, capacities, SKU index and the
+                per-shard sales_history high-water marks (txn_id)
+
+Rows are days, so new days are an append-only tail: the file grows at the
+end (doubling its day capacity) and existing rows never move. New SKUs take
+the next free column; only running out of SKU capacity rewrites the file.
+Updates read just the sales_history rows past the stored txn_id, so keeping
+the matrix current costs O(new sales). A full rebuild also replays the
+monthly sales archives (archival.py), so archived history stays in the matrix.
+
+Readers slice the mapping directly, e.g. `matrix.view(-90)` is a zero-copy
+view of the last 90 days for every SKU.
+
+Several processes (API workers, batch_run, backtest) may share one
+directory. Updates hold an exclusive lock on DEMAND_DIR/lock and first
+reload meta.json, so each sale is added exactly once whichever process
+applies it. A rewritten data file is swapped in by rename, so other
+processes' existing mappings stay valid until they reload.
+"""
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date
+import numpy as np
+from db_router import SHARD_COUNT, connect_shard
+from archival import earliest_archived_sale, get_archived_sales
+
+try:
+    import fcntl
+except ImportError: # Windows: only the in-process lock applies
+    fcntl = None
+
+DEMAND_DIR = os.environ.get("PIRS_DEMAND_DIR", "pirs_demand")
+DTYPE = np.float32
+# Initial capacities; both double when exhausted
+INITIAL_DAYS = 366
+INITIAL_SKUS = 256
+
+
+def _day_number(value):
+    return int(np.datetime64(str(value)[:10], 'D').astype(np.int64))
+
+
+class DemandMatrix:
+    """
+    Data Structure: memory-mapped 2D array (day x SKU) + Hash Table (SKU -> column)
+    Complexity: O(1) to locate any SKU/day cell, O(new sales) per update
+    """
+    def __init__(self, directory=DEMAND_DIR):
+        self.directory = directory
+        self.data_path = os.path.join(directory, "demand.f32")
+        self.meta_path = os.path.join(directory, "meta.json")
+        self.lock_path = os.path.join(directory, "lock")
+        self.version = None    # meta.json save counter this process last loaded or wrote
+        self.meta_stat = None  # (inode, mtime, size) of that meta.json: unchanged files are not re-parsed
+        self.writable = True
+        self.first_day = None  # Day number (days since 1970-01-01) of row 0
+        self.days = 0          # Rows in use
+        self.day_capacity = 0
+        self.sku_capacity = 0
+        self.skus = []         # Column -> SKU
+        self.index = {}        # SKU -> column
+        self.marks = {}        # shard -> {"last_txn": int, "last_row": [sku, date, qty]}
+        self.data = None
+        self.lock = threading.RLock() # Updates rewrite the file and meta; one at a time per process
+
+    # --- Storage ---
+    def open(self, update=True):
+        """
+        Maps the stored matrix (if any) and brings it up to date with sales_history.
+        update=False maps it read-only as stored, e.g. in worker processes reading columns.
+        """
+        self.writable = update
+        with self.lock, self._file_lock(exclusive=update):
+            self._reload()
+            if update:
+                self._update()
+        return self
+
+    @contextmanager
+    def _file_lock(self, exclusive=True):
+        """Inter-process lock on the directory: one writer at a time, and readers never see half an update."""
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _reload(self):
+        """Re-reads meta.json (and remaps the data file) if another process saved it since this one did."""
+        if not (os.path.exists(self.meta_path) and os.path.exists(self.data_path)):
+            return
+        if self.data is not None and self._stat_meta() == self.meta_stat:
+            return
+        with open(self.meta_path) as f:
+            meta = json.load(f)
+        self.meta_stat = self._stat_meta()
+        if self.data is not None and meta.get("version") == self.version:
+            return
+        self.first_day = meta["first_day"]
+        self.days = meta["days"]
+        self.day_capacity = meta["day_capacity"]
+        self.sku_capacity = meta["sku_capacity"]
+        self.skus = meta["skus"]
+        self.index = {sku: i for i, sku in enumerate(self.skus)}
+        self.marks = {int(k): v for k, v in meta["marks"].items()}
+        self.version = meta.get("version")
+        self._map("r+" if self.writable else "r")
+
+    def _stat_meta(self):
+        stat = os.stat(self.meta_path)
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _map(self, mode="r+"):
+        self.data = np.memmap(self.data_path, dtype=DTYPE, mode=mode, shape=(self.day_capacity, self.sku_capacity))
+
+    def _new_file(self, day_capacity, sku_capacity):
+        """
+        Swaps in a sparse zero-filled data file by rename. Other processes keep
+        reading the old file through their mappings; truncating it in place
+        would pull the pages out from under them.
+        """
+        tmp = self.data_path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.truncate(day_capacity * sku_capacity * np.dtype(DTYPE).itemsize)
+        os.replace(tmp, self.data_path)
+
+    def _save_meta(self):
+        self.version = (self.version or 0) + 1
+        meta = {
+            "version": self.version,
+            "first_day": self.first_day,
+            "days": self.days,
+            "day_capacity": self.day_capacity,
+            "sku_capacity": self.sku_capacity,
+            "skus": self.skus,
+            "marks": self.marks
+        }
+        tmp = self.meta_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self.meta_path)
+        self.meta_stat = self._stat_meta()
+
+    def _create(self, first_day, day_capacity, sku_capacity):
+        os.makedirs(self.directory, exist_ok=True)
+        self.first_day = first_day
+        self.days = 0
+        self.day_capacity = day_capacity
+        self.sku_capacity = sku_capacity
+        self.skus = []
+        self.index = {}
+        self.marks = {}
+        self.data = None
+        self._new_file(day_capacity, sku_capacity)
+        self._map()
+
+    def _ensure_days(self, days):
+        """Extends the day tail in place; rows already written never move."""
+        if days <= self.day_capacity:
+            self.days = max(self.days, days)
+            return
+        capacity = self.day_capacity
+        while capacity < days:
+            capacity *= 2
+        self.data.flush()
+        self.data = None
+        with open(self.data_path, "r+b") as f:
+            f.truncate(capacity * self.sku_capacity * np.dtype(DTYPE).itemsize)
+        self.day_capacity = capacity
+        self._map()
+        self.days = days
+
+    def _ensure_skus(self, skus):
+        """Assigns columns to unseen SKUs; rewrites the file only when SKU capacity runs out."""
+        new = [sku for sku in dict.fromkeys(skus) if sku not in self.index]
+        if not new:
+            return
+        needed = len(self.skus) + len(new)
+        if needed > self.sku_capacity:
+            capacity = self.sku_capacity
+            while capacity < needed:
+                capacity *= 2
+            old = np.array(self.data[:self.days, :len(self.skus)])
+            self.data = None
+            self._new_file(self.day_capacity, capacity)
+            self.sku_capacity = capacity
+            self._map()
+            self.data[:old.shape[0], :old.shape[1]] = old
+        for sku in new:
+            self.index[sku] = len(self.skus)
+            self.skus.append(sku)
+
+    # --- Building ---
+    def _still_applied(self, conn, mark):
+        """False when the last applied row is gone or different, i.e. the shard was reseeded."""
+        if not mark["last_txn"]:
+            return True
+        row = conn.execute("SELECT sku, sale_date, qty_sold FROM sales_history WHERE txn_id = ?", (mark["last_txn"],)).fetchone()
+        return row is not None and list(row) == mark["last_row"]
+
+    def _apply(self, rows):
+        """Adds (sku, sale_date, qty) rows into their cells. False if a row predates row 0."""
+        days = np.array([r[1][:10] for r in rows], dtype='datetime64[D]').astype(np.int64) - self.first_day
+        if days.min() < 0:
+            return False
+        self._ensure_days(int(days.max()) + 1)
+        self._ensure_skus(r[0] for r in rows)
+        columns = np.fromiter((self.index[r[0]] for r in rows), dtype=np.int64, count=len(rows))
+        qty = np.fromiter((r[2] for r in rows), dtype=DTYPE, count=len(rows))
+        np.add.at(self.data, (days, columns), qty)
+        return True
+
+    def rebuild(self):
+        """
+        Full rebuild from the monthly archives plus every shard's sales_history.
+        Returns the number of rows applied.
+        """
+        with self.lock, self._file_lock():
+            return self._rebuild()
+
+    def update(self, check_reseed=True):
+        """
+        Appends sales recorded since the last update.
+        Rebuilds instead when a shard was reseeded (its last applied row
+        changed) or when new sales predate row 0.
+        Returns the number of sales_history rows applied.
+        """
+        with self.lock, self._file_lock():
+            self._reload() # Another process may have applied sales since; its marks say which
+            return self._update(check_reseed)
+
+    def _rebuild(self):
+        dates = [earliest_archived_sale()]
+        for shard in range(SHARD_COUNT):
+            conn = connect_shard(shard)
+            dates.append(conn.execute("SELECT MIN(sale_date) FROM sales_history").fetchone()[0])
+            conn.close()
+        dates = [_day_number(d) for d in dates if d]
+        self._create(min(dates) if dates else _day_number(date.today()), INITIAL_DAYS, INITIAL_SKUS)
+
+        archived = list(get_archived_sales())
+        if archived:
+            self._apply(archived)
+        return len(archived) + self._update(check_reseed=False)
+
+    def _update(self, check_reseed=True):
+        if self.data is None:
+            return self._rebuild()
+
+        applied = 0
+        try:
+            for shard in range(SHARD_COUNT):
+                conn = connect_shard(shard)
+                mark = self.marks.get(shard, {"last_txn": 0, "last_row": None})
+                if check_reseed and not self._still_applied(conn, mark):
+                    conn.close()
+                    return self._rebuild()
+                rows = conn.execute(
+                    "SELECT txn_id, sku, sale_date, qty_sold FROM sales_history WHERE txn_id > ? ORDER BY txn_id",
+                    (mark["last_txn"],)
+                ).fetchall()
+                conn.close()
+                if not rows:
+                    continue
+
+                if not self._apply([r[1:] for r in rows]):
+                    return self._rebuild()
+
+                self.marks[shard] = {"last_txn": rows[-1][0], "last_row": list(rows[-1][1:])}
+                applied += len(rows)
+        except sqlite3.Error as e:
+            print(f"Database error updating demand matrix: {e}")
+
+        self.data.flush()
+        self._save_meta()
+        return applied
+
+    # --- Reading ---
+    def day_of(self, value):
+        """Row index of a date (may be outside the stored range)."""
+        return _day_number(value) - self.first_day
+
+    def date_of(self, row):
+        return str(np.datetime64(self.first_day + row, 'D'))
+
+    def view(self, start=0, stop=None):
+        """Zero-copy view of rows [start, stop) for every SKU column in use (negative start = last N days)."""
+        return self.data[:self.days, :len(self.skus)][start:stop]
+
+    def series(self, sku):
+        """Daily demand of one SKU over the stored range (zero-copy, strided)."""
+        column = self.index.get(sku)
+        if column is None:
+            return np.zeros(self.days, dtype=DTYPE)
+        return self.data[:self.days, column]
+
+    def window(self, skus, days, end=None):
+        """
+        Dense (days x len(skus)) demand block ending at `end` (default today),
+        zero-padded for days outside the stored range and SKUs without sales.
+        """
+        end_row = self.day_of(end or date.today())
+        start_row = end_row - days + 1
+        block = np.zeros((days, len(skus)), dtype=DTYPE)
+        lo, hi = max(start_row, 0), min(end_row + 1, self.days)
+        if hi > lo:
+            present = [(i, self.index[sku]) for i, sku in enumerate(skus) if sku in self.index]
+            if present:
+                out_cols, columns = map(list, zip(*present))
+                block[lo - start_row:hi - start_row, out_cols] = self.data[lo:hi][:, columns]
+        return block
@@ -0,0 +1,143 @@
+import csv
+import heapq
+import io
+import json
+import numpy as np
+from archival import ORDER_COLUMNS as ORDER_SELECT, iter_archived_orders
+from data_versions import json_default
+from db_router import read_snapshot
+from wave_planner import wave_pick_list
+
+FORMATS = ('csv', 'jsonl')
+MEDIA_TYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+# Rows encoded per text chunk (one chunk is buffered at a time)
+CHUNK_ROWS = 1000
+# Matches the CRITICAL cut-off of InventoryBST.get_stability_report()
+CRITICAL_DAYS = 7
+
+STABILITY_COLUMNS = ('sku', 'name', 'current_stock', 'unit_cost', 'days_remaining', 'status')
+REORDER_COLUMNS = ('sku', 'name', 'current_stock', 'lead_time_days', 'avg_daily', 'std_daily', 'safety_stock',
+                   'reorder_point', 'eoq', 'suggested_qty', 'needs_reorder')
+PICKLIST_COLUMNS = ('wave', 'sku', 'name', 'qty', 'order_count')
+ORDER_COLUMNS = tuple(column.strip() for column in ORDER_SELECT.split(','))
+
+
+def iter_cursor(cursor, size=CHUNK_ROWS):
+    """Yields a cursor's rows via fetchmany, so at most `size` rows are materialised at once."""
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield from rows
+
+
+def encode_rows(rows, columns, fmt='csv', chunk_rows=CHUNK_ROWS):
+    """
+    Encodes an iterable of row tuples as CSV (with header) or JSONL text chunks.
+
+    Only the current chunk of at most `chunk_rows` rows is buffered, so memory
+    stays flat however many rows flow through.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}' (expected one of {', '.join(FORMATS)})")
+
+    buffer = io.StringIO()
+    if fmt == 'csv':
+        writer = csv.writer(buffer, lineterminator='\n')
+        writer.writerow(columns)
+        write = writer.writerow
+    else:
+        encoder = json.JSONEncoder(default=json_default, separators=(',', ':'), check_circular=False)
+        def write(row):
+            buffer.write(encoder.encode(dict(zip(columns, row))))
+            buffer.write('\n')
+
+    pending = 0
+    for row in rows:
+        write(row)
+        pending += 1
+        if pending >= chunk_rows:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    tail = buffer.getvalue()
+    if tail:
+        yield tail
+
+
+def write_rows(path, rows, columns, fmt='csv', chunk_rows=CHUNK_ROWS):
+    """Streams rows into a CSV/JSONL file chunk by chunk. Returns the number of rows written."""
+    count = 0
+    def counted():
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        for chunk in encode_rows(counted(), columns, fmt, chunk_rows):
+            f.write(chunk)
+    return count
+
+
+# --- Dataset row generators ---
+# In-memory datasets take a snapshot of what they must sort when called (so a
+# caller can take it under a lock), then yield rows lazily in CHUNK_ROWS
+# slices, so only the sort keys (not the encoded rows) are held.
+
+def stability_rows(catalog):
+    """Every SKU by days remaining, lowest first (the BST stability report, unabridged)."""
+    size = len(catalog)
+    days = catalog.days_remaining()
+    stock = catalog.stock[:size].copy()
+    price = catalog.price[:size].copy()
+    skus, names = catalog.skus[:size], catalog.names[:size]
+    order = np.argsort(days, kind='stable')
+    def rows():
+        for start in range(0, size, CHUNK_ROWS):
+            chunk = order[start:start + CHUNK_ROWS]
+            for i, d, s, p in zip(chunk.tolist(), days[chunk].tolist(), stock[chunk].tolist(), price[chunk].tolist()):
+                yield (skus[i], names[i], s, p, d, "CRITICAL" if d < CRITICAL_DAYS else "STABLE")
+    return rows()
+
+
+def reorder_rows(reorder_engine, all_skus=False):
+    """
+    Reorder plan rows, furthest below the reorder point first (SKUs needing a reorder only, unless all_skus).
+    Reads the plan as it stands: call reorder_engine.refresh() first, before taking the catalog's lock.
+    """
+    plans = [plan for plan in list(reorder_engine.plan.values()) if all_skus or plan['needs_reorder']]
+    urgency = np.fromiter((plan['stock'] - plan['reorder_point'] for plan in plans), dtype=np.float64, count=len(plans))
+    order = np.argsort(urgency, kind='stable').tolist()
+    catalog = reorder_engine.catalog
+    names = [catalog.names[catalog.index[plan['sku']]] if plan['sku'] in catalog.index else None for plan in plans]
+    def rows():
+        for i in order:
+            plan = plans[i]
+            yield (plan['sku'], names[i], plan['stock'], plan['lead_time'], plan['avg_daily'],
+                   plan['std_daily'], plan['safety_stock'], plan['reorder_point'], plan['eoq'], plan['suggested_qty'],
+                   plan['needs_reorder'])
+    return rows()
+
+
+def picklist_rows(waves):
+    """Pick lines of planned waves (see wave_planner.plan_waves), wave by wave."""
+    for number, wave in enumerate(waves, 1):
+        for line in wave_pick_list(wave):
+            yield (number, line['sku'], line['name'], line['qty'], line['count'])
+
+
+def order_rows(include_archive=False):
+    """
+    Every order, newest first, merged from the shard cursors (and the
+    monthly archives if asked) without materialising any of them.
+    Reads one consistent snapshot of the shards (see read_snapshot), so a
+    long export neither mixes states nor holds up dispatches.
+    """
+    # The response may resume this generator on another worker thread
+    with read_snapshot(check_same_thread=False) as conns:
+        sources = [iter_cursor(conn.execute(f"SELECT {ORDER_SELECT} FROM customer_orders ORDER BY order_date DESC")) for conn in conns]
+        if include_archive:
+            sources.append(iter_archived_orders())
+        yield from heapq.merge(*sources, key=lambda row: row[2] or '', reverse=True)
@@ -1,4 +1,151 @@
+import functools
 import heapq
+import itertools
+import threading
+import time
+from operator import attrgetter
+from prioritization import IndexedMinHeap
+
+class OrderRecord:
+    """
+    Compact queued-order record (one per order, shared by every queue and view).
+
+    Uses __slots__ instead of a per-order dict, and still supports the
+    `order['qty']` / `order.get('status')` / `{**order}` access the rest of
+    the code uses. Keys outside the standard fields go to `extra`.
+    """
+    __slots__ = ('order_id', 'customer', 'item_sku', 'item_name', 'tier', 'days_remaining',
+                 'qty', 'total_amount', 'status', 'priority_reason', 'priority_score',
+                 'blocked_reason', 'extra')
+
+    FIELDS = __slots__[:-1]
+
+    def __init__(self, order_id, customer=None, item_sku=None, item_name=None, tier=1, days_remaining=30,
+                 qty=1, total_amount=0, status='PENDING', priority_reason=None, priority_score=None,
+                 blocked_reason=None, extra=None):
+        self.order_id = order_id
+        self.customer = customer
+        self.item_sku = item_sku
+        self.item_name = item_name
+        self.tier = tier
+        self.days_remaining = days_remaining
+        self.qty = qty
+        self.total_amount = total_amount
+        self.status = status
+        self.priority_reason = priority_reason
+        self.priority_score = priority_score
+        self.blocked_reason = blocked_reason
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, details):
+        if isinstance(details, cls):
+            return details
+        known = {k: v for k, v in details.items() if k in cls.FIELDS}
+        extra = {k: v for k, v in details.items() if k not in cls.FIELDS} or None
+        return cls(extra=extra, **known)
+
+    def __getitem__(self, key):
+        if key in self.FIELDS:
+            value = getattr(self, key)
+            if value is not None or key in ('order_id', 'status'):
+                return value
+        elif self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        """Set fields only, so {**record} matches the dict the record replaced."""
+        keys = [f for f in self.FIELDS if getattr(self, f) is not None]
+        if self.extra:
+            keys.extend(self.extra)
+        return keys
+
+    def to_dict(self):
+        # Built at C level; unset (None) fields are dropped to match the dict this record replaced
+        data = dict(zip(self.FIELDS, _order_fields(self)))
+        if self.blocked_reason is None:
+            del data['blocked_reason']
+        if None in data.values():
+            data = {key: value for key, value in data.items() if value is not None}
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def to_json(self):
+        return self.to_dict()
+
+_order_fields = attrgetter(*OrderRecord.FIELDS)
+
+
+class StockedOrderView:
+    """
+    An OrderRecord plus the live stock fields the dashboard shows.
+    Built per poll instead of a {**order, ...} copy; the merged dict only
+    exists transiently while the response is being encoded (to_json).
+    """
+    __slots__ = ('order', 'current_stock', 'available')
+
+    def __init__(self, order, current_stock, available=None):
+        self.order = order
+        self.current_stock = current_stock
+        self.available = available # Available-to-promise result, if one was computed
+
+    @property
+    def stock_available(self):
+        if self.available is not None:
+            return self.available
+        return self.current_stock >= (self.order.qty or 1)
+
+    def get(self, key, default=None):
+        if key == 'current_stock': return self.current_stock
+        if key == 'stock_available': return self.stock_available
+        return self.order.get(key, default)
+
+    def __getitem__(self, key):
+        value = self.get(key, KeyError)
+        if value is KeyError:
+            raise KeyError(key)
+        return value
+
+    def to_json(self):
+        data = self.order.to_dict()
+        data['current_stock'] = self.current_stock
+        data['stock_available'] = self.stock_available
+        return data
+
+
+def synchronized(method):
+    """
+    Runs a method under the instance's lock. Endpoints execute on a thread
+    pool, and the indexed heaps are pure Python, so an interleaved sift could
+    otherwise corrupt them.
+    """
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return locked
+
+
+# Aging policy per customer tier: priority points gained per day spent in the queue.
+# Standard orders age fastest so they can't starve behind a stream of newer premium ones
+# (a Standard order waiting 6 days outranks a fresh Premium one for the same SKU).
+AGING_POLICIES = {1: 10.0, 2: 6.0, 3: 2.0}
+DEFAULT_AGING = 10.0 # Tiers without a policy
+# Scores are evaluated at this granularity, so the queue order is fixed within a tick
+AGING_TICK_SECONDS = 60
+EXPIRY_BONUS = 500
+TIER_REASONS = {3: "Premium Customer", 2: "VIP Customer"}
+EXPIRY_DAYS = 7
+SECONDS_PER_DAY = 86400
+
 
 class ShippingQueue:
     """
@@ -7,16 +154,123 @@ class ShippingQueue:
     1. Expiring Goods (FEFO)
     2. Premium Customers
     3. High Value Orders
+
+    Priorities age: an order's score rises by 1 point per day as its days
+    remaining count down to an absolute deadline, plus its tier's aging rate
+    (AGING_POLICIES) per day waited. Within one tier every score grows at the
+    same slope, so each tier is a heap keyed by the score minus slope * enqueue
+    time (days since the queue's epoch): a static key whose order never changes.
+    The top order is the best of the per-tier heads at the current time, and
+    the +500 "Expiring Soon" step is applied when its absolute time comes due.
+
+    A SKU -> order IDs index lets a stock change re-score just that SKU's
+    orders (reprioritise_sku) instead of the whole queue.
+
+    Data Structure: one Indexed Max-Heap per tier + Indexed Min-Heap of escalation times
+                    + Hash Map SKU -> order IDs
+    Complexity: O(log N) add / pop / remove, O(T) to compare T tier heads,
+                O(k log N) to re-score a SKU's k orders, no periodic re-heapify
+
+    on_change(event_type, payload) is called after every mutation
+    ('enqueued' / 'removed' / 'reprioritised', and 'aged' when the score
+    clock ticks) so listeners can stream deltas.
     """
-    def __init__(self):
-        self.heap = [] # List used as a Binary Heap
+    def __init__(self, on_change=None, aging=None, clock=time.time):
+        self.aging = dict(AGING_POLICIES if aging is None else aging)
+        self.clock = clock
+        self.epoch = clock()
+        self.tick = 0
+        self.lanes = {} # tier -> IndexedMinHeap of ((-static key, seq), order_id)
+        self.escalations = IndexedMinHeap() # (due day, order_id) for the Expiring Soon step
+        self.orders = {} # order_id -> (record, tier, deadline day)
+        self.by_sku = {} # sku -> set of queued order_ids (secondary index for stock changes)
         self.entry_count = 0 # Tie-breaker for stable sorting
+        self.on_change = on_change
+        # Re-entrant: on_change listeners (e.g. AvailableToPromise) read the queue back
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.orders)
+
+    def __contains__(self, order_id):
+        return order_id in self.orders
+
+    def slope(self, tier):
+        """Points per day an order of this tier gains while queued."""
+        return 1.0 + self.aging.get(tier, DEFAULT_AGING)
 
-    def add_order(self, order_details):
+    def now(self):
+        """Current time in days since the epoch, rounded down to the aging tick."""
+        return self.tick * AGING_TICK_SECONDS / SECONDS_PER_DAY
+
+    @synchronized
+    def advance(self):
+        """
+        Moves the score clock to the current tick and applies any Expiring Soon
+        escalations that came due: O(1) when the tick hasn't changed, otherwise
+        O(log N) per escalation (each order escalates at most once).
+        """
+        tick = int((self.clock() - self.epoch) // AGING_TICK_SECONDS)
+        if tick <= self.tick:
+            return
+        self.tick = tick
+        self._escalate()
+        if self.orders and self.on_change:
+            self.on_change('aged', {'tick': tick})
+
+    @synchronized
+    def stamp(self):
+        """The current queue time (days since the epoch), for mutations applied elsewhere with `now`."""
+        self.advance()
+        return self.now()
+
+    def _escalate(self):
+        # Applies the Expiring Soon step to every order whose escalation time has passed
+        now = self.now()
+        while self.escalations.heap and self.escalations.heap[0][0] <= now:
+            _, order_id = self.escalations.heap[0]
+            self.escalations.remove(order_id)
+            record, tier, _ = self.orders[order_id]
+            lane = self.lanes[tier]
+            (key, seq) = lane.key_of(order_id)
+            lane.push((key - EXPIRY_BONUS, seq), order_id)
+            record.priority_reason = "Expiring Soon"
+            self._refresh(order_id)
+            if self.on_change:
+                self.on_change('reprioritised', record)
+
+    def rank(self, order_id):
+        """Sort key of a queued order at the current tick (smaller = served first)."""
+        _, tier, _ = self.orders[order_id]
+        key, seq = self.lanes[tier].key_of(order_id)
+        return (key - self.slope(tier) * self.now(), seq)
+
+    def score(self, order_id):
+        """The order's priority score as of the current tick."""
+        record, tier, _ = self.orders[order_id]
+        key, _ = self.lanes[tier].key_of(order_id)
+        return -key + self.slope(tier) * self.now()
+
+    def _refresh(self, order_id):
+        # Writes the current score / days remaining onto the record for the views
+        record, _, deadline = self.orders[order_id]
+        record.priority_score = round(self.score(order_id), 2)
+        record.days_remaining = round(deadline - self.now(), 2)
+        return record
+
+    @synchronized
+    def add_order(self, order_details, now=None):
         """
         Enqueue a new order with calculated priority.
-        Priority Score = (Tier * 10) + (100 - Days_To_Expiry)
+        Priority Score = (Tier * 10) + (100 - Days_To_Expiry), rising as the order ages
+
+        Accepts an OrderRecord (stored as-is) or a plain dict (converted once).
+        Re-adding a queued order replaces its entry.
+        `now` is the queue time the order was enqueued at (default: the current
+        tick), so a mutation replayed later keys the order exactly as it was keyed first.
         """
+        self.advance()
+        order_details = OrderRecord.from_dict(order_details)
         # Extract factors (Defaults used if missing for simulation stability)
         tier = order_details.get('tier', 1) 
         days_to_expiry = order_details.get('days_remaining', 30)
@@ -26,8 +280,8 @@ class ShippingQueue:
         priority_score = 0
         
         # 1. Critical: Expiring Soon (FEFO) - Highest Weight
-        if days_to_expiry < 7:
-            priority_score += 500  # Jump to top
+        if days_to_expiry < EXPIRY_DAYS:
+            priority_score += EXPIRY_BONUS  # Jump to top
             priority_reason = "Expiring Soon"
         
         # 2. Tier: Premium > VIP > Standard
@@ -41,51 +295,176 @@ class ShippingQueue:
         # 3. Urgency fine-tuning
         priority_score += (100 - days_to_expiry)
         
-        # Determine Status - Separate Blocked Orders
-        status = order_details.get('status', 'PENDING')
-        
-        # Python's heapq is Min-Heap, so store negative score for Max-Heap behavior
-        heapq.heappush(self.heap, (-priority_score, self.entry_count, {**order_details, 'priority_reason': priority_reason, 'priority_score': priority_score}))
+        # The record itself carries the priority fields (no per-order copy)
+        entry = order_details
+        entry.priority_reason = priority_reason
+        entry.priority_score = priority_score
+
+        order_id = entry.order_id
+        if order_id in self.orders:
+            self._discard(order_id)
+        if now is None:
+            now = self.now()
+        deadline = now + days_to_expiry # Absolute day the stock runs out
+        self.orders[order_id] = (entry, tier, deadline)
+        self.by_sku.setdefault(entry.item_sku, set()).add(order_id)
+        # Static key: the score minus what aging will add, so it never needs updating.
+        # Negated because IndexedMinHeap is a Min-Heap
+        static_key = priority_score - self.slope(tier) * now
+        self.lanes.setdefault(tier, IndexedMinHeap()).push((-static_key, self.entry_count), order_id)
+        if days_to_expiry >= EXPIRY_DAYS:
+            self.escalations.push(deadline - EXPIRY_DAYS, order_id)
+        else:
+            self.escalations.remove(order_id)
         self.entry_count += 1
+        if self.on_change:
+            self.on_change('enqueued', entry)
+        self._escalate() # Replayed late, the escalation may already be due
         
         print(f"[SMART BATCH] Order added: {order_details['order_id']} (Reason: {priority_reason}, Score: {priority_score})")
 
+    def _discard(self, order_id):
+        record, tier, _ = self.orders.pop(order_id)
+        self.lanes[tier].remove(order_id)
+        self.escalations.remove(order_id)
+        sku_orders = self.by_sku.get(record.item_sku)
+        if sku_orders is not None:
+            sku_orders.discard(order_id)
+            if not sku_orders:
+                del self.by_sku[record.item_sku]
+        return record
+
+    @synchronized
+    def orders_for_sku(self, sku):
+        """Queued orders for one SKU: O(k) via the SKU index."""
+        return [self.orders[order_id][0] for order_id in self.by_sku.get(sku, ())]
+
+    @synchronized
+    def records(self, order_ids):
+        """{order_id: record} for those of `order_ids` that are queued: O(k)."""
+        return {order_id: self.orders[order_id][0] for order_id in order_ids if order_id in self.orders}
+
+    @synchronized
+    def reprioritise_sku(self, sku, days_remaining, now=None):
+        """
+        Re-scores the queued orders for one SKU after its stock (and so its
+        days remaining) changed. Each order's key moves by the change in its
+        deadline, keeping the aging it has accumulated; the Expiring Soon step
+        is added or removed if the new deadline crosses it.
+        Complexity: O(k log N) for the SKU's k orders, independent of queue depth.
+        `now` is the queue time of the stock change, as in add_order().
+        Returns the number of orders re-scored.
+        """
+        self.advance()
+        order_ids = self.by_sku.get(sku)
+        if not order_ids:
+            return 0
+        deadline = (self.now() if now is None else now) + days_remaining
+        expiring = days_remaining < EXPIRY_DAYS
+        for order_id in order_ids:
+            record, tier, old_deadline = self.orders[order_id]
+            was_expiring = order_id not in self.escalations
+            lane = self.lanes[tier]
+            key, seq = lane.key_of(order_id)
+            # Keys are negated scores: a later deadline lowers the score
+            key += deadline - old_deadline
+            if expiring != was_expiring:
+                key += -EXPIRY_BONUS if expiring else EXPIRY_BONUS
+            lane.push((key, seq), order_id)
+            self.orders[order_id] = (record, tier, deadline)
+            if expiring:
+                self.escalations.remove(order_id)
+                record.priority_reason = "Expiring Soon"
+            else:
+                self.escalations.push(deadline - EXPIRY_DAYS, order_id)
+                if was_expiring:
+                    record.priority_reason = TIER_REASONS.get(tier, "Standard")
+            self._refresh(order_id)
+            if self.on_change:
+                self.on_change('reprioritised', record)
+        self._escalate()
+        return len(order_ids)
+
+    def _head(self):
+        """Order ID with the highest current score: O(T) over the tier heads."""
+        now = self.now()
+        best, best_rank = None, None
+        for tier, lane in self.lanes.items():
+            if not lane.heap:
+                continue
+            (key, seq), order_id = lane.heap[0]
+            rank = (key - self.slope(tier) * now, seq)
+            if best_rank is None or rank < best_rank:
+                best, best_rank = order_id, rank
+        return best
+
+    @synchronized
     def process_next_order(self):
         """Dequeue the highest priority order."""
-        if not self.heap:
+        self.advance()
+        order_id = self._head()
+        if order_id is None:
             return None
-        
-        priority, _, order = heapq.heappop(self.heap)
+        self._refresh(order_id)
+        order = self._discard(order_id)
+        if self.on_change:
+            self.on_change('removed', {'order_id': order_id})
         return order
         
+    @synchronized
     def remove_order(self, order_id):
+        """Removes an order by ID (e.g. when manually dispatched): O(log N)."""
+        if order_id not in self.orders:
+            return False
+        self._discard(order_id)
+        print(f"[REMOVED] Order {order_id} removed manually.")
+        if self.on_change:
+            self.on_change('removed', {'order_id': order_id})
+        return True
+    
+    @synchronized
+    def remove_orders(self, order_ids):
         """
-        Removes an order by ID (e.g. when manually dispatched).
-        Rebuilds the heap, which is O(N).
+        Batch form of remove_order(): O(M log N) for M IDs.
+        Returns {order_id: record} for the orders removed.
         """
-        initial_len = len(self.heap)
-        self.heap = [item for item in self.heap if item[2]['order_id'] != order_id]
-        heapq.heapify(self.heap)
-        
-        if len(self.heap) < initial_len:
-            print(f"[REMOVED] Order {order_id} removed manually.")
-            return True
-        return False
-    
+        removed = {}
+        for order_id in set(order_ids):
+            if order_id in self.orders:
+                removed[order_id] = self._discard(order_id)
+        if removed:
+            print(f"[REMOVED] {len(removed)} orders removed in batch.")
+            if self.on_change:
+                for order_id in removed:
+                    self.on_change('removed', {'order_id': order_id})
+        return removed
+
+    def _ranked(self, lanes_entries):
+        """Merges per-tier entry lists (each already in priority order) by current score."""
+        now = self.now()
+        def ranked(tier, entries):
+            slope = self.slope(tier) * now
+            for (key, seq), order_id in entries:
+                yield (key - slope, seq), order_id
+        merged = heapq.merge(*(ranked(tier, entries) for tier, entries in lanes_entries))
+        return (order_id for _, order_id in merged)
+
+    @synchronized
+    def peek_top(self, k):
+        """The k highest-priority orders without removing them: O(T k log k)."""
+        self.advance()
+        order_ids = self._ranked((tier, lane.smallest(k)) for tier, lane in self.lanes.items())
+        return [self._refresh(order_id) for order_id in itertools.islice(order_ids, k)]
+
+    @synchronized
     def get_queue_status(self):
-        # Return sorted list for viewing without popping
-        # Heap elements are tuples: (-score, entry_count, order_details)
-        # We sort by the tuple itself, which naturally sorts by -score (ascending), so largest score comes first in absolute terms
-        
-        # Verify status against DB logic or filtering
-        # Since this is an in-memory queue, we should filter out any that might have been marked shipped externally if not removed
-        # But properly, we'll just return what's in the heap.
-        # The issue is likely that populated_queues loaded everything including SHIPPED, or they aren't being removed.
-        
-        sorted_heap = sorted(self.heap)
-        raw_list = [item[2] for item in sorted_heap if item[2].get('status') != 'SHIPPED']
-        return raw_list
+        # Return sorted list for viewing without popping, scored as of now
+        # Shipped orders are filtered out in case one was marked shipped externally and not removed
+        self.advance()
+        order_ids = self._ranked((tier, sorted(lane.heap)) for tier, lane in self.lanes.items())
+        return [record for record in map(self._refresh, order_ids) if record.status != 'SHIPPED']
 
+    @synchronized
     def get_optimized_pick_list(self):
         """
         Aggregates pending orders into a single Pick List using a Hash Map.
@@ -93,13 +472,13 @@ class ShippingQueue:
         """
         pick_map = {} # Hash Map: SKU -> Quantity
         
-        for _, _, order in self.heap:
-            if order.get('status') == 'SHIPPED':
+        for order, _, _ in self.orders.values():
+            if order.status == 'SHIPPED':
                 continue # Skip shipped orders in the pick list too
                 
-            sku = order.get('item_sku', 'UNKNOWN')
-            qty = order.get('qty', 1)
-            name = order.get('item_name', 'Unknown Item')
+            sku = order.item_sku or 'UNKNOWN'
+            qty = order.qty
+            name = order.item_name or 'Unknown Item'
             
             if sku in pick_map:
                 pick_map[sku]['qty'] += qty
@@ -114,28 +493,209 @@ class ShippingQueue:
         return sorted(list(pick_map.values()), key=lambda x: x['qty'], reverse=True)
 
 
+class AvailableToPromise:
+    """
+    Cumulative available-to-promise (ATP) over the ShippingQueue.
+
+    Walking a SKU's queued orders in priority order, each order reserves its
+    qty from the SKU's stock if what is left still covers it (the greedy rule
+    a wave dispatch applies), so ten orders of 5 against a stock of 10 show
+    two available, not ten. Results are kept per SKU and recomputed only for
+    SKUs marked dirty by an enqueue, removal, re-score or stock change, plus,
+    when the aging clock ticks, SKUs whose orders span tiers (their relative
+    order can shift as they age).
+
+    `stock_of(sku)` supplies the current stock (e.g. the catalog column).
+
+    Data Structure: Hash Maps order_id -> (available, stock left before it) and SKU -> order IDs
+    Complexity: O(k log k) per changed SKU with k queued orders, O(1) lookup
+    """
+    def __init__(self, queue, stock_of):
+        self.queue = queue
+        self.stock_of = stock_of
+        self.promises = {} # order_id -> (available, units left for it after higher-priority orders)
+        self.skus = {} # sku -> order IDs as of its last computation
+        self.sku_of = {} # order_id -> sku, so removals can be traced back
+        self.dirty = set()
+        self.tick = queue.tick
+        self.lock = queue.lock # Reads the queue's internals, so shares its lock
+
+    def mark_dirty(self, sku):
+        self.dirty.add(sku)
+
+    def on_change(self, event_type, payload):
+        """Feeds ShippingQueue change events (see ShippingQueue.on_change)."""
+        if event_type in ('enqueued', 'reprioritised'):
+            self.dirty.add(payload.get('item_sku'))
+        elif event_type == 'removed':
+            sku = self.sku_of.get(payload.get('order_id'))
+            if sku is not None:
+                self.dirty.add(sku)
+
+    def _compute(self, sku):
+        """Re-runs the reservation walk for one SKU. Returns the records whose availability flipped."""
+        queue = self.queue
+        for order_id in self.skus.pop(sku, ()):
+            self.sku_of.pop(order_id, None)
+            if order_id not in queue.by_sku.get(sku, ()):
+                self.promises.pop(order_id, None)
+
+        order_ids = sorted(queue.by_sku.get(sku, ()), key=queue.rank)
+        if not order_ids:
+            return []
+        left = self.stock_of(sku)
+        flipped = []
+        for order_id in order_ids:
+            record = queue.orders[order_id][0]
+            qty = record.qty or 1
+            available = qty <= left
+            previous = self.promises.get(order_id)
+            self.promises[order_id] = (available, left)
+            if previous is not None and previous[0] != available:
+                flipped.append(record)
+            if available:
+                left -= qty
+            self.sku_of[order_id] = sku
+        self.skus[sku] = order_ids
+        return flipped
+
+    @synchronized
+    def flush(self):
+        """Recomputes every dirty SKU. Returns the records whose availability flipped."""
+        if self.queue.tick != self.tick:
+            self.tick = self.queue.tick
+            tiers = self.queue.orders
+            self.dirty.update(sku for sku, ids in self.queue.by_sku.items()
+                              if len({tiers[order_id][1] for order_id in ids}) > 1)
+        flipped = []
+        while self.dirty:
+            flipped.extend(self._compute(self.dirty.pop()))
+        return flipped
+
+    @synchronized
+    def promise(self, order_id):
+        """(available, units left for it) for a queued order, or None if it isn't queued."""
+        sku = self.sku_of.get(order_id)
+        if sku is None or sku in self.dirty:
+            entry = self.queue.orders.get(order_id)
+            if entry is None:
+                return None
+            sku = entry[0].item_sku
+            self.dirty.discard(sku)
+            self._compute(sku)
+        return self.promises.get(order_id)
+
+    def available(self, order_id):
+        promise = self.promise(order_id)
+        return bool(promise and promise[0])
+
+
+# Block reasons a restock can clear (recalls / expired lots need a person)
+STOCK_REASONS = ("Insufficient stock", "Manual Block / Stock Issue")
+
+
 class BlockedQueue:
     """
     Manages orders that are blocked due to safety checks (recalled/expired/out of stock).
+    on_change works as in ShippingQueue ('blocked' / 'unblocked').
+
+    Data Structure: Hash Map order_id -> record (insertion ordered), plus
+                    Hash Map indexes SKU -> reason -> order IDs and reason -> order IDs
+    Complexity: O(1) block / resolve, O(k log k) to pick the releasable
+                orders of a SKU with k blocked orders
     """
-    def __init__(self):
-        self.blocked_orders = []
+    def __init__(self, on_change=None):
+        self.orders = {} # order_id -> record, oldest block first
+        self.by_sku = {} # sku -> {reason: {order_id: block seq}}
+        self.by_reason = {} # reason -> {order_id: block seq}
+        self.entry_count = 0 # Block sequence, so merged index lists come out oldest first
+        self.on_change = on_change
+
+    def __len__(self):
+        return len(self.orders)
+
+    def __contains__(self, order_id):
+        return order_id in self.orders
 
     def add_blocked_order(self, order_details, reason):
-        self.blocked_orders.append({
-            **order_details,
-            'blocked_reason': reason,
-            'status': 'BLOCKED'
-        })
+        entry = OrderRecord.from_dict(order_details)
+        if entry.order_id in self.orders:
+            self._discard(entry.order_id)
+        entry.blocked_reason = reason
+        entry.status = 'BLOCKED'
+        self.orders[entry.order_id] = entry
+        self.by_sku.setdefault(entry.item_sku, {}).setdefault(reason, {})[entry.order_id] = self.entry_count
+        self.by_reason.setdefault(reason, {})[entry.order_id] = self.entry_count
+        self.entry_count += 1
         print(f"[BLOCKED] Order {order_details['order_id']} blocked: {reason}")
+        if self.on_change:
+            self.on_change('blocked', entry)
+
+    def _discard(self, order_id):
+        entry = self.orders.pop(order_id, None)
+        if entry is None:
+            return None
+        reasons = self.by_sku.get(entry.item_sku, {})
+        for index in (reasons, self.by_reason):
+            ids = index.get(entry.blocked_reason)
+            if ids is not None:
+                ids.pop(order_id, None)
+                if not ids:
+                    del index[entry.blocked_reason]
+        if not reasons:
+            self.by_sku.pop(entry.item_sku, None)
+        return entry
 
     def get_blocked_list(self):
-        return self.blocked_orders
+        return list(self.orders.values())
+
+    def for_sku(self, sku, reasons=None):
+        """Blocked orders for one SKU (optionally only these reasons), oldest first."""
+        by_reason = self.by_sku.get(sku, {})
+        entries = sorted((seq, order_id) for reason in (by_reason if reasons is None else reasons)
+                         for order_id, seq in by_reason.get(reason, {}).items())
+        return [self.orders[order_id] for _, order_id in entries]
+
+    def for_reason(self, reason):
+        return [self.orders[order_id] for order_id in self.by_reason.get(reason, ())]
+
+    def releasable(self, sku, available, reasons=STOCK_REASONS):
+        """
+        The stock-blocked orders of `sku` that `available` units can cover,
+        highest tier first (oldest block first within a tier), allocated
+        greedily so a large order doesn't hold back smaller ones behind it.
+        Nothing is removed; see release().
+        """
+        candidates = sorted(self.for_sku(sku, reasons), key=lambda entry: -(entry.tier or 1))
+        picked = []
+        for entry in candidates:
+            qty = entry.qty or 1
+            if qty <= available:
+                picked.append(entry)
+                available -= qty
+        return picked
+
+    def release(self, order_ids):
+        """Removes orders that are going back to shipping. Returns their records."""
+        released = []
+        for order_id in order_ids:
+            entry = self._discard(order_id)
+            if entry is None:
+                continue
+            entry.status = 'PENDING'
+            entry.blocked_reason = None
+            released.append(entry)
+            if self.on_change:
+                self.on_change('unblocked', {'order_id': order_id})
+        return released
 
     def resolve_order(self, order_id):
-        # In a real app, this would re-validate and move to ShippingQueue
-        self.blocked_orders = [o for o in self.blocked_orders if o['order_id'] != order_id]
+        """Removes a blocked order in O(1) and returns its record (None if it wasn't blocked)."""
+        entry = self._discard(order_id)
         print(f"[RESOLVED] Blocked order {order_id} resolved/removed.")
+        if self.on_change:
+            self.on_change('unblocked', {'order_id': order_id})
+        return entry
 
 
 class SafetyCheck:
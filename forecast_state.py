@@ -0,0 +1,165 @@
+import sqlite3
+from db_router import fan_out
+from archival import create_rollup_table
+from prediction_engine import days_remaining_from_totals
+
+# Smoothing factor for the per-SKU exponentially weighted demand average
+EWMA_ALPHA = 0.3
+
+def create_forecast_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS forecast_state (
+            sku TEXT PRIMARY KEY,
+            total_sold INTEGER NOT NULL DEFAULT 0,
+            sale_count INTEGER NOT NULL DEFAULT 0,
+            ewma REAL NOT NULL DEFAULT 0,
+            FOREIGN KEY (sku) REFERENCES products(sku)
+        )
+    ''')
+
+def rebuild_forecast_table(cursor):
+    """
+    One-off full scan of sales_history into forecast_state.
+    Only needed when seeding or when the state table is missing/empty.
+    Archived sales count through their monthly rollup; the EWMA of a SKU
+    with archived sales starts from their mean sale and continues over the
+    hot rows.
+    """
+    create_forecast_table(cursor)
+    create_rollup_table(cursor)
+    cursor.execute("DELETE FROM forecast_state")
+    cursor.execute("SELECT sku, SUM(total_sold), SUM(sale_count) FROM sales_rollup GROUP BY sku")
+    # ewma is NOT NULL: rollup-only SKUs keep their archived mean sale
+    state = {sku: (total, count, total / count if count else 0) for sku, total, count in cursor.fetchall()}
+
+    cursor.execute("SELECT sku, qty_sold FROM sales_history ORDER BY sku, sale_date, txn_id")
+    for sku, qty in cursor.fetchall():
+        total, count, ewma = state.get(sku, (0, 0, 0))
+        ewma = qty if count == 0 else EWMA_ALPHA * qty + (1 - EWMA_ALPHA) * ewma
+        state[sku] = (total + qty, count + 1, ewma)
+
+    cursor.executemany(
+        "INSERT INTO forecast_state (sku, total_sold, sale_count, ewma) VALUES (?, ?, ?, ?)",
+        [(sku, total, count, ewma) for sku, (total, count, ewma) in state.items()]
+    )
+
+class ForecastStore:
+    """
+    Running per-SKU demand statistics, so forecasts never rescan sales_history.
+
+    Data Structure: Hash Table (SKU -> [total_sold, sale_count, ewma])
+    Complexity: O(1) per sale recorded, O(1) per forecast read
+    Persistence: mirrored into the forecast_state table of each shard
+    """
+    def __init__(self):
+        self.state = {}
+        self.loaded = False
+
+    def load(self):
+        """
+        Loads persisted state from every shard (rebuilding a shard's table only if it's empty).
+        A shard that fails is reported and skipped; the other shards' SKUs still load.
+        """
+        def read(conn):
+            try:
+                cursor = conn.cursor()
+                create_forecast_table(cursor)
+                cursor.execute("SELECT COUNT(*) FROM forecast_state")
+                if cursor.fetchone()[0] == 0:
+                    rebuild_forecast_table(cursor)
+                    conn.commit()
+                cursor.execute("SELECT sku, total_sold, sale_count, ewma FROM forecast_state")
+                return cursor.fetchall()
+            except sqlite3.Error as e:
+                conn.rollback()
+                path = conn.execute("PRAGMA database_list").fetchone()[2]
+                print(f"Database error loading forecast state from {path}: {e}")
+                return None
+
+        self.state = {}
+        for rows in fan_out(read):
+            if rows is not None:
+                self.state.update({sku: [total, count, ewma] for sku, total, count, ewma in rows})
+        self.loaded = True
+        return self
+
+    def record_sale(self, sku, qty, cursor):
+        """
+        Applies one sale to the running totals in O(1).
+
+        `cursor` must belong to the transaction that inserts the sales_history
+        row, so the persisted state commits (or rolls back) together with it.
+        Call apply_sale() after that transaction commits.
+        """
+        return self.record_sales([(sku, qty)], cursor)[sku]
+
+    def record_sales(self, sales, cursor):
+        """
+        Batch form of record_sale() for (sku, qty) pairs; repeated SKUs chain
+        correctly. Returns {sku: new_state} for apply_sales().
+
+        Each SKU's totals are read through `cursor`, inside the writer
+        transaction, so concurrent dispatches (and workers sharing the
+        database) build on the committed row, never on this process's copy.
+        """
+        new_states = {}
+        for sku, qty in sales:
+            if sku not in new_states:
+                cursor.execute("SELECT total_sold, sale_count, ewma FROM forecast_state WHERE sku = ?", (sku,))
+                new_states[sku] = cursor.fetchone() or (0, 0, None)
+            new_states[sku] = self._next(*new_states[sku], qty)
+        cursor.executemany(
+            """
+            INSERT INTO forecast_state (sku, total_sold, sale_count, ewma) VALUES (?, ?, ?, ?)
+            ON CONFLICT(sku) DO UPDATE SET
+                total_sold = excluded.total_sold,
+                sale_count = excluded.sale_count,
+                ewma = excluded.ewma
+            """,
+            [(sku, *state) for sku, state in new_states.items()]
+        )
+        return new_states
+
+    def apply_sale(self, sku, new_state):
+        self.apply_sales({sku: new_state})
+
+    def apply_sales(self, new_states):
+        for sku, new_state in new_states.items():
+            current = self.state.get(sku)
+            # Transactions can commit in one order and apply in another: keep the later state
+            if current is None or new_state[1] >= current[1]:
+                self.state[sku] = list(new_state)
+
+    def forget(self, sku):
+        self.state.pop(sku, None)
+
+    @staticmethod
+    def _next(total, count, ewma, qty):
+        ewma = qty if ewma is None or count == 0 else EWMA_ALPHA * qty + (1 - EWMA_ALPHA) * ewma
+        return (total + qty, count + 1, ewma)
+
+    def avg_sales(self, sku):
+        total, count, _ = self.state.get(sku, (0, 0, 0))
+        return total / count if count else 0
+
+    def ewma(self, sku):
+        return self.state.get(sku, (0, 0, 0))[2] or 0
+
+    def days_remaining(self, sku, stock):
+        """Days of cover for `stock` units at the SKU's average sale size (999 = no sales yet)."""
+        total, count, _ = self.state.get(sku, (0, 0, 0))
+        return days_remaining_from_totals(stock, total, count)
+
+_store = None
+
+def get_forecast_store(load=True):
+    """
+    Process-wide ForecastStore, loaded from the database on first use.
+    `load=False` hands out the instance unloaded, for owners (the API) that load it at startup.
+    """
+    global _store
+    if _store is None:
+        _store = ForecastStore()
+    if load and not _store.loaded:
+        _store.load()
+    return _store
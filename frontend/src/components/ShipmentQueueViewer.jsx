@@ -2,6 +2,39 @@ import React, { useState, useEffect } from 'react';
 import { Package, Truck, AlertTriangle, CheckCircle, Clock, Zap, MapPin, XCircle, AlertCircle, FileText } from 'lucide-react';
 import axios from 'axios';
 
+// Applies a batch of /api/shipping/stream deltas to the dashboard state
+function applyQueueDeltas(prev, deltas) {
+  const queue = new Map(prev.priority_queue.map(order => [order.order_id, order]));
+  const blocked = new Map(prev.blocked_orders.map(order => [order.order_id, order]));
+  const stockBySku = new Map();
+
+  for (const delta of deltas) {
+    const { type, ...payload } = delta;
+    if (type === 'enqueued' || type === 'reprioritised') queue.set(payload.order_id, payload);
+    else if (type === 'removed') queue.delete(payload.order_id);
+    else if (type === 'blocked') blocked.set(payload.order_id, payload);
+    else if (type === 'unblocked') blocked.delete(payload.order_id);
+    else if (type === 'stock') stockBySku.set(payload.sku, payload.stock);
+  }
+
+  let priorityQueue = [...queue.values()];
+  if (stockBySku.size) {
+    // stock_available is the server's available-to-promise; orders whose flag flips arrive as 'reprioritised'
+    priorityQueue = priorityQueue.map(order => stockBySku.has(order.item_sku)
+      ? { ...order, current_stock: stockBySku.get(order.item_sku) }
+      : order);
+  }
+  // Stable sort keeps arrival order among equal scores, matching the server's heap tie-breaker
+  priorityQueue.sort((a, b) => b.priority_score - a.priority_score);
+
+  return {
+    ...prev,
+    priority_queue: priorityQueue,
+    blocked_orders: [...blocked.values()],
+    queue_count: priorityQueue.length,
+  };
+}
+
 export function ShipmentQueueViewer() {
   const [data, setData] = useState({ priority_queue: [], pick_list: [], blocked_orders: [] });
   const [loading, setLoading] = useState(true);
@@ -21,9 +54,28 @@ export function ShipmentQueueViewer() {
   };
 
   useEffect(() => {
-    fetchData();
-    const interval = setInterval(fetchData, 5000); // Poll every 5 seconds
-    return () => clearInterval(interval);
+    // Push updates: one snapshot, then coalesced deltas. Fall back to polling if streaming is unavailable.
+    if (typeof EventSource === 'undefined') {
+      fetchData();
+      const interval = setInterval(fetchData, 5000); // Poll every 5 seconds
+      return () => clearInterval(interval);
+    }
+
+    const source = new EventSource('http://127.0.0.1:8000/api/shipping/stream');
+    source.addEventListener('snapshot', (event) => {
+      setData(JSON.parse(event.data));
+      setError(null);
+      setLoading(false);
+    });
+    source.addEventListener('deltas', (event) => {
+      const deltas = JSON.parse(event.data);
+      setData(prev => applyQueueDeltas(prev, deltas));
+    });
+    source.onerror = () => {
+      // EventSource reconnects on its own and receives a fresh snapshot
+      if (source.readyState === EventSource.CLOSED) fetchData();
+    };
+    return () => source.close();
   }, []);
 
   if (loading) return <div className="p-8 text-center text-slate-400">Loading Triage Board...</div>;
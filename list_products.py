@@ -1,11 +1,15 @@
-import sqlite3
+import heapq
+from db_router import fan_out
 
 def list_products():
     try:
-        conn = sqlite3.connect('pirs_warehouse.db')
-        cursor = conn.cursor()
-        cursor.execute("SELECT sku, name FROM products ORDER BY name")
-        rows = cursor.fetchall()
+        def load(conn):
+            cursor = conn.cursor()
+            cursor.execute("SELECT sku, name FROM products ORDER BY name")
+            return cursor.fetchall()
+
+        # Each shard is already sorted by name, so merge rather than re-sort
+        rows = list(heapq.merge(*fan_out(load), key=lambda row: row[1]))
         
         print(f"Found {len(rows)} products:")
         print("-" * 50)
@@ -14,9 +18,6 @@ def list_products():
             
     except Exception as e:
         print(f"Error: {e}")
-    finally:
-        if conn:
-            conn.close()
 
 if __name__ == "__main__":
     list_products()
@@ -0,0 +1,168 @@
+"""
+Versioned, non-destructive schema migrations.
+
+Each shard records the last migration it applied in `PRAGMA user_version`.
+Starting the API (or running this script) applies only the pending steps,
+each in its own transaction, and never drops or reseeds anything; seeding
+demo data is the separate, destructive `python database_setup.py`.
+
+    python migrations.py          # apply pending migrations
+    python migrations.py --status # show each shard's schema version
+"""
+import argparse
+import sqlite3
+from db_router import SHARD_COUNT, connect_shard, shard_path
+
+
+def _base_tables(cursor):
+    # 1. Product Master Table (For Hash Table & BST)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS products (
+            sku TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            current_stock INTEGER DEFAULT 0,
+            lead_time_days INTEGER DEFAULT 7,
+            unit_cost REAL
+        )
+    ''')
+
+    # 2. Sales History Table (For Dynamic Array/Prediction)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sales_history (
+            txn_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sku TEXT,
+            qty_sold INTEGER,
+            sale_date DATE,
+            FOREIGN KEY (sku) REFERENCES products(sku)
+        )
+    ''')
+    # Per-SKU range scans (batch forecasting) read sales by SKU
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sales_sku ON sales_history(sku)")
+
+    # 3. Lot Tracking Table (For Set/Safety Checks)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS inventory_lots (
+            lot_id TEXT PRIMARY KEY,
+            sku TEXT,
+            expiry_date DATE,
+            is_recalled INTEGER DEFAULT 0,
+            FOREIGN KEY (sku) REFERENCES products(sku)
+        )
+    ''')
+
+    # 4. Customer Orders Table (For Priority Queue/Heap)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS customer_orders (
+            order_id TEXT PRIMARY KEY,
+            customer_tier INTEGER,
+            order_date DATE,
+            sku TEXT,
+            product_name TEXT,
+            qty_requested INTEGER,
+            total_amount REAL,
+            status TEXT,
+            FOREIGN KEY (sku) REFERENCES products(sku)
+        )
+    ''')
+
+
+def _forecast_state(cursor):
+    from forecast_state import create_forecast_table
+    create_forecast_table(cursor) # Filled from sales_history by ForecastStore.load() when empty
+
+
+def _sales_rollup(cursor):
+    from archival import create_rollup_table
+    create_rollup_table(cursor)
+
+
+def _reorder_plan(cursor):
+    from reorder_engine import create_plan_table
+    create_plan_table(cursor)
+
+
+def _date_indexes(cursor):
+    # Newest-first order history / exports and the archival horizon scans
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_date ON customer_orders(order_date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sales_date ON sales_history(sale_date)")
+
+
+def _product_categories(cursor):
+    from category_rollup import parse_category
+    cursor.execute("ALTER TABLE products ADD COLUMN category TEXT")
+    # Backfill from the "(Category)" suffix the product names carry
+    rows = cursor.execute("SELECT sku, name FROM products").fetchall()
+    cursor.executemany("UPDATE products SET category = ? WHERE sku = ?", [(parse_category(name), sku) for sku, name in rows])
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_products_category ON products(category)")
+
+
+# (version, description, apply(cursor)). Append only: never edit or reorder a released step.
+MIGRATIONS = [
+    (1, "base tables", _base_tables),
+    (2, "forecast_state", _forecast_state),
+    (3, "sales_rollup", _sales_rollup),
+    (4, "reorder_plan", _reorder_plan),
+    (5, "order and sale date indexes", _date_indexes),
+    (6, "product categories", _product_categories),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def apply_migrations(cursor):
+    """
+    Applies every migration newer than the database's user_version, one
+    transaction per step (the version bump commits with the step).
+    Returns the list of versions applied.
+    """
+    conn = cursor.connection
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None # Explicit transaction control
+    applied = []
+    try:
+        current = schema_version(conn)
+        for version, _, apply in MIGRATIONS:
+            if version <= current:
+                continue
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                apply(cursor)
+                cursor.execute(f"PRAGMA user_version = {version}")
+                cursor.execute("COMMIT")
+            except sqlite3.Error:
+                cursor.execute("ROLLBACK")
+                raise
+            applied.append(version)
+    finally:
+        conn.isolation_level = isolation_level
+    return applied
+
+
+def migrate_all():
+    """Brings every shard up to LATEST_VERSION. Returns {shard path: [applied versions]}."""
+    result = {}
+    for index in range(SHARD_COUNT):
+        conn = connect_shard(index)
+        try:
+            result[shard_path(index)] = apply_migrations(conn.cursor())
+        finally:
+            conn.close()
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply pending PIRS schema migrations.")
+    parser.add_argument("--status", action="store_true", help="Only report each shard's schema version")
+    args = parser.parse_args()
+
+    if args.status:
+        for index in range(SHARD_COUNT):
+            conn = connect_shard(index)
+            print(f"{shard_path(index)}: version {schema_version(conn)} of {LATEST_VERSION}")
+            conn.close()
+    else:
+        for path, applied in migrate_all().items():
+            print(f"{path}: applied {applied}" if applied else f"{path}: up to date (version {LATEST_VERSION})")
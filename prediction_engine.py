@@ -1,15 +1,156 @@
-from data_ingestion import get_product_lookup, get_sales_array
+import os
+import sqlite3
+from collections import deque
+from functools import partial
+from data_ingestion import get_product
+from db_router import all_shard_paths
+
+# Worker processes used by forecast_catalog(). 1 = run in-process.
+FORECAST_WORKERS = max(1, int(os.environ.get('PIRS_FORECAST_WORKERS', '1')))
+# SKUs per range handed to a worker by stream_forecast()
+PARTITION_SKUS = 50000
 
 def calculate_priority_score(sku):
-    products = get_product_lookup()
-    sales = get_sales_array(sku)
-    
-    if not sales: return 999 # No sales yet, low priority
-    
-    # Calculate Average Daily Sales
-    avg_sales = sum(sales) / len(sales)
-    current_stock = products[sku]['stock']
-    
-    # Days Remaining = Stock / Demand
-    days_remaining = current_stock / avg_sales
-    return round(days_remaining, 2)
\ No newline at end of file
+    """
+    Days Remaining = Stock / Average Sale, read from the incremental
+    forecast state in O(1) instead of re-summing the SKU's sales history.
+    """
+    from forecast_state import get_forecast_store # Deferred: forecast_state imports this module
+
+    product = get_product(sku)
+    if not product: return 999
+    return get_forecast_store().days_remaining(sku, product['stock'])
+
+def days_remaining_from_totals(stock, total_sold, sale_count):
+    """Same math as calculate_priority_score, from pre-aggregated sales."""
+    if not sale_count or not total_sold: return 999 # No sales yet, low priority
+    avg_sales = total_sold / sale_count
+    return round(stock / avg_sales, 2)
+
+def forecast_sku_range(db_path, first_sku, last_sku, details=False):
+    """
+    Worker entry point: forecasts every SKU in [first_sku, last_sku] of one DB file.
+
+    Opens its own read-only connection, so any number of workers can scan
+    disjoint SKU ranges of the same file without taking the writer lock.
+    Returns: list of tuples [(days_remaining, sku), ...], or with `details`
+             [(days_remaining, sku, name, stock, lead_time, unit_cost), ...]
+    """
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        cursor = conn.cursor()
+        # Archived sales only survive as monthly rollups, so both tiers are summed
+        cursor.execute(
+            """
+            SELECT p.sku, p.current_stock, p.name, p.lead_time_days, p.unit_cost,
+                   COALESCE(s.total, 0) + COALESCE(r.total, 0),
+                   COALESCE(s.count, 0) + COALESCE(r.count, 0)
+            FROM products p
+            LEFT JOIN (
+                SELECT sku, SUM(qty_sold) AS total, COUNT(*) AS count FROM sales_history
+                WHERE sku BETWEEN ? AND ? GROUP BY sku
+            ) s ON s.sku = p.sku
+            LEFT JOIN (
+                SELECT sku, SUM(total_sold) AS total, SUM(sale_count) AS count FROM sales_rollup
+                WHERE sku BETWEEN ? AND ? GROUP BY sku
+            ) r ON r.sku = p.sku
+            WHERE p.sku BETWEEN ? AND ?
+            """,
+            (first_sku, last_sku) * 3
+        )
+        rows = cursor.fetchall()
+        if details:
+            return [(days_remaining_from_totals(stock, total, count), sku, name, stock, lead, cost)
+                    for sku, stock, name, lead, cost, total, count in rows]
+        return [(days_remaining_from_totals(stock, total, count), sku) for sku, stock, _, _, _, total, count in rows]
+    finally:
+        conn.close()
+
+def plan_partitions(db_path, chunks):
+    """
+    Splits the SKUs of one DB file into at most `chunks` contiguous ranges.
+    Returns: list of (db_path, first_sku, last_sku)
+    """
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        skus = [row[0] for row in conn.execute("SELECT sku FROM products ORDER BY sku")]
+    finally:
+        conn.close()
+
+    if not skus:
+        return []
+    size = -(-len(skus) // max(1, chunks)) # Ceiling division
+    return [(db_path, skus[i], skus[min(i + size, len(skus)) - 1]) for i in range(0, len(skus), size)]
+
+def forecast_catalog(workers=None, db_paths=None):
+    """
+    Forecasts days remaining for the whole catalog in one pass per SKU range.
+
+    With workers > 1 the ranges are spread over a ProcessPoolExecutor so the
+    per-SKU math runs on every core instead of behind the GIL. Ranges are
+    over-partitioned (4 per worker) so a slow chunk doesn't idle the pool.
+    Returns: list of tuples [(days_remaining, sku), ...] (unordered)
+    """
+    workers = workers or FORECAST_WORKERS
+    db_paths = db_paths or all_shard_paths()
+
+    partitions = []
+    for path in db_paths:
+        partitions.extend(plan_partitions(path, workers * 4 if workers > 1 else 1))
+
+    results = []
+    if workers == 1:
+        for partition in partitions:
+            results.extend(forecast_sku_range(*partition))
+        return results
+
+    from concurrent.futures import ProcessPoolExecutor # Only multi-worker runs pay for multiprocessing
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for chunk in pool.map(forecast_sku_range, *zip(*partitions)):
+            results.extend(chunk)
+    return results
+
+def iter_partitions(db_path, size=PARTITION_SKUS):
+    """
+    Walks one DB file's SKUs in contiguous ranges of `size` using keyset
+    pagination, so planning never holds the SKU list in memory.
+    Yields: (db_path, first_sku, last_sku)
+    """
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        first = conn.execute("SELECT MIN(sku) FROM products").fetchone()[0]
+        while first is not None:
+            row = conn.execute("SELECT sku FROM products WHERE sku >= ? ORDER BY sku LIMIT 1 OFFSET ?", (first, size - 1)).fetchone()
+            last = row[0] if row else conn.execute("SELECT MAX(sku) FROM products").fetchone()[0]
+            yield (db_path, first, last)
+            first = conn.execute("SELECT MIN(sku) FROM products WHERE sku > ?", (last,)).fetchone()[0]
+    finally:
+        conn.close()
+
+def stream_forecast(workers=None, db_paths=None, partition_size=PARTITION_SKUS, details=False):
+    """
+    Generator form of forecast_catalog() for catalogs too big to hold at once.
+
+    Yields one list of forecast tuples per SKU range. At most two ranges per
+    worker are in flight, so memory is bounded by partition_size * workers * 2
+    rows regardless of catalog size.
+    """
+    workers = workers or FORECAST_WORKERS
+    db_paths = db_paths or all_shard_paths()
+    partitions = (partition for path in db_paths for partition in iter_partitions(path, partition_size))
+    run = partial(forecast_sku_range, details=details)
+
+    if workers == 1:
+        for partition in partitions:
+            yield run(*partition)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for partition in partitions:
+            pending.append(pool.submit(run, *partition))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -1,14 +1,201 @@
 import heapq
-from data_ingestion import get_product_lookup
-from prediction_engine import calculate_priority_score
-
-def build_reorder_heap():
-    products = get_product_lookup()
-    priority_heap = []
-    
-    for sku in products.keys():
-        score = calculate_priority_score(sku)
-        # We push (score, sku) so the Heap sorts by the lowest score (most urgent)
-        heapq.heappush(priority_heap, (score, sku))
-        
-    return priority_heap
\ No newline at end of file
+from prediction_engine import forecast_catalog
+
+def build_reorder_heap(workers=None):
+    """
+    Builds the reorder Min-Heap for the whole catalog.
+
+    Forecasts come from forecast_catalog() in batched SKU ranges (optionally
+    across worker processes); the merged (score, sku) list is heapified in O(N).
+    """
+    priority_heap = forecast_catalog(workers=workers)
+    # (score, sku) tuples, so the Heap sorts by the lowest score (most urgent)
+    heapq.heapify(priority_heap)
+
+    return priority_heap
+
+
+class IndexedMinHeap:
+    """
+    Binary Min-Heap of (key, item) entries with an item -> position index.
+
+    Data Structure: Array-backed Binary Heap + Hash Table of positions
+    Complexity: O(log N) insert / update / remove, O(1) lookup,
+                O(k log k) for the k smallest, O(m) for the m entries below a limit
+    """
+    def __init__(self):
+        self.heap = []
+        self.pos = {}
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __contains__(self, item):
+        return item in self.pos
+
+    def build(self, entries):
+        """Replaces the contents with (key, item) entries in O(N)."""
+        self.heap = list(entries)
+        heapq.heapify(self.heap)
+        self.pos = {item: i for i, (_, item) in enumerate(self.heap)}
+
+    def push(self, key, item):
+        """Inserts `item`, or moves it to its new position if its key changed."""
+        if item in self.pos:
+            i = self.pos[item]
+            old = self.heap[i]
+            self.heap[i] = (key, item)
+            if (key, item) < old:
+                self._sift_up(i)
+            else:
+                self._sift_down(i)
+            return
+        self.heap.append((key, item))
+        self.pos[item] = len(self.heap) - 1
+        self._sift_up(len(self.heap) - 1)
+
+    def remove(self, item):
+        i = self.pos.pop(item, None)
+        if i is None:
+            return False
+        last = self.heap.pop()
+        if i < len(self.heap):
+            self.heap[i] = last
+            self.pos[last[1]] = i
+            self._sift_up(i)
+            self._sift_down(self.pos[last[1]])
+        return True
+
+    def key_of(self, item):
+        i = self.pos.get(item)
+        return None if i is None else self.heap[i][0]
+
+    def smallest(self, k):
+        """
+        The k smallest entries in order, without popping.
+        Walks the heap with a frontier heap of candidate positions: O(k log k).
+        """
+        result = []
+        frontier = [(self.heap[0], 0)] if self.heap else []
+        while frontier and len(result) < k:
+            entry, i = heapq.heappop(frontier)
+            result.append(entry)
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < len(self.heap):
+                    heapq.heappush(frontier, (self.heap[child], child))
+        return result
+
+    def below(self, limit):
+        """
+        All entries with key < limit, in order.
+        Subtrees whose root is already >= limit are skipped, so the walk
+        only visits the matches and their direct children.
+        """
+        matches = []
+        stack = [0] if self.heap else []
+        while stack:
+            i = stack.pop()
+            entry = self.heap[i]
+            if entry[0] >= limit:
+                continue
+            matches.append(entry)
+            stack.extend(child for child in (2 * i + 1, 2 * i + 2) if child < len(self.heap))
+        matches.sort()
+        return matches
+
+    def _sift_up(self, i):
+        heap, pos = self.heap, self.pos
+        entry = heap[i]
+        while i > 0:
+            parent = (i - 1) >> 1
+            if entry < heap[parent]:
+                heap[i] = heap[parent]
+                pos[heap[i][1]] = i
+                i = parent
+            else:
+                break
+        heap[i] = entry
+        pos[entry[1]] = i
+
+    def _sift_down(self, i):
+        heap, pos = self.heap, self.pos
+        size = len(heap)
+        entry = heap[i]
+        while True:
+            child = 2 * i + 1
+            if child >= size:
+                break
+            if child + 1 < size and heap[child + 1] < heap[child]:
+                child += 1
+            if heap[child] < entry:
+                heap[i] = heap[child]
+                pos[heap[i][1]] = i
+                i = child
+            else:
+                break
+        heap[i] = entry
+        pos[entry[1]] = i
+
+
+class ReorderIndex:
+    """
+    Long-lived reorder priorities, updated one SKU at a time.
+
+    Keeps two indexed Min-Heaps over the catalog:
+    - by days remaining (the classic reorder heap, for top-k / threshold queries)
+    - by slack = days remaining - lead time (negative = stock runs out before a
+      reorder placed today could arrive)
+
+    `forecast(sku, stock)` supplies days remaining (e.g. ForecastStore.days_remaining).
+    """
+    def __init__(self, forecast):
+        self.forecast = forecast
+        self.by_days = IndexedMinHeap()
+        self.by_slack = IndexedMinHeap()
+        self.products = {} # sku -> {'name', 'stock', 'lead'}
+
+    def rebuild(self, products):
+        """Full O(N) build from a get_product_lookup()-style table (startup only)."""
+        self.products = {sku: {'name': d['name'], 'stock': d['stock'], 'lead': d.get('lead') or 0} for sku, d in products.items()}
+        days = {sku: self.forecast(sku, d['stock']) for sku, d in self.products.items()}
+        self.by_days.build((days[sku], sku) for sku in self.products)
+        self.by_slack.build((days[sku] - d['lead'], sku) for sku, d in self.products.items())
+
+    def update(self, sku, name=None, stock=None, lead=None):
+        """Re-scores one SKU after its stock, sales or lead time changed: O(log N)."""
+        record = self.products.setdefault(sku, {'name': name or 'Unknown', 'stock': 0, 'lead': 0})
+        if name is not None: record['name'] = name
+        if stock is not None: record['stock'] = stock
+        if lead is not None: record['lead'] = lead
+
+        days = self.forecast(sku, record['stock'])
+        self.by_days.push(days, sku)
+        self.by_slack.push(days - record['lead'], sku)
+
+    def remove(self, sku):
+        self.products.pop(sku, None)
+        self.by_days.remove(sku)
+        self.by_slack.remove(sku)
+
+    def describe(self, days, sku):
+        record = self.products.get(sku, {})
+        return {
+            "name": record.get('name', 'Unknown'),
+            "days_remaining": days,
+            "current_stock": record.get('stock', 0),
+            "lead_time_days": record.get('lead', 0),
+            "sku": sku,
+            "score": days
+        }
+
+    def top(self, k):
+        """The k most urgent SKUs (lowest days remaining first): O(k log k)."""
+        return [self.describe(days, sku) for days, sku in self.by_days.smallest(k)]
+
+    def below(self, days_limit):
+        """Every SKU with fewer than `days_limit` days of cover."""
+        return [self.describe(days, sku) for days, sku in self.by_days.below(days_limit)]
+
+    def under_lead_time(self):
+        """Every SKU whose cover is shorter than its lead time, least slack first."""
+        return [self.describe(self.by_days.key_of(sku), sku) for _, sku in self.by_slack.below(0)]
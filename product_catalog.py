@@ -0,0 +1,239 @@
+import sqlite3
+import sys
+import numpy as np
+from db_router import fan_out
+from category_rollup import parse_category
+
+NO_SALES_DAYS = 999 # Same sentinel as days_remaining_from_totals()
+
+class ProductView:
+    """
+    Read-only view of one catalog row.
+
+    Supports the same `product['stock']` / `product.get('name')` access as a
+    get_product_lookup() value, without materialising a dict per SKU.
+    Views are short-lived: a remove() can move rows, so don't keep them.
+    """
+    __slots__ = ('catalog', 'row')
+
+    FIELDS = ('name', 'category', 'stock', 'lead', 'price')
+
+    def __init__(self, catalog, row):
+        self.catalog = catalog
+        self.row = row
+
+    def __getitem__(self, key):
+        catalog, row = self.catalog, self.row
+        if key == 'name': return catalog.names[row]
+        if key == 'category': return catalog.categories[row]
+        if key == 'stock': return int(catalog.stock[row])
+        if key == 'lead': return int(catalog.lead[row])
+        if key == 'price': return float(catalog.price[row])
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self):
+        return {field: self[field] for field in self.FIELDS}
+
+
+class ProductCatalog:
+    """
+    Columnar product master: parallel typed arrays plus a SKU -> row index.
+
+    Data Structure: Struct-of-Arrays (NumPy) + Hash Table (SKU -> row)
+    Complexity: O(1) lookup / update, O(1) append (amortised) and remove
+                (swap-with-last), whole-catalog aggregates vectorized in C
+    Memory: ~28 bytes of numeric columns per SKU, versus a ~400 byte dict per SKU
+
+    An optional CategoryRollup is fed every row change, keeping per-category
+    aggregates current by deltas.
+    """
+    def __init__(self, capacity=1024, rollup=None):
+        self.size = 0
+        self.skus = []
+        self.names = []
+        self.categories = [] # Interned category names, parallel to names
+        self.rollup = rollup
+        self.index = {}
+        self.stock = np.zeros(capacity, dtype=np.int64)
+        self.lead = np.zeros(capacity, dtype=np.int32)
+        self.price = np.zeros(capacity, dtype=np.float64)
+        self.avg_sale = np.zeros(capacity, dtype=np.float64) # 0 = no sales recorded
+
+    # --- Loading ---
+    def load(self, avg_sale=None):
+        """
+        Loads every shard's products. `avg_sale(sku)` (e.g. ForecastStore.avg_sales)
+        fills the demand column used by the vectorized days-remaining math.
+        """
+        def read(conn):
+            cursor = conn.cursor()
+            cursor.execute("SELECT sku, name, current_stock, lead_time_days, unit_cost, category FROM products")
+            return cursor.fetchall()
+
+        try:
+            rows = [row for shard_rows in fan_out(read) for row in shard_rows]
+        except sqlite3.Error as e:
+            print(f"Database error loading catalog: {e}")
+            rows = []
+        self.from_rows(rows, avg_sale)
+        return self
+
+    def from_rows(self, rows, avg_sale=None):
+        """
+        Bulk-builds the columns from (sku, name, stock, lead, price[, category]) rows in O(N).
+        A missing category is parsed from the name.
+        """
+        count = len(rows)
+        self.size = count
+        self.skus = [row[0] for row in rows]
+        self.names = [row[1] for row in rows]
+        self.categories = [sys.intern(row[5] if len(row) > 5 and row[5] else parse_category(row[1])) for row in rows]
+        self.index = {sku: i for i, sku in enumerate(self.skus)}
+        capacity = max(1024, count)
+        self.stock = np.zeros(capacity, dtype=np.int64)
+        self.lead = np.zeros(capacity, dtype=np.int32)
+        self.price = np.zeros(capacity, dtype=np.float64)
+        self.avg_sale = np.zeros(capacity, dtype=np.float64)
+        if count:
+            self.stock[:count] = [row[2] or 0 for row in rows]
+            self.lead[:count] = [row[3] or 0 for row in rows]
+            self.price[:count] = [row[4] or 0 for row in rows]
+            if avg_sale:
+                self.avg_sale[:count] = [avg_sale(sku) for sku in self.skus]
+        if self.rollup is not None:
+            self.rollup.rebuild(zip(self.skus, self.categories, self.stock[:count].tolist(),
+                                    self.price[:count].tolist(), self.avg_sale[:count].tolist()))
+        return self
+
+    # --- Single-SKU access ---
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, sku):
+        return sku in self.index
+
+    def get(self, sku, default=None):
+        row = self.index.get(sku)
+        return default if row is None else ProductView(self, row)
+
+    def __getitem__(self, sku):
+        return ProductView(self, self.index[sku])
+
+    def keys(self):
+        return iter(self.skus[:self.size])
+
+    def items(self):
+        for row in range(self.size):
+            yield self.skus[row], ProductView(self, row)
+
+    # --- Mutation ---
+    def add(self, sku, name, stock, lead, price, avg_sale=0.0, category=None):
+        category = sys.intern(category or parse_category(name))
+        if sku in self.index:
+            row = self.index[sku]
+            self.names[row] = name
+            self.categories[row] = category
+        else:
+            if self.size == len(self.stock):
+                self._grow()
+            row = self.size
+            self.size += 1
+            self.index[sku] = row
+            self.skus.append(sku)
+            self.names.append(name)
+            self.categories.append(category)
+        self.stock[row] = stock
+        self.lead[row] = lead
+        self.price[row] = price
+        self.avg_sale[row] = avg_sale
+        self._roll_up(row)
+
+    def set_stock(self, sku, stock):
+        row = self.index.get(sku)
+        if row is not None:
+            self.stock[row] = stock
+            self._roll_up(row)
+
+    def set_avg_sale(self, sku, avg_sale):
+        row = self.index.get(sku)
+        if row is not None:
+            self.avg_sale[row] = avg_sale
+            self._roll_up(row)
+
+    def _roll_up(self, row):
+        """Passes the row's new values to the rollup, which swaps its old contribution for them."""
+        if self.rollup is not None:
+            self.rollup.set_product(self.skus[row], self.categories[row], int(self.stock[row]),
+                                    float(self.price[row]), float(self.avg_sale[row]))
+
+    def remove(self, sku):
+        """Deletes in O(1) by moving the last row into the hole."""
+        row = self.index.pop(sku, None)
+        if row is None:
+            return False
+        if self.rollup is not None:
+            self.rollup.remove_product(sku)
+        last = self.size - 1
+        if row != last:
+            moved = self.skus[last]
+            self.skus[row] = moved
+            self.names[row] = self.names[last]
+            self.categories[row] = self.categories[last]
+            for column in (self.stock, self.lead, self.price, self.avg_sale):
+                column[row] = column[last]
+            self.index[moved] = row
+        self.skus.pop()
+        self.names.pop()
+        self.categories.pop()
+        self.size = last
+        return True
+
+    def _grow(self):
+        capacity = max(1024, len(self.stock) * 2)
+        for attr in ('stock', 'lead', 'price', 'avg_sale'):
+            column = getattr(self, attr)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            setattr(self, attr, grown)
+
+    # --- Vectorized whole-catalog operations ---
+    def days_remaining(self):
+        """Days of cover per row (same rounding and 999 sentinel as the ForecastStore)."""
+        stock = self.stock[:self.size].astype(np.float64)
+        avg = self.avg_sale[:self.size]
+        days = np.full(self.size, float(NO_SALES_DAYS))
+        has_sales = avg > 0
+        days[has_sales] = np.round(stock[has_sales] / avg[has_sales], 2)
+        return days
+
+    def total_value(self):
+        return float(np.dot(self.stock[:self.size], self.price[:self.size]))
+
+    def count_below(self, days_limit, days=None):
+        days = self.days_remaining() if days is None else days
+        return int(np.count_nonzero(days < days_limit))
+
+    def count_at_least(self, days_limit, days=None):
+        days = self.days_remaining() if days is None else days
+        return int(np.count_nonzero(days >= days_limit))
+
+    def overstocked(self, min_days, limit=None, days=None):
+        """
+        Rows with more than `min_days` of cover, in catalog order.
+        Returns dicts of sku / name / days / value (value = stock * price).
+        """
+        days = self.days_remaining() if days is None else days
+        rows = np.flatnonzero(days > min_days)
+        if limit is not None:
+            rows = rows[:limit]
+        value = self.stock[rows] * self.price[rows]
+        return [
+            {'sku': self.skus[r], 'name': self.names[r], 'days': float(days[r]), 'value': float(v)}
+            for r, v in zip(rows.tolist(), value.tolist())
+        ]
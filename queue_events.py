@@ -0,0 +1,134 @@
+import asyncio
+import json
+import threading
+from data_versions import json_default
+
+# Deltas arriving within this window are sent to a client as one batch
+COALESCE_SECONDS = 0.25
+# Idle streams get a comment line this often so proxies keep them open
+KEEPALIVE_SECONDS = 15
+# A client with more distinct pending keys than this is sent a fresh snapshot instead
+MAX_PENDING = 5000
+
+# Sentinel returned by Subscriber.next_batch() when the client must resync
+RESYNC = 'resync'
+
+# Delta types that replace each other for the same order (latest state wins)
+ORDER_EVENTS = ('enqueued', 'removed', 'reprioritised')
+BLOCKED_EVENTS = ('blocked', 'unblocked')
+
+
+def coalesce_key(event_type, payload):
+    """Deltas with the same key supersede each other while waiting to be sent."""
+    if event_type in ORDER_EVENTS:
+        return ('order', payload.get('order_id'))
+    if event_type in BLOCKED_EVENTS:
+        return ('blocked', payload.get('order_id'))
+    if event_type == 'stock':
+        return ('stock', payload.get('sku'))
+    return (event_type, id(payload))
+
+
+class Subscriber:
+    """
+    One open dashboard stream.
+
+    Data Structure: Insertion-ordered Hash Map (coalesce key -> latest delta)
+    Backpressure: a slow client never accumulates more than one delta per
+    order/SKU; intermediate states are overwritten, and past MAX_PENDING
+    keys the backlog is dropped in favour of a resync snapshot.
+    """
+    def __init__(self, loop):
+        self.loop = loop
+        self.pending = {}
+        self.resync_due = False
+        self.lock = threading.Lock()
+        self.wakeup = asyncio.Event()
+
+    def push(self, event_type, payload):
+        key = coalesce_key(event_type, payload)
+        with self.lock:
+            if self.resync_due:
+                return
+            self.pending.pop(key, None) # Re-insert so the batch keeps latest-change order
+            self.pending[key] = {'type': event_type, **payload}
+            if len(self.pending) > MAX_PENDING:
+                self.pending.clear()
+                self.resync_due = True
+        # Publishers run in worker threads; wake the stream on its own loop
+        self.loop.call_soon_threadsafe(self.wakeup.set)
+
+    def resync(self):
+        """Drops the pending deltas: the client's next batch is a fresh snapshot."""
+        with self.lock:
+            self.pending.clear()
+            self.resync_due = True
+        self.loop.call_soon_threadsafe(self.wakeup.set)
+
+    async def next_batch(self):
+        """
+        Waits for deltas, then lingers COALESCE_SECONDS to batch bursts.
+        Returns a list of deltas (possibly empty), RESYNC, or None on keepalive timeout.
+        """
+        try:
+            await asyncio.wait_for(self.wakeup.wait(), timeout=KEEPALIVE_SECONDS)
+        except asyncio.TimeoutError:
+            return None
+        await asyncio.sleep(COALESCE_SECONDS)
+
+        with self.lock:
+            self.wakeup.clear()
+            if self.resync_due:
+                self.resync_due = False
+                return RESYNC
+            batch = list(self.pending.values())
+            self.pending.clear()
+        return batch
+
+
+class QueueEventHub:
+    """
+    Fan-out of shipping queue changes to every open dashboard stream.
+    publish() is O(1) when nobody is listening, so idle queues cost nothing.
+    """
+    def __init__(self):
+        self.subscribers = set()
+        self.lock = threading.Lock()
+
+    def has_subscribers(self):
+        return bool(self.subscribers)
+
+    def subscribe(self):
+        subscriber = Subscriber(asyncio.get_running_loop())
+        with self.lock:
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def publish(self, event_type, payload):
+        if not self.subscribers:
+            return
+        with self.lock:
+            targets = list(self.subscribers)
+        for subscriber in targets:
+            subscriber.push(event_type, payload)
+
+    def resync(self):
+        """Sends every stream a fresh snapshot, for changes that touch every order at once."""
+        if not self.subscribers:
+            return
+        with self.lock:
+            targets = list(self.subscribers)
+        for subscriber in targets:
+            subscriber.resync()
+
+
+def format_sse(event, data):
+    """Encodes one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data, default=json_default)}\n\n"
+
+
+hub = QueueEventHub()
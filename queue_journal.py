@@ -0,0 +1,216 @@
+"""
+Shared queue state for multi-process deployments (`uvicorn api:app --workers N`).
+
+Every API worker keeps its own in-memory ShippingQueue, BlockedQueue and
+catalog mirrors, so with several workers each one must apply the same
+mutations in the same order. With PIRS_SHARED_QUEUE=1 a mutation is not
+applied in place: it is appended to a journal table in one SQLite file
+(the append takes the file's writer lock, which fixes the global order),
+and every worker, the writer included, replays the journal in sequence
+order before serving a request and from a background follower thread.
+
+Mutations are stamped with the queue time they were made at and the queue
+epoch is shared, so a worker replaying an entry late keys its orders
+exactly as the writer did: all workers hold the same queue order.
+Dispatch itself stays a conditional transaction on the order's shard, so
+two workers can never ship the same order twice.
+
+A journal belongs to one deployment generation (PIRS_QUEUE_GENERATION,
+by default the PID and start time of the process supervising the
+workers) and lives while any of its workers does: each worker holds a
+lease it renews from its follower thread and drops on shutdown. A worker
+that starts in another generation, or finds no live lease (the whole
+deployment was stopped, so the database may have changed since), clears
+the journal and writes a snapshot of the queued/blocked orders from the
+database; workers joining a live journal (or restarted ones) rebuild
+their state by replaying it from the start.
+
+Without PIRS_SHARED_QUEUE the LocalJournal applies mutations directly.
+Either way every mutation is applied under the journal's `lock`, so a
+reader holding it (a report's data gathering) sees one consistent state.
+
+Data Structure: Append-only log (SQLite table keyed by sequence number)
+Complexity: O(1) append, O(new entries) per sync (one indexed range scan)
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from data_versions import json_default
+
+JOURNAL_DB = 'pirs_queue_journal.db'
+
+SHARED = os.environ.get('PIRS_SHARED_QUEUE', '0') not in ('', '0')
+# How often the follower thread replays entries written by other workers
+FOLLOW_SECONDS = 0.5
+# A worker lease not renewed for this long belongs to a dead worker (renewed every quarter of it)
+LEASE_SECONDS = 10
+
+
+def supervisor_generation():
+    """
+    Workers started by the same `uvicorn --workers N` supervisor share its PID;
+    its start time (on Linux) tells a restarted supervisor that reused the PID apart.
+    """
+    ppid = os.getppid()
+    try:
+        with open(f'/proc/{ppid}/stat') as f:
+            started = f.read().rsplit(')', 1)[1].split()[19] # Field 22, counting from the state (field 3)
+        return f"{ppid}-{started}"
+    except (OSError, IndexError):
+        return str(ppid)
+
+
+GENERATION = os.environ.get('PIRS_QUEUE_GENERATION') or supervisor_generation()
+
+
+class LocalJournal:
+    """Single-process journal: mutations are applied as they are recorded."""
+    shared = False
+
+    def __init__(self, handlers, clock=None):
+        self.handlers = handlers # op -> handler(payload, now)
+        self.lock = threading.RLock() # Re-entrant, so a reader holding it may still record
+
+    def start(self, snapshot):
+        """Applies the startup snapshot: an iterable of (op, payload). Returns None (no shared epoch)."""
+        for op, payload in snapshot():
+            self.record(op, payload)
+        return None
+
+    def record(self, op, payload):
+        with self.lock:
+            self.handlers[op](payload, None)
+
+    def sync(self):
+        return 0
+
+    def follow(self, interval=FOLLOW_SECONDS):
+        pass
+
+    def leave(self):
+        pass
+
+
+class SQLiteJournal:
+    """
+    Multi-process journal on a SQLite file (see the module docstring).
+    `clock()` returns the current queue time a recorded mutation is stamped with.
+    """
+    shared = True
+
+    def __init__(self, handlers, clock, path=JOURNAL_DB, generation=GENERATION):
+        self.handlers = handlers
+        self.clock = clock
+        self.path = path
+        self.generation = generation
+        self.applied = 0 # Sequence number of the last entry applied in this process
+        self.worker = uuid.uuid4().hex # This process's lease
+        self.lock = threading.RLock() # One connection, and entries are applied one at a time
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS queue_journal (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                op TEXT NOT NULL,
+                now REAL,
+                payload TEXT NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS queue_journal_meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS queue_journal_workers (worker TEXT PRIMARY KEY, seen REAL NOT NULL)")
+
+    def start(self, snapshot):
+        """
+        Joins the current generation, writing the snapshot if this worker is
+        its first or no worker of it is still alive. Returns the generation's
+        queue epoch (a Unix time) for the ShippingQueue; sync() then replays
+        the journal from the start.
+        """
+        with self.lock:
+            cursor = self.conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                meta = dict(cursor.execute("SELECT key, value FROM queue_journal_meta").fetchall())
+                live = cursor.execute("SELECT COUNT(*) FROM queue_journal_workers WHERE seen > ?",
+                                      (now - LEASE_SECONDS,)).fetchone()[0]
+                if meta.get('generation') != self.generation or not live:
+                    epoch = now
+                    # The old entries describe a database that may have changed since: start over
+                    cursor.execute("DELETE FROM queue_journal")
+                    cursor.execute("DELETE FROM queue_journal_workers")
+                    cursor.execute("INSERT OR REPLACE INTO queue_journal_meta VALUES ('generation', ?), ('epoch', ?)",
+                                   (self.generation, repr(epoch)))
+                    cursor.executemany("INSERT INTO queue_journal (op, now, payload) VALUES (?, 0, ?)",
+                                       ((op, self._encode(payload)) for op, payload in snapshot()))
+                    print(f"[JOURNAL] New generation {self.generation}: queue snapshot written.")
+                else:
+                    epoch = float(meta['epoch'])
+                cursor.execute("INSERT OR REPLACE INTO queue_journal_workers VALUES (?, ?)", (self.worker, now))
+                cursor.execute("COMMIT")
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
+        return epoch
+
+    @staticmethod
+    def _encode(payload):
+        return json.dumps(payload, default=json_default, separators=(',', ':'))
+
+    def record(self, op, payload):
+        """Appends one mutation, then applies every entry up to and including it."""
+        with self.lock:
+            self.conn.execute("INSERT INTO queue_journal (op, now, payload) VALUES (?, ?, ?)",
+                              (op, self.clock(), self._encode(payload)))
+            self._apply_pending()
+
+    def sync(self):
+        """Applies the entries other workers appended since the last sync. Returns how many."""
+        with self.lock:
+            return self._apply_pending()
+
+    def _apply_pending(self):
+        rows = self.conn.execute("SELECT seq, op, now, payload FROM queue_journal WHERE seq > ? ORDER BY seq",
+                                 (self.applied,)).fetchall()
+        for seq, op, now, payload in rows:
+            try:
+                self.handlers[op](json.loads(payload), now)
+            except Exception as e:
+                print(f"Error applying journal entry {seq} ({op}): {e}")
+            self.applied = seq
+        return len(rows)
+
+    def follow(self, interval=FOLLOW_SECONDS):
+        """
+        Starts a daemon thread that keeps syncing, so idle workers' streams still
+        see other workers' changes, and renews this worker's lease.
+        """
+        def run():
+            # Its own connection: a reader holding `lock` delays syncing, but never the lease
+            lease = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            renewed = time.time()
+            while True:
+                time.sleep(interval)
+                try:
+                    if time.time() - renewed >= LEASE_SECONDS / 4:
+                        renewed = time.time()
+                        lease.execute("UPDATE queue_journal_workers SET seen = ? WHERE worker = ?", (renewed, self.worker))
+                    self.sync()
+                except sqlite3.Error as e:
+                    print(f"Error syncing queue journal: {e}")
+        threading.Thread(target=run, name="queue-journal-follower", daemon=True).start()
+
+    def leave(self):
+        """Drops this worker's lease on shutdown, so a restart after the last worker stops snapshots afresh."""
+        with self.lock:
+            self.conn.execute("DELETE FROM queue_journal_workers WHERE worker = ?", (self.worker,))
+
+
+def open_journal(handlers, clock):
+    """The journal for this process: SQLite-backed when PIRS_SHARED_QUEUE is set, else local."""
+    if SHARED:
+        return SQLiteJournal(handlers, clock)
+    return LocalJournal(handlers, clock)
@@ -0,0 +1,231 @@
+import sqlite3
+import threading
+from datetime import date
+import numpy as np
+from db_router import fan_out, connect_for_sku, shard_for_sku, connect_shard
+
+# Demand window used for the daily mean / variance
+HISTORY_DAYS = 90
+# z-score for the target cycle service level (1.65 ~ 95%)
+SERVICE_LEVEL_Z = 1.65
+# Cost of placing one purchase order (INR) and yearly holding cost as a share of unit cost
+ORDERING_COST = 500.0
+HOLDING_RATE = 0.25
+
+PLAN_COLUMNS = ('sku', 'avg_daily', 'std_daily', 'lead_time', 'safety_stock', 'reorder_point',
+                'eoq', 'stock', 'suggested_qty', 'needs_reorder', 'inputs')
+
+def create_plan_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS reorder_plan (
+            sku TEXT PRIMARY KEY,
+            avg_daily REAL,
+            std_daily REAL,
+            lead_time INTEGER,
+            safety_stock REAL,
+            reorder_point REAL,
+            eoq INTEGER,
+            stock INTEGER,
+            suggested_qty INTEGER,
+            needs_reorder INTEGER,
+            inputs TEXT,
+            FOREIGN KEY (sku) REFERENCES products(sku)
+        )
+    ''')
+
+def demand_statistics(block):
+    """
+    Vectorized daily demand mean / standard deviation per SKU.
+
+    Days without sales count as zero demand. A SKU's window starts at its
+    first sale inside the block, so new products aren't diluted by days
+    before they existed.
+    Args: block - dense (days x SKUs) daily demand ending today
+    Returns: (mean, std) arrays, one entry per block column
+    """
+    days = block.shape[0]
+    sold = block > 0
+    first = np.where(sold.any(axis=0), sold.argmax(axis=0), days - 1)
+    span = (days - first).astype(np.float64)
+
+    total = block.sum(axis=0, dtype=np.float64)
+    total_sq = np.square(block, dtype=np.float64).sum(axis=0)
+    mean = total / span
+    std = np.sqrt(np.maximum(total_sq / span - mean * mean, 0.0))
+    return mean, std
+
+def compute_plan(skus, stock, lead, unit_cost, mean, std):
+    """
+    Reorder point, safety stock and EOQ for every SKU in one vectorized pass.
+
+    safety_stock  = z * sigma_daily * sqrt(lead_time)
+    reorder_point = mean_daily * lead_time + safety_stock
+    eoq           = sqrt(2 * annual_demand * ordering_cost / (unit_cost * holding_rate))
+    A SKU needs a reorder when stock <= reorder_point; the suggestion is the
+    larger of the EOQ and the shortfall to the reorder point.
+    """
+    lead = np.maximum(np.asarray(lead, dtype=np.float64), 0)
+    stock = np.asarray(stock, dtype=np.float64)
+    holding = np.maximum(np.asarray(unit_cost, dtype=np.float64) * HOLDING_RATE, 0.01)
+
+    safety = SERVICE_LEVEL_Z * std * np.sqrt(lead)
+    reorder_point = mean * lead + safety
+    eoq = np.ceil(np.sqrt(2 * mean * 365 * ORDERING_COST / holding))
+    needs = (stock <= reorder_point) & (mean > 0)
+    suggested = np.where(needs, np.maximum(eoq, np.ceil(reorder_point - stock)), 0)
+
+    return [
+        {
+            'sku': sku,
+            'avg_daily': round(float(m), 3),
+            'std_daily': round(float(s), 3),
+            'lead_time': int(l),
+            'safety_stock': round(float(ss), 2),
+            'reorder_point': round(float(rp), 2),
+            'eoq': int(q),
+            'stock': int(st),
+            'suggested_qty': int(sq),
+            'needs_reorder': bool(n)
+        }
+        for sku, m, s, l, ss, rp, q, st, sq, n in zip(
+            skus, mean.tolist(), std.tolist(), lead.tolist(), safety.tolist(), reorder_point.tolist(),
+            eoq.tolist(), stock.tolist(), suggested.tolist(), needs.tolist()
+        )
+    ]
+
+
+class ReorderEngine:
+    """
+    Precomputed reorder plan for the catalog, persisted in the reorder_plan table.
+
+    Data Structure: Hash Table (SKU -> plan row) + dirty SKU Set
+    Rows are recomputed only for SKUs whose inputs (stock, lead time, unit cost,
+    sales totals) changed since they were stored, so reads are O(1) per SKU.
+
+    `catalog_lock` is the lock the catalog's writers hold (the API's journal
+    lock); the catalog inputs of a refresh are read under it, the demand
+    update and the plan math are not.
+    """
+    def __init__(self, catalog, forecast_store, demand, catalog_lock=None):
+        self.catalog = catalog
+        self.catalog_lock = catalog_lock or threading.RLock()
+        self.forecast_store = forecast_store
+        self.demand = demand # DemandMatrix the daily demand windows are sliced from
+        self.plan = {}
+        self.dirty = set()
+        self.plan_date = date.today() # Day the plan's demand windows end on
+        self.lock = threading.Lock() # Requests run on a thread pool; one refresh at a time
+
+    def inputs_signature(self, sku):
+        product = self.catalog.get(sku)
+        if product is None:
+            return None
+        total, count, _ = self.forecast_store.state.get(sku, (0, 0, 0))
+        # The demand window slides daily, so the date is an input too
+        return f"{product['stock']}|{product['lead']}|{product['price']}|{total}|{count}|{date.today()}"
+
+    def load(self):
+        """Loads the stored plan and marks every SKU whose inputs changed since as dirty."""
+        def read(conn):
+            cursor = conn.cursor()
+            create_plan_table(cursor)
+            cursor.execute(f"SELECT {', '.join(PLAN_COLUMNS)} FROM reorder_plan")
+            return cursor.fetchall()
+
+        self.plan = {}
+        try:
+            for rows in fan_out(read):
+                for row in rows:
+                    record = dict(zip(PLAN_COLUMNS, row))
+                    record['needs_reorder'] = bool(record['needs_reorder'])
+                    self.plan[record['sku']] = record
+        except sqlite3.Error as e:
+            print(f"Database error loading reorder plan: {e}")
+
+        self.dirty = {sku for sku in self.catalog.keys()
+                      if sku not in self.plan or self.plan[sku].get('inputs') != self.inputs_signature(sku)}
+        self.dirty.update(sku for sku in self.plan if sku not in self.catalog)
+        self.plan_date = date.today()
+        return self
+
+    def mark_dirty(self, sku):
+        self.dirty.add(sku)
+
+    def refresh(self):
+        """Recomputes and persists the plan rows of dirty SKUs only. Returns how many were refreshed."""
+        with self.lock:
+            today = date.today()
+            if today != self.plan_date:
+                # The demand window slid: every row is due, not just the changed SKUs
+                self.dirty.update(self.catalog.keys())
+                self.plan_date = today
+            if not self.dirty:
+                return 0
+            # Swapped out, so SKUs marked dirty while this runs wait for the next refresh
+            dirty, self.dirty = self.dirty, set()
+            try:
+                return self._refresh(dirty)
+            except BaseException:
+                self.dirty |= dirty # Not recomputed: due again on the next refresh
+                raise
+
+    def _refresh(self, dirty):
+        with self.catalog_lock:
+            skus = [sku for sku in dirty if sku in self.catalog]
+            removed = [sku for sku in dirty if sku not in self.catalog]
+            products = [self.catalog[sku].to_dict() for sku in skus]
+            inputs = [self.inputs_signature(sku) for sku in skus]
+
+        self.demand.update() # Pull in sales recorded since the last refresh
+        mean, std = demand_statistics(self.demand.window(skus, HISTORY_DAYS))
+        plan_rows = compute_plan(
+            skus,
+            [p['stock'] for p in products],
+            [p['lead'] for p in products],
+            [p['price'] for p in products],
+            mean, std
+        )
+        for record, signature in zip(plan_rows, inputs):
+            record['inputs'] = signature
+            self.plan[record['sku']] = record
+        for sku in removed:
+            self.plan.pop(sku, None)
+
+        self._persist(plan_rows, removed)
+        return len(plan_rows)
+
+    def _persist(self, plan_rows, removed):
+        by_shard = {}
+        for record in plan_rows:
+            by_shard.setdefault(shard_for_sku(record['sku']), []).append(tuple(record[c] for c in PLAN_COLUMNS))
+        try:
+            for shard, rows in by_shard.items():
+                conn = connect_shard(shard)
+                cursor = conn.cursor()
+                create_plan_table(cursor)
+                cursor.executemany(
+                    f"INSERT OR REPLACE INTO reorder_plan ({', '.join(PLAN_COLUMNS)}) VALUES ({','.join(['?'] * len(PLAN_COLUMNS))})",
+                    rows
+                )
+                conn.commit()
+                conn.close()
+            for sku in removed:
+                conn = connect_for_sku(sku)
+                conn.execute("DELETE FROM reorder_plan WHERE sku = ?", (sku,))
+                conn.commit()
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"Database error saving reorder plan: {e}")
+
+    def get(self, sku):
+        self.refresh()
+        return self.plan.get(sku)
+
+    def suggestions(self, limit=None, only_needed=True):
+        """Reorder suggestions, most urgent (furthest below the reorder point) first."""
+        self.refresh()
+        rows = [r for r in self.plan.values() if r['needs_reorder'] or not only_needed]
+        rows.sort(key=lambda r: (r['stock'] - r['reorder_point'], r['sku']))
+        rows = rows[:limit] if limit else rows
+        with self.catalog_lock:
+            return [{k: v for k, v in r.items() if k != 'inputs'} | {'name': self.catalog.get(r['sku'], {}).get('name')} for r in rows]
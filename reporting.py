@@ -42,10 +42,11 @@ class InventoryBST:
         
         if node:
             self.in_order_traversal(node.left, result)
-            # Check if product_name is dict (from API patch) or str
-            name_val = node.product_name['name'] if isinstance(node.product_name, dict) else node.product_name
-            stock_val = node.product_name['stock'] if isinstance(node.product_name, dict) else 0
-            price_val = node.product_name['price'] if isinstance(node.product_name, dict) else 0.0
+            # product_name is either a plain name or a product record (dict / catalog row view)
+            is_record = not isinstance(node.product_name, str)
+            name_val = node.product_name['name'] if is_record else node.product_name
+            stock_val = node.product_name['stock'] if is_record else 0
+            price_val = node.product_name['price'] if is_record else 0.0
 
             result.append({
                 "sku": node.sku,
@@ -0,0 +1,123 @@
+import sqlite3
+from datetime import date
+from db_router import connect_shard
+
+# Max bound parameters per IN (...) lookup (stays under SQLite's default variable limit)
+LOOKUP_CHUNK = 500
+
+def _fetch_orders(cursor, order_ids):
+    orders = {}
+    for i in range(0, len(order_ids), LOOKUP_CHUNK):
+        chunk = order_ids[i:i + LOOKUP_CHUNK]
+        placeholders = ','.join(['?'] * len(chunk))
+        cursor.execute(f"SELECT order_id, sku, qty_requested, status FROM customer_orders WHERE order_id IN ({placeholders})", chunk)
+        orders.update({row[0]: row for row in cursor.fetchall()})
+    return orders
+
+def _fetch_stock(cursor, skus):
+    stock = {}
+    skus = list(skus)
+    for i in range(0, len(skus), LOOKUP_CHUNK):
+        chunk = skus[i:i + LOOKUP_CHUNK]
+        placeholders = ','.join(['?'] * len(chunk))
+        cursor.execute(f"SELECT sku, current_stock FROM products WHERE sku IN ({placeholders})", chunk)
+        stock.update(cursor.fetchall())
+    return stock
+
+def dispatch_wave_on_shard(shard, order_ids, forecast_store, block_short=True):
+    """
+    Dispatches a batch of orders from one shard in a single transaction.
+
+    BEGIN IMMEDIATE takes the shard's writer lock up front, and each stock
+    decrement is a conditional `UPDATE ... WHERE current_stock >= qty`, so
+    concurrent waves or single dispatches can never oversell a SKU.
+    Orders are attempted in the given (priority) order; the ones whose
+    stock runs out are marked BLOCKED when `block_short` is set.
+
+    Returns a dict with:
+        shipped:     [(order_id, sku, qty)]
+        short:       [(order_id, sku, qty)]  (not enough stock)
+        skipped:     [(order_id, status)]    (unknown or no longer PENDING)
+        stock:       {sku: stock after commit} for every SKU touched
+        sale_states: forecast states to hand to ForecastStore.apply_sales()
+    """
+    conn = connect_shard(shard)
+    conn.isolation_level = None # Explicit transaction control
+    cursor = conn.cursor()
+    result = {'shipped': [], 'short': [], 'skipped': [], 'stock': {}, 'sale_states': {}}
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        orders = _fetch_orders(cursor, order_ids)
+
+        for order_id in order_ids:
+            row = orders.get(order_id)
+            if row is None or row[3] != 'PENDING':
+                result['skipped'].append((order_id, row[3] if row else None))
+                continue
+            _, sku, qty, _ = row
+            cursor.execute(
+                "UPDATE products SET current_stock = current_stock - ? WHERE sku = ? AND current_stock >= ?",
+                (qty, sku, qty)
+            )
+            if cursor.rowcount == 1:
+                result['shipped'].append((order_id, sku, qty))
+            else:
+                result['short'].append((order_id, sku, qty))
+
+        cursor.executemany(
+            "UPDATE customer_orders SET status = 'SHIPPED' WHERE order_id = ?",
+            [(order_id,) for order_id, _, _ in result['shipped']]
+        )
+        if block_short:
+            cursor.executemany(
+                "UPDATE customer_orders SET status = 'BLOCKED' WHERE order_id = ?",
+                [(order_id,) for order_id, _, _ in result['short']]
+            )
+
+        # Every dispatch is a sale: history rows + forecast state in the same transaction.
+        # Dated by the local calendar (as order dates, the seed data and the demand window are), not SQLite's UTC date('now')
+        sale_date = date.today().isoformat()
+        cursor.executemany(
+            "INSERT INTO sales_history (sku, qty_sold, sale_date) VALUES (?, ?, ?)",
+            [(sku, qty, sale_date) for _, sku, qty in result['shipped']]
+        )
+        if result['shipped']:
+            result['sale_states'] = forecast_store.record_sales([(sku, qty) for _, sku, qty in result['shipped']], cursor)
+
+        touched = {sku for _, sku, _ in result['shipped']} | {sku for _, sku, _ in result['short']}
+        result['stock'] = _fetch_stock(cursor, touched)
+
+        cursor.execute("COMMIT")
+    except sqlite3.Error:
+        if conn.in_transaction:
+            cursor.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return result
+
+def reopen_blocked_on_shard(shard, order_ids):
+    """
+    Moves BLOCKED orders of one shard back to PENDING in a single transaction
+    (restock release). Orders whose status changed meanwhile are left alone.
+    Returns the IDs that were reopened.
+    """
+    conn = connect_shard(shard)
+    conn.isolation_level = None # Explicit transaction control
+    cursor = conn.cursor()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        orders = _fetch_orders(cursor, order_ids)
+        reopened = [order_id for order_id in order_ids if order_id in orders and orders[order_id][3] == 'BLOCKED']
+        cursor.executemany(
+            "UPDATE customer_orders SET status = 'PENDING' WHERE order_id = ?",
+            [(order_id,) for order_id in reopened]
+        )
+        cursor.execute("COMMIT")
+    except sqlite3.Error:
+        if conn.in_transaction:
+            cursor.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return reopened
@@ -0,0 +1,168 @@
+"""
+Wave picking planner.
+
+Splits the shipping queue (in priority order) into pick waves that fit a
+trolley: at most `max_units` units and `max_orders` orders per wave. Only
+orders whose full quantity is still in stock (after reserving stock for
+every higher-priority order) are planned; the rest are reported as
+unfulfillable.
+
+1. Greedy: bounded first-fit. Each order goes into the earliest of the last
+   LOOKBACK open waves with room, so priority order is kept and the search
+   stays O(N * LOOKBACK).
+2. Local search over neighbouring waves, which raises the number of
+   completed orders per wave:
+   - move: pull orders from the next waves into a wave's spare capacity
+   - split swap: swap one large order for two smaller orders from the next
+     wave when they fit together, so the wave completes one more order
+"""
+
+# Open waves searched by the first-fit pass
+LOOKBACK = 8
+# Following waves scanned by the local search for each wave
+LOOKAHEAD = 2
+
+
+class Wave:
+    __slots__ = ('orders', 'units')
+
+    def __init__(self):
+        self.orders = []
+        self.units = 0
+
+    def fits(self, qty, max_units, max_orders):
+        return len(self.orders) < max_orders and self.units + qty <= max_units
+
+    def add(self, order, qty):
+        self.orders.append((order, qty))
+        self.units += qty
+
+
+def _greedy(candidates, max_units, max_orders):
+    waves = []
+    open_waves = [] # Waves that may still take orders, oldest first
+    for order, qty in candidates:
+        target = None
+        for wave in open_waves[-LOOKBACK:]:
+            if wave.fits(qty, max_units, max_orders):
+                target = wave
+                break
+        if target is None:
+            target = Wave()
+            waves.append(target)
+            open_waves.append(target)
+        target.add(order, qty)
+        if len(target.orders) >= max_orders or target.units >= max_units:
+            open_waves.remove(target)
+        elif len(open_waves) > LOOKBACK * 4:
+            del open_waves[:-LOOKBACK] # Drop stale waves that first-fit won't search anyway
+    return waves
+
+
+def _move_pass(waves, max_units, max_orders):
+    moved = 0
+    for i, wave in enumerate(waves):
+        for later in waves[i + 1:i + 1 + LOOKAHEAD]:
+            if len(wave.orders) >= max_orders or wave.units >= max_units:
+                break
+            keep = []
+            for order, qty in later.orders:
+                if wave.fits(qty, max_units, max_orders):
+                    wave.add(order, qty)
+                    moved += 1
+                else:
+                    keep.append((order, qty))
+            later.orders = keep
+            later.units = sum(qty for _, qty in keep)
+    return moved
+
+
+def _split_swap_pass(waves, max_units, max_orders):
+    """Swap one order of wave i for two orders of wave i+1 that fit in its place (+1 order in wave i)."""
+    swaps = 0
+    for i in range(len(waves) - 1):
+        wave, nxt = waves[i], waves[i + 1]
+        if len(wave.orders) >= max_orders or len(nxt.orders) < 2:
+            continue
+        slack = max_units - wave.units
+        # Smallest two orders of the next wave are the best candidates to pull in
+        small = sorted(range(len(nxt.orders)), key=lambda j: nxt.orders[j][1])[:2]
+        pair_units = sum(nxt.orders[j][1] for j in small)
+        # Largest order of this wave that the pair could replace
+        big = max(range(len(wave.orders)), key=lambda j: wave.orders[j][1])
+        big_qty = wave.orders[big][1]
+        if pair_units > big_qty + slack:
+            continue
+        # The swapped-out order must fit where the pair came from
+        if nxt.units - pair_units + big_qty > max_units:
+            continue
+        pair = [nxt.orders[j] for j in small]
+        out = wave.orders.pop(big)
+        wave.orders.extend(pair)
+        wave.units += pair_units - big_qty
+        nxt.orders = [o for j, o in enumerate(nxt.orders) if j not in small] + [out]
+        nxt.units += big_qty - pair_units
+        swaps += 1
+    return swaps
+
+
+def plan_waves(orders, stock, max_units=200, max_orders=25, local_search=True):
+    """
+    Builds pick waves from `orders` (OrderRecords, highest priority first).
+
+    Args:
+        stock: callable sku -> units on hand (e.g. lambda s: catalog.get(s, {}).get('stock', 0))
+    Returns: (waves, unfulfillable, stats) where waves is a list of lists of
+             (order, qty) and unfulfillable a list of order IDs.
+    """
+    remaining = {}
+    candidates = []
+    unfulfillable = []
+    for order in orders:
+        qty = order.qty or 1
+        sku = order.item_sku
+        if sku not in remaining:
+            remaining[sku] = stock(sku)
+        # An order bigger than a whole trolley can never be picked in one wave
+        if qty > max_units or remaining[sku] < qty:
+            unfulfillable.append(order.order_id)
+            continue
+        remaining[sku] -= qty
+        candidates.append((order, qty))
+
+    waves = _greedy(candidates, max_units, max_orders)
+    greedy_count = len(waves)
+    moves = swaps = 0
+    if local_search:
+        for _ in range(3): # A few rounds; each round is O(N)
+            round_swaps = _split_swap_pass(waves, max_units, max_orders)
+            round_moves = _move_pass(waves, max_units, max_orders)
+            waves = [wave for wave in waves if wave.orders]
+            moves += round_moves
+            swaps += round_swaps
+            if not round_moves and not round_swaps:
+                break
+
+    stats = {
+        "planned_orders": len(candidates),
+        "unfulfillable_orders": len(unfulfillable),
+        "waves": len(waves),
+        "greedy_waves": greedy_count,
+        "avg_orders_per_wave": round(len(candidates) / len(waves), 2) if waves else 0,
+        "local_search_moves": moves,
+        "local_search_swaps": swaps
+    }
+    return [wave.orders for wave in waves], unfulfillable, stats
+
+
+def wave_pick_list(wave):
+    """Aggregates one wave into a SKU pick list (same shape as ShippingQueue.get_optimized_pick_list)."""
+    pick_map = {}
+    for order, qty in wave:
+        sku = order.item_sku
+        if sku in pick_map:
+            pick_map[sku]['qty'] += qty
+            pick_map[sku]['count'] += 1
+        else:
+            pick_map[sku] = {'sku': sku, 'name': order.item_name or 'Unknown Item', 'qty': qty, 'count': 1}
+    return sorted(pick_map.values(), key=lambda x: x['qty'], reverse=True)